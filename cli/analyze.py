@@ -18,6 +18,12 @@ CONFIGURATION OPTIONS:
                                (default: from GEMINI_API_KEY env var)
   --retries INTEGER            Maximum number of retry attempts for low quality
                                responses (default: 2)
+  --cache-dir PATH             Cache analyses in this directory and reuse them for
+                               identical issues (default: disabled)
+  --context-cache              Upload the codebase once to a Gemini context cache
+                               instead of sending it with every request
+  --max-relevant-files INTEGER Send only the N codebase files most similar to the
+                               issue instead of the whole codebase
 
 OUTPUT OPTIONS:
   --output, -o PATH            Save analysis results to file instead of stdout
@@ -431,6 +437,18 @@ Examples:
         "--retries", type=int, default=2, help="Maximum number of retry attempts for low quality responses (default: 2)"
     )
 
+    parser.add_argument(
+        "--cache-dir", type=Path, help="Directory for caching analyses of identical issues (default: disabled)"
+    )
+
+    parser.add_argument(
+        "--context-cache", action="store_true", help="Serve the codebase from a Gemini context cache instead of inline"
+    )
+
+    parser.add_argument(
+        "--max-relevant-files", type=int, help="Send only the N codebase files most similar to the issue (default: all)"
+    )
+
     parser.add_argument("--quiet", "-q", action="store_true", help="Suppress progress messages")
 
     parser.add_argument(
@@ -524,6 +542,9 @@ Examples:
             source_path=str(args.source_path) if args.source_path else None,
             custom_prompt_path=str(args.custom_prompt) if args.custom_prompt else None,
             model_name=args.model,
+            cache_dir=str(args.cache_dir) if args.cache_dir else None,
+            use_context_cache=args.context_cache,
+            max_relevant_files=args.max_relevant_files,
         )
 
         if not args.quiet:
@@ -221,6 +221,10 @@ Supported JSON formats:
 
     parser.add_argument("--model", help="Gemini model name (default: gemini-2.0-flash-001)")
 
+    parser.add_argument(
+        "--max-candidates", type=int, help="Send only the N open issues most similar to the new issue (default: all)"
+    )
+
     parser.add_argument("--output", choices=["text", "json"], default="text", help="Output format (default: text)")
 
     args = parser.parse_args()
@@ -237,7 +241,7 @@ Supported JSON formats:
 
     # Interactive mode
     if args.interactive:
-        run_interactive_mode(args.issues, args.api_key, args.model)
+        run_interactive_mode(args.issues, args.api_key, args.model, args.max_candidates)
         return
 
     # Validate required arguments for duplicate detection
@@ -252,7 +256,7 @@ def run_duplicate_detection(args):
     """Run duplicate detection with provided arguments."""
     try:
         # Initialize analyzer
-        analyzer = GeminiDuplicateAnalyzer(api_key=args.api_key, model_name=args.model)
+        analyzer = GeminiDuplicateAnalyzer(api_key=args.api_key, model_name=args.model, max_candidates=args.max_candidates)
 
         # Load existing issues
         existing_issues = load_issues_from_file(args.issues)
@@ -285,7 +289,7 @@ def run_duplicate_detection(args):
         sys.exit(1)
 
 
-def run_interactive_mode(issues_file: str, api_key: str, model_name: str = None):
+def run_interactive_mode(issues_file: str, api_key: str, model_name: str = None, max_candidates: int = None):
     """Run the analyzer in interactive mode."""
     if not issues_file:
         print("ERROR: --issues file is required for interactive mode")
@@ -293,7 +297,7 @@ def run_interactive_mode(issues_file: str, api_key: str, model_name: str = None)
 
     try:
         # Initialize analyzer
-        analyzer = GeminiDuplicateAnalyzer(api_key=api_key, model_name=model_name)
+        analyzer = GeminiDuplicateAnalyzer(api_key=api_key, model_name=model_name, max_candidates=max_candidates)
 
         # Load existing issues
         existing_issues = load_issues_from_file(issues_file)
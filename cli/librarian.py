@@ -48,6 +48,38 @@ Examples:
     parser.add_argument(
         "--model", type=str, default="gemini-2.0-flash-001", help="Gemini model name (default: gemini-2.0-flash-001)"
     )
+    parser.add_argument(
+        "--coarse-model",
+        type=str,
+        default="gemini-2.0-flash-lite-001",
+        help="Gemini model name for chunk selection (default: gemini-2.0-flash-lite-001)",
+    )
+
+    parser.add_argument(
+        "--max-chunk-candidates",
+        type=int,
+        help="Offer only this many TF-IDF-ranked chunks to Gemini for chunk selection (default: all chunks)",
+    )
+
+    parser.add_argument(
+        "--max-files-per-chunk",
+        type=int,
+        help="Send only the N files of each relevant chunk most similar to the issue (default: all)",
+    )
+
+    parser.add_argument(
+        "--max-batch-chars",
+        type=int,
+        help="Pack relevant chunks into shared Gemini requests of at most this many characters (default: one per chunk)",
+    )
+
+    parser.add_argument(
+        "--cache-dir", type=Path, help="Directory for caching Gemini responses of identical requests (default: disabled)"
+    )
+
+    parser.add_argument(
+        "--retries", type=int, default=2, help="Maximum number of retries of a failed Gemini request (default: 2)"
+    )
 
     # Output options
     parser.add_argument("--output", "-o", type=str, help="Output file for results (JSON)")
@@ -63,7 +95,17 @@ Examples:
 
     # Initialize Librarian
     try:
-        librarian = LibrarianAnalyzer(api_key=args.api_key, chunks_dir=args.chunks_dir, model_name=args.model)
+        librarian = LibrarianAnalyzer(
+            api_key=args.api_key,
+            chunks_dir=args.chunks_dir,
+            model_name=args.model,
+            coarse_model_name=args.coarse_model,
+            max_chunk_candidates=args.max_chunk_candidates,
+            max_files_per_chunk=args.max_files_per_chunk,
+            max_batch_chars=args.max_batch_chars,
+            cache_dir=str(args.cache_dir) if args.cache_dir else None,
+            max_retries=args.retries,
+        )
     except Exception as e:
         logger.error(f"Error initializing Librarian: {e}")
         sys.exit(1)
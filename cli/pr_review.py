@@ -114,6 +114,12 @@ PR JSON file format:
         help="Gemini model name (default: gemini-2.0-flash-001)",
     )
     parser.add_argument("--api-key", type=str, help="Gemini API key (or set GEMINI_API_KEY env var)")
+    parser.add_argument(
+        "--max-diff-chars",
+        type=int,
+        help="Budget for all diffs in the prompt; files that do not fit are listed with line counts only",
+    )
+    parser.add_argument("--cache-dir", type=Path, help="Directory for caching reviews of identical PRs (default: disabled)")
 
     # Output options
     parser.add_argument("--output", "-o", type=str, help="Output file for review results (JSON)")
@@ -158,7 +164,13 @@ PR JSON file format:
 
     # Initialize PR analyzer
     try:
-        analyzer = PRAnalyzer(api_key=args.api_key, config_path=args.config, model_name=args.model)
+        analyzer = PRAnalyzer(
+            api_key=args.api_key,
+            config_path=args.config,
+            model_name=args.model,
+            max_total_patch_chars=args.max_diff_chars,
+            cache_dir=str(args.cache_dir) if args.cache_dir else None,
+        )
     except Exception as e:
         logger.error(f"Error initializing PR analyzer: {e}")
         sys.exit(1)
@@ -1,6 +1,11 @@
 """Test suite for the Cosine Similarity Duplicate Issue Analyzer."""
 
+from unittest.mock import patch
+
+import numpy as np
 import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
 
 from utils.duplicate.cosine_duplicate import CosineDuplicateAnalyzer
 from utils.models import DuplicateDetectionResult, IssueReference
@@ -178,6 +183,36 @@ class TestSimilarityReasons:
             reasons_text = " ".join(result.similarity_reasons).lower()
             assert "similar" in reasons_text or "high" in reasons_text
 
+    @pytest.mark.parametrize(
+        "text1, text2",
+        [
+            ("login page crashes on submit", "login page crashes when clicking submit button"),
+            ("database timeout timeout", "database connection timeout in production"),
+            ("css broken", "login fails"),
+            ("the and of", "the and of"),
+        ],
+    )
+    def test_text_similarity_matches_pairwise_tfidf(self, analyzer, text1, text2):
+        """Test that text similarity equals cosine similarity of a TF-IDF fit on just the two texts."""
+        vectorizer = TfidfVectorizer(stop_words="english", lowercase=True)
+        try:
+            matrix = vectorizer.fit_transform([text1, text2])
+            expected = float(cosine_similarity(matrix[0:1], matrix[1:2])[0][0])
+        except ValueError:
+            expected = 0.0
+
+        assert analyzer._calculate_text_similarity(text1, text2) == pytest.approx(expected)
+
+    def test_pairwise_similarities_match_single_pairs(self, analyzer):
+        """Test that vectorized pair similarities equal the per-pair calculation."""
+        texts1 = ["login page crashes on submit", "database timeout timeout", "", "css broken", "the and of"]
+        texts2 = ["login page crashes when clicking submit button", "database connection timeout", "login", "login", "of"]
+
+        similarities = analyzer._pairwise_text_similarities(texts1, texts2)
+
+        expected = [analyzer._calculate_text_similarity(a, b) for a, b in zip(texts1, texts2)]
+        assert similarities == pytest.approx(expected)
+
 
 class TestBatchDetection:
     """Test batch duplicate detection."""
@@ -197,6 +232,44 @@ class TestBatchDetection:
             assert isinstance(result, DuplicateDetectionResult)
             assert 0 <= result.similarity_score <= 1
 
+    def test_batch_repeated_issues_share_results(self, analyzer, sample_issues):
+        """Test that repeated new issues get equal but independent results."""
+        new_issue = {"title": "Login form JavaScript error", "description": "JavaScript error on login submit"}
+
+        with patch.object(analyzer, "_find_best_match", wraps=analyzer._find_best_match) as mock_detect:
+            results = analyzer.batch_detect_duplicates([new_issue, dict(new_issue)], sample_issues)
+
+        assert mock_detect.call_count == 1
+        assert results[0] == results[1]
+        assert results[0] is not results[1]
+
+    def test_batch_matches_single_detection(self, analyzer, sample_issues):
+        """Test that vectorized batch reasons match detecting each issue on its own."""
+        new_issues = [
+            {"title": "Login page crashes on submit", "description": "Clicking submit on the login page crashes"},
+            {"title": "Database timeout", "description": ""},
+            {"title": "CSS", "description": "the and of"},
+        ]
+
+        results = analyzer.batch_detect_duplicates(new_issues, sample_issues)
+
+        for new_issue, result in zip(new_issues, results):
+            assert result == analyzer.detect_duplicate(new_issue["title"], new_issue["description"], sample_issues)
+
+    def test_existing_issues_processed_once(self, analyzer, sample_issues):
+        """Test that issue texts are preprocessed, tokenized and counted once and reused for later calls."""
+        new_issues = [{"title": f"Login error {i}", "description": "Submit fails"} for i in range(3)]
+
+        first = analyzer.batch_detect_duplicates(new_issues, sample_issues)
+        text_misses = analyzer._combined_text.cache_info().misses
+        token_misses = analyzer._analyze_text.cache_info().misses
+        second = analyzer.batch_detect_duplicates(new_issues, sample_issues)
+
+        assert analyzer._combined_text.cache_info().misses == text_misses
+        assert analyzer._analyze_text.cache_info().misses == token_misses
+        assert analyzer._existing_index.cache_info().misses == 1
+        assert second == first
+
     def test_batch_with_empty_list(self, analyzer, sample_issues):
         """Test batch processing with empty list."""
         results = analyzer.batch_detect_duplicates([], sample_issues)
@@ -226,6 +299,43 @@ class TestMostSimilarIssues:
         if len(results) > 1:
             assert results[0][1] >= results[1][1]
 
+    @pytest.mark.parametrize(
+        "params",
+        [
+            {},
+            {"max_features": 8},
+            {"min_df": 2},
+            {"max_df": 3},
+            {"sublinear_tf": True},
+            {"smooth_idf": False},
+            {"use_idf": False},
+            {"norm": "l1"},
+            {"dtype": np.float64},
+        ],
+    )
+    def test_scores_match_refit_vectorizer(self, analyzer, sample_issues, params):
+        """Test that scores equal a TF-IDF fit on the new issue plus the existing issues, including pruning."""
+        analyzer.vectorizer.set_params(**params)
+        title, description = "Login crashes on submit", "App crashes when submitting the login form in Chrome"
+
+        results = analyzer.find_most_similar_issues(title, description, sample_issues, top_k=len(sample_issues))
+
+        texts = [analyzer._combine_new_issue_text(title, description)]
+        texts += [analyzer._combine_issue_text(issue) for issue in sample_issues]
+        matrix = TfidfVectorizer(**analyzer.vectorizer.get_params()).fit_transform(texts)
+        expected = cosine_similarity(matrix[0:1], matrix[1:])[0]
+        assert results
+        for issue, score in results:
+            assert score == pytest.approx(float(expected[sample_issues.index(issue)]), abs=1e-6)
+        assert len(results) == int((expected > 0).sum())
+
+    def test_unsupported_vectorizer_params_rejected(self, analyzer, sample_issues):
+        """Test that vectorizer parameters the existing-issue index cannot emulate raise instead of diverging."""
+        analyzer.vectorizer.set_params(binary=True)
+
+        with pytest.raises(ValueError, match="binary"):
+            analyzer._existing_index(tuple(analyzer._combine_issue_text(issue) for issue in sample_issues))
+
     def test_find_similar_with_empty_list(self, analyzer):
         """Test finding similar issues with empty list."""
         results = analyzer.find_most_similar_issues(title="Test", description="Test", existing_issues=[], top_k=5)
@@ -1,9 +1,12 @@
 """Test suite for the Gemini Duplicate Issue Analyzer."""
 
+import json
 import os
 from datetime import datetime
+from unittest.mock import Mock, patch
 
 import pytest
+from google.genai import errors
 
 from utils.duplicate.gemini_duplicate import GeminiDuplicateAnalyzer
 from utils.models import DuplicateDetectionResult, IssueReference
@@ -24,6 +27,29 @@ def analyzer(api_key):
     return GeminiDuplicateAnalyzer(api_key=api_key)
 
 
+@pytest.fixture
+def offline_duplicate_analyzer():
+    """Fixture creating a GeminiDuplicateAnalyzer with a mocked Gemini client."""
+    with patch("utils.duplicate.gemini_duplicate.genai.Client"):
+        yield GeminiDuplicateAnalyzer(api_key="test_key")
+
+
+def make_duplicate_response(is_duplicate: bool = False, duplicate_issue_id=None) -> Mock:
+    """Build a mocked Gemini response containing a duplicate detection result."""
+    response = Mock()
+    response.text = json.dumps(
+        {
+            "is_duplicate": is_duplicate,
+            "duplicate_issue_id": duplicate_issue_id,
+            "similarity_score": 0.9 if is_duplicate else 0.1,
+            "similarity_reasons": [],
+            "confidence_score": 0.8,
+            "recommendation": "Review the linked issue",
+        }
+    )
+    return response
+
+
 @pytest.fixture
 def sample_existing_issues():
     """Fixture providing sample existing issues."""
@@ -253,5 +279,131 @@ class TestEdgeCases:
         assert not result.is_duplicate
 
 
+class TestPromptConstruction:
+    """Tests for how existing issues are sent to Gemini, using a mocked client."""
+
+    def test_batch_renders_existing_issues_once(self, offline_duplicate_analyzer, sample_existing_issues):
+        """Test that the open issues are rendered once per batch rather than once per new issue."""
+        client = offline_duplicate_analyzer.client
+        client.models.generate_content.return_value = make_duplicate_response()
+        new_issues = [{"title": f"Issue {i}", "description": "Something is broken"} for i in range(3)]
+
+        with patch.object(
+            GeminiDuplicateAnalyzer, "_format_existing_issues", wraps=GeminiDuplicateAnalyzer._format_existing_issues
+        ) as format_issues:
+            results = offline_duplicate_analyzer.batch_detect_duplicates(new_issues, sample_existing_issues)
+
+        assert len(results) == 3
+        assert format_issues.call_count == 1
+        prompt = client.models.generate_content.call_args.kwargs["contents"]
+        assert "ISSUE-001" in prompt and "ISSUE-004" not in prompt
+
+    def test_duplicate_resolves_issue_reference(self, offline_duplicate_analyzer, sample_existing_issues):
+        """Test that the duplicate issue ID returned by Gemini is resolved to the open issue."""
+        offline_duplicate_analyzer.client.models.generate_content.return_value = make_duplicate_response(
+            is_duplicate=True, duplicate_issue_id="ISSUE-002"
+        )
+
+        result = offline_duplicate_analyzer.detect_duplicate("DB timeout", "Connections time out", sample_existing_issues)
+
+        assert result.is_duplicate
+        assert result.duplicate_of.issue_id == "ISSUE-002"
+
+    def test_max_candidates_shortlists_similar_issues(self, sample_existing_issues):
+        """Test that only the most similar open issues are sent when max_candidates is set."""
+        with patch("utils.duplicate.gemini_duplicate.genai.Client"):
+            duplicate_analyzer = GeminiDuplicateAnalyzer(api_key="test_key", max_candidates=1)
+        client = duplicate_analyzer.client
+        client.models.generate_content.return_value = make_duplicate_response()
+
+        duplicate_analyzer.detect_duplicate(
+            "Database connection timeout", "Timeout errors in production database", sample_existing_issues
+        )
+
+        prompt = client.models.generate_content.call_args.kwargs["contents"]
+        assert "ISSUE-002" in prompt
+        assert "ISSUE-001" not in prompt and "ISSUE-003" not in prompt
+
+    def test_max_candidates_keeps_all_without_overlap(self, sample_existing_issues):
+        """Test that all open issues are sent when none shares a term with the new issue."""
+        with patch("utils.duplicate.gemini_duplicate.genai.Client"):
+            duplicate_analyzer = GeminiDuplicateAnalyzer(api_key="test_key", max_candidates=1)
+        client = duplicate_analyzer.client
+        client.models.generate_content.return_value = make_duplicate_response()
+
+        duplicate_analyzer.detect_duplicate("Dark theme", "Support a night palette", sample_existing_issues)
+
+        prompt = client.models.generate_content.call_args.kwargs["contents"]
+        assert all(issue_id in prompt for issue_id in ("ISSUE-001", "ISSUE-002", "ISSUE-003"))
+
+    def test_invalid_max_candidates(self):
+        """Test that a non-positive max_candidates is rejected."""
+        with pytest.raises(ValueError):
+            GeminiDuplicateAnalyzer(api_key="test_key", max_candidates=0)
+
+
+class TestResponseParsing:
+    """Tests for extracting duplicate detection data from Gemini responses."""
+
+    def test_json_with_surrounding_text(self, offline_duplicate_analyzer):
+        """Test that trailing text containing braces does not break parsing."""
+        response_text = (
+            'Result:\n{"is_duplicate": true, "duplicate_issue_id": "ISSUE-001", "similarity_score": 0.9, '
+            '"confidence_score": 0.8, "recommendation": "Close in favor of {ISSUE-001}"}\nNote: see {docs}.'
+        )
+
+        result = offline_duplicate_analyzer._parse_gemini_response(response_text)
+
+        assert result["is_duplicate"] is True
+        assert result["duplicate_issue_id"] == "ISSUE-001"
+        assert result["recommendation"] == "Close in favor of {ISSUE-001}"
+
+    def test_text_without_json_uses_fallback(self, offline_duplicate_analyzer):
+        """Test that a plain text response falls back to keyword extraction."""
+        result = offline_duplicate_analyzer._parse_gemini_response("This is very similar to an issue already reported.")
+
+        assert result["is_duplicate"] is True
+        assert result["similarity_score"] == 0.8
+        assert result["confidence_score"] == 0.4
+
+    def test_malformed_json_uses_fallback(self, offline_duplicate_analyzer):
+        """Test that an unparseable object falls back to keyword extraction."""
+        result = offline_duplicate_analyzer._parse_gemini_response('{"is_duplicate": false, "similarity_score": }')
+
+        assert result["confidence_score"] == 0.4
+
+
+class TestRetries:
+    """Tests for retrying failed Gemini calls, using a mocked client."""
+
+    def test_transient_error_retried_with_backoff(self, offline_duplicate_analyzer, sample_existing_issues):
+        """Test that a server error is retried after a short first wait."""
+        offline_duplicate_analyzer.client.models.generate_content.side_effect = [
+            errors.ServerError(503, {"error": {"code": 503, "message": "Unavailable", "status": "UNAVAILABLE"}}),
+            make_duplicate_response(),
+        ]
+
+        with patch("utils.duplicate.gemini_duplicate.time.sleep") as mock_sleep:
+            result = offline_duplicate_analyzer.detect_duplicate("Login crash", "App crashes", sample_existing_issues)
+
+        assert result.recommendation == "Review the linked issue"
+        mock_sleep.assert_called_once()
+        assert 1.0 <= mock_sleep.call_args[0][0] <= 1.1
+
+    def test_request_error_not_retried(self, offline_duplicate_analyzer, sample_existing_issues):
+        """Test that a request error falls back immediately instead of being retried."""
+        client = offline_duplicate_analyzer.client
+        client.models.generate_content.side_effect = errors.ClientError(
+            400, {"error": {"code": 400, "message": "Request too large", "status": "INVALID_ARGUMENT"}}
+        )
+
+        with patch("utils.duplicate.gemini_duplicate.time.sleep") as mock_sleep:
+            result = offline_duplicate_analyzer.detect_duplicate("Login crash", "App crashes", sample_existing_issues)
+
+        assert client.models.generate_content.call_count == 1
+        mock_sleep.assert_not_called()
+        assert result.confidence_score == 0.0
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
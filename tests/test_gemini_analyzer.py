@@ -1,11 +1,17 @@
 """Test script for the Gemini Issue Analyzer."""
 
+import asyncio
+import json
 import os
+from unittest.mock import AsyncMock, Mock, patch
 
 import pytest
 from dotenv import load_dotenv
+from google.genai import errors
 
 from utils.analyzer import GeminiIssueAnalyzer
+from utils.models import IssueAnalysis
+from utils.retrieval import CodebaseRetriever, repomix_file_paths, split_repomix_sections
 
 # Load environment variables
 load_dotenv()
@@ -71,6 +77,49 @@ def sample_test_cases():
     ]
 
 
+@pytest.fixture
+def codebase_file(tmp_path):
+    """Fixture providing a small source of truth file containing braces."""
+    path = tmp_path / "repomix-output.txt"
+    path.write_text('def handler():\n    return {"status": "ok"}\n', encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def offline_analyzer(codebase_file):
+    """Fixture creating a GeminiIssueAnalyzer with a mocked Gemini client."""
+    with patch("utils.analyzer.genai.Client"):
+        yield GeminiIssueAnalyzer(api_key="test_key", source_path=str(codebase_file))
+
+
+def make_response(summary: str = "The handler returns a static payload for every request.", file_path: str = "app.py") -> Mock:
+    """Build a mocked Gemini response containing a well-formed analysis."""
+    response = Mock()
+    response.text = json.dumps(
+        {
+            "issue_type": "bug",
+            "severity": "high",
+            "root_cause_analysis": {
+                "primary_cause": "The handler ignores its input",
+                "contributing_factors": ["No validation"],
+                "affected_components": ["handler (app.py:1)"],
+                "related_code_locations": [{"file_path": "app.py", "line_number": 1}],
+            },
+            "proposed_solutions": [
+                {
+                    "description": "Validate the request before responding",
+                    "code_changes": "--- a/app.py\n+++ b/app.py",
+                    "location": {"file_path": file_path, "line_number": 1},
+                    "rationale": "Invalid requests are rejected early",
+                }
+            ],
+            "confidence_score": 0.8,
+            "analysis_summary": summary,
+        }
+    )
+    return response
+
+
 class TestGeminiAnalyzer:
     """Test suite for GeminiIssueAnalyzer."""
 
@@ -138,6 +187,378 @@ class TestGeminiAnalyzer:
         assert analysis.issue_type is not None
 
 
+class TestResponseParsing:
+    """Tests for extracting JSON from Gemini responses."""
+
+    def test_braces_inside_strings(self, offline_analyzer):
+        """Test that braces in string values and trailing prose do not break extraction."""
+        payload = json.loads(make_response().text)
+        payload["proposed_solutions"][0]["code_changes"] = 'if ok: }\n    return "\\"{"'
+        text = f"Here is the analysis:\n{json.dumps(payload)}\nLet me know if {{anything}} is unclear."
+
+        assert offline_analyzer._parse_gemini_response(text) == payload
+
+    def test_parse_without_orjson(self, offline_analyzer):
+        """Test that parsing falls back to the standard json module."""
+        response = make_response()
+
+        with patch("utils.analyzer.ORJSON_AVAILABLE", False):
+            data = offline_analyzer._parse_gemini_response(response.text)
+
+        assert data == json.loads(response.text)
+
+    def test_unparseable_response_uses_text_fallback(self, offline_analyzer):
+        """Test that a response without JSON falls back to text extraction."""
+        data = offline_analyzer._parse_gemini_response("This is a critical bug with no JSON at all.")
+
+        assert data["severity"] == "critical"
+        assert data["confidence_score"] == 0.5
+
+    @pytest.mark.parametrize(
+        "text, issue_type, severity",
+        [
+            ("Plain failure report.", "bug", "medium"),
+            ("Please add a new option; this is a minor but IMPORTANT change.", "feature_request", "high"),
+            ("We should optimize the new parser; the slowdown is severe.", "enhancement", "critical"),
+            ("Flowchart renders incorrectly.", "bug", "low"),
+        ],
+    )
+    def test_text_fallback_keywords(self, offline_analyzer, text, issue_type, severity):
+        """Test that keyword classification of unstructured text keeps its substring and priority rules."""
+        data = offline_analyzer._extract_from_text(text)
+
+        assert (data["issue_type"], data["severity"]) == (issue_type, severity)
+
+
+class TestResponseQuality:
+    """Tests for low-quality response detection."""
+
+    @pytest.mark.parametrize("file_path", ["path/to/file.py", "src/Path/To/app.py", "Example.py"])
+    def test_placeholder_path_is_low_quality(self, offline_analyzer, file_path):
+        """Test that template file paths mark a response as low quality."""
+        data = offline_analyzer._parse_gemini_response(make_response(file_path=file_path).text)
+        analysis = IssueAnalysis(title="Bug", description="Details", **data)
+
+        assert offline_analyzer._is_low_quality_response(analysis)
+
+    def test_real_path_is_not_low_quality(self, offline_analyzer):
+        """Test that a complete response with a real file path is accepted."""
+        data = offline_analyzer._parse_gemini_response(make_response(file_path="src/app.py").text)
+        analysis = IssueAnalysis(title="Bug", description="Details", **data)
+
+        assert not offline_analyzer._is_low_quality_response(analysis)
+
+
+class TestCodebaseLoading:
+    """Tests for shared codebase loading."""
+
+    def test_codebase_shared_between_instances(self, codebase_file):
+        """Test that analyzers reading the same unchanged file share one string."""
+        with patch("utils.analyzer.genai.Client"):
+            first = GeminiIssueAnalyzer(api_key="test_key", source_path=str(codebase_file))
+            second = GeminiIssueAnalyzer(api_key="test_key", source_path=str(codebase_file))
+
+        assert first.codebase_content is second.codebase_content
+
+    def test_codebase_reloaded_after_change(self, codebase_file):
+        """Test that a modified source file is read again."""
+        with patch("utils.analyzer.genai.Client"):
+            GeminiIssueAnalyzer(api_key="test_key", source_path=str(codebase_file))
+            codebase_file.write_text("updated = True\n", encoding="utf-8")
+            stat = codebase_file.stat()
+            os.utime(codebase_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+            analyzer = GeminiIssueAnalyzer(api_key="test_key", source_path=str(codebase_file))
+
+        assert analyzer.codebase_content == "updated = True\n"
+
+    def test_missing_codebase(self, tmp_path):
+        """Test that a missing source file raises FileNotFoundError."""
+        with patch("utils.analyzer.genai.Client"), pytest.raises(FileNotFoundError):
+            GeminiIssueAnalyzer(api_key="test_key", source_path=str(tmp_path / "missing.txt"))
+
+
+class TestRequestLimits:
+    """Tests for codebase budgeting and non-retryable API errors."""
+
+    def test_codebase_truncated_to_budget(self, tmp_path):
+        """Test that an oversized codebase keeps its head and tail within the token budget."""
+        source = tmp_path / "repomix-output.txt"
+        source.write_text("HEAD" + "x" * 1000 + "TAIL", encoding="utf-8")
+
+        with patch("utils.analyzer.genai.Client"):
+            analyzer = GeminiIssueAnalyzer(api_key="test_key", source_path=str(source), max_codebase_tokens=50)
+
+        assert analyzer.codebase_content.startswith("HEAD")
+        assert analyzer.codebase_content.endswith("TAIL")
+        assert "[truncated" in analyzer.codebase_content
+        assert len(analyzer.codebase_content) < 300
+
+    def test_client_error_is_not_retried(self, offline_analyzer):
+        """Test that a 4xx request error returns the fallback analysis without retrying."""
+        offline_analyzer.client.models.generate_content.side_effect = errors.ClientError(
+            400, {"error": {"code": 400, "message": "Input too long", "status": "INVALID_ARGUMENT"}}
+        )
+
+        analysis = offline_analyzer.analyze_issue("Bug", "Details", max_retries=2)
+
+        assert analysis.confidence_score == 0.0
+        assert offline_analyzer.client.models.generate_content.call_count == 1
+
+    def test_transient_error_retried_with_backoff(self, offline_analyzer):
+        """Test that a server error is retried after an exponential backoff delay."""
+        offline_analyzer.client.models.generate_content.side_effect = [
+            errors.ServerError(503, {"error": {"code": 503, "message": "Unavailable", "status": "UNAVAILABLE"}}),
+            make_response(),
+        ]
+
+        with patch("utils.analyzer.time.sleep") as mock_sleep:
+            analysis = offline_analyzer.analyze_issue("Bug", "Details", max_retries=2)
+
+        assert analysis.confidence_score == 0.8
+        mock_sleep.assert_called_once()
+        assert 1.0 <= mock_sleep.call_args[0][0] <= 1.1
+
+    def test_prompt_built_once_across_retries(self, offline_analyzer):
+        """Test that low-quality retries resend the same prompt without rebuilding it."""
+        offline_analyzer.client.models.generate_content.side_effect = [
+            make_response(file_path="path/to/file.py"),
+            make_response(),
+        ]
+
+        with patch.object(offline_analyzer, "_create_analysis_prompt", return_value="prompt") as mock_prompt:
+            analysis = offline_analyzer.analyze_issue("Bug", "Details")
+
+        assert analysis.proposed_solutions[0].location.file_path == "app.py"
+        assert offline_analyzer.client.models.generate_content.call_count == 2
+        mock_prompt.assert_called_once_with("Bug", "Details")
+
+
+class TestResponseCache:
+    """Tests for the on-disk response cache."""
+
+    def test_repeated_issue_served_from_cache(self, codebase_file, tmp_path):
+        """Test that a repeated issue skips the API, even across analyzer instances."""
+        cache_dir = tmp_path / "cache"
+        with patch("utils.analyzer.genai.Client") as mock_client:
+            mock_client.return_value.models.generate_content.return_value = make_response()
+            first = GeminiIssueAnalyzer(api_key="test_key", source_path=str(codebase_file), cache_dir=str(cache_dir))
+            analysis = first.analyze_issue("Bug", "Handler  ignores input")
+
+            second = GeminiIssueAnalyzer(api_key="test_key", source_path=str(codebase_file), cache_dir=str(cache_dir))
+            cached = second.analyze_issue("Bug", "Handler ignores input")
+
+        assert mock_client.return_value.models.generate_content.call_count == 1
+        assert cached.analysis_summary == analysis.analysis_summary
+        assert cached.description == "Handler ignores input"
+
+    def test_low_quality_response_not_cached(self, codebase_file, tmp_path):
+        """Test that low-quality analyses are not stored in the cache."""
+        with patch("utils.analyzer.genai.Client") as mock_client:
+            mock_client.return_value.models.generate_content.return_value = make_response(file_path="path/to/file.py")
+            analyzer = GeminiIssueAnalyzer(api_key="test_key", source_path=str(codebase_file), cache_dir=str(tmp_path))
+            analyzer.analyze_issue("Bug", "Details", max_retries=0)
+            analyzer.analyze_issue("Bug", "Details", max_retries=0)
+
+        assert mock_client.return_value.models.generate_content.call_count == 2
+
+
+class TestContextCache:
+    """Tests for serving the codebase from a Gemini context cache."""
+
+    def test_prompt_references_cached_codebase(self, codebase_file):
+        """Test that requests reference the cached content instead of embedding the codebase."""
+        with patch("utils.analyzer.genai.Client") as mock_client:
+            client = mock_client.return_value
+            client.caches.create.return_value.name = "cachedContents/abc"
+            client.models.generate_content.return_value = make_response()
+            analyzer = GeminiIssueAnalyzer(api_key="test_key", source_path=str(codebase_file), use_context_cache=True)
+            analyzer.analyze_issue("Bug", "Details")
+
+        kwargs = client.models.generate_content.call_args.kwargs
+        assert kwargs["config"].cached_content == "cachedContents/abc"
+        assert analyzer.codebase_content not in kwargs["contents"]
+
+    def test_falls_back_to_inline_codebase(self, codebase_file):
+        """Test that a rejected cache creation sends the codebase inline."""
+        with patch("utils.analyzer.genai.Client") as mock_client:
+            client = mock_client.return_value
+            client.caches.create.side_effect = errors.ClientError(400, {"error": {"message": "too small"}})
+            client.models.generate_content.return_value = make_response()
+            analyzer = GeminiIssueAnalyzer(api_key="test_key", source_path=str(codebase_file), use_context_cache=True)
+            analyzer.analyze_issue("Bug", "Details")
+
+        kwargs = client.models.generate_content.call_args.kwargs
+        assert kwargs["config"] is None
+        assert analyzer.codebase_content in kwargs["contents"]
+
+    def test_expired_cache_falls_back_to_inline_codebase(self, codebase_file):
+        """Test that a request naming a missing cache is retried at once with the codebase inline."""
+        with patch("utils.analyzer.genai.Client") as mock_client:
+            mock_client.return_value.caches.create.return_value.name = "cachedContents/abc"
+            analyzer = GeminiIssueAnalyzer(api_key="test_key", source_path=str(codebase_file), use_context_cache=True)
+
+        error = errors.ClientError(404, {"error": {"message": "cachedContents/abc not found", "status": "NOT_FOUND"}})
+        assert analyzer._retry_delay(error, 0, 2) == 0.0
+        assert analyzer._context_cache_name is None
+
+    def test_rate_limit_keeps_context_cache(self, codebase_file):
+        """Test that a 429 backs off and keeps using the context cache."""
+        with patch("utils.analyzer.genai.Client") as mock_client:
+            mock_client.return_value.caches.create.return_value.name = "cachedContents/abc"
+            analyzer = GeminiIssueAnalyzer(api_key="test_key", source_path=str(codebase_file), use_context_cache=True)
+
+        error = errors.ClientError(429, {"error": {"message": "Quota exceeded", "status": "RESOURCE_EXHAUSTED"}})
+        assert analyzer._retry_delay(error, 0, 2) > 0
+        assert analyzer._context_cache_name == "cachedContents/abc"
+
+
+def make_repomix(files: dict) -> str:
+    """Build plain-text repomix output packing the given {path: content} files."""
+    sections = "".join(f"================\nFile: {path}\n================\n{content}\n\n" for path, content in files.items())
+    return f"This file is a merged representation of the codebase.\n\n{sections}"
+
+
+class TestCodebaseRetrieval:
+    """Tests for narrowing the codebase to the files relevant to an issue."""
+
+    FILES = {
+        "auth/login.py": "def login(user, password):\n    return check_password(user, password)",
+        "export/csv_writer.py": "def write_csv(rows):\n    return ','.join(rows)",
+        "ui/theme.py": "DARK_THEME = {'background': 'black'}",
+    }
+
+    def test_split_repomix_sections(self):
+        """Test that repomix output splits into a preamble and one section per file."""
+        preamble, sections = split_repomix_sections(make_repomix(self.FILES))
+
+        assert preamble.startswith("This file is a merged representation")
+        assert [section.split("\n")[1] for section in sections] == [f"File: {path}" for path in self.FILES]
+
+    def test_repomix_file_paths(self):
+        """Test that file paths are read from plain-text and XML repomix headers."""
+        assert repomix_file_paths(make_repomix(self.FILES)) == list(self.FILES)
+        assert repomix_file_paths('<file path="auth/login.py">\n</file>\n') == ["auth/login.py"]
+
+    def test_retrieve_keeps_relevant_files(self):
+        """Test that the best matching file is kept and unrelated files are dropped."""
+        retriever = CodebaseRetriever(make_repomix(self.FILES))
+
+        narrowed = retriever.retrieve("Login fails: check_password rejects valid password", top_k=1)
+
+        assert "File: auth/login.py" in narrowed
+        assert "File: export/csv_writer.py" not in narrowed
+        assert narrowed.startswith(retriever.preamble)
+
+    def test_retrieve_without_matches_returns_everything(self):
+        """Test that the whole codebase is kept when nothing matches the issue."""
+        retriever = CodebaseRetriever(make_repomix(self.FILES))
+
+        assert retriever.retrieve("zzz qqq", top_k=1) == retriever.codebase_content
+
+    def test_prompt_contains_only_relevant_files(self, tmp_path):
+        """Test that the analyzer embeds only the retrieved files in the prompt."""
+        source = tmp_path / "repomix-output.txt"
+        source.write_text(make_repomix(self.FILES), encoding="utf-8")
+
+        with patch("utils.analyzer.genai.Client"):
+            analyzer = GeminiIssueAnalyzer(api_key="test_key", source_path=str(source), max_relevant_files=1)
+
+        prompt = analyzer._create_analysis_prompt("CSV export broken", "write_csv drops rows")
+        assert "File: export/csv_writer.py" in prompt
+        assert "File: auth/login.py" not in prompt
+
+
+class TestBatchAnalysis:
+    """Tests for concurrent batch analysis with a mocked client."""
+
+    def test_batch_analyze_preserves_order(self, offline_analyzer):
+        """Test that batch results line up with the input issues."""
+        offline_analyzer.client.models.generate_content.return_value = make_response()
+        issues = [{"title": f"Issue {i}", "description": f"Description {i}"} for i in range(5)]
+
+        analyses = offline_analyzer.batch_analyze_issues(issues, max_workers=3)
+
+        assert [a.title for a in analyses] == [issue["title"] for issue in issues]
+        assert offline_analyzer.client.models.generate_content.call_count == len(issues)
+
+    def test_iter_batch_analyses_yields_every_index(self, offline_analyzer):
+        """Test that streamed batch results cover every input issue exactly once."""
+        offline_analyzer.client.models.generate_content.return_value = make_response()
+        issues = [{"title": f"Issue {i}", "description": f"Description {i}"} for i in range(4)]
+
+        results = dict(offline_analyzer.iter_batch_analyses(issues, max_workers=2))
+
+        assert sorted(results) == list(range(len(issues)))
+        assert all(results[i].title == issues[i]["title"] for i in results)
+
+    def test_batch_analyze_deduplicates_identical_issues(self, offline_analyzer):
+        """Test that identical issues are analyzed once and each position gets its own result."""
+        offline_analyzer.client.models.generate_content.return_value = make_response()
+        issues = [{"title": "Crash", "description": "Boom"}, {"title": "Other", "description": "Slow"}] * 3
+
+        analyses = offline_analyzer.batch_analyze_issues(issues)
+
+        assert offline_analyzer.client.models.generate_content.call_count == 2
+        assert [a.title for a in analyses] == [issue["title"] for issue in issues]
+        assert len({id(a) for a in analyses}) == len(issues)
+
+    def test_batch_analyze_empty(self, offline_analyzer):
+        """Test batch analysis with no issues."""
+        assert offline_analyzer.batch_analyze_issues([]) == []
+
+    def test_batch_analyze_async_preserves_order(self, offline_analyzer):
+        """Test that async batch results line up with the input issues and use the async client."""
+        offline_analyzer.client.aio.models.generate_content = AsyncMock(return_value=make_response())
+        issues = [{"title": f"Issue {i}", "description": f"Description {i}"} for i in range(5)]
+
+        analyses = asyncio.run(offline_analyzer.batch_analyze_issues_async(issues, max_concurrency=2))
+
+        assert [a.title for a in analyses] == [issue["title"] for issue in issues]
+        assert offline_analyzer.client.aio.models.generate_content.await_count == len(issues)
+        offline_analyzer.client.models.generate_content.assert_not_called()
+
+    def test_analyze_issue_async_retries_server_error(self, offline_analyzer):
+        """Test that the async path backs off without blocking the event loop."""
+        offline_analyzer.client.aio.models.generate_content = AsyncMock(
+            side_effect=[errors.ServerError(503, {"error": {"message": "unavailable"}}), make_response()]
+        )
+
+        with patch("utils.analyzer.asyncio.sleep", new=AsyncMock()) as mock_sleep:
+            analysis = asyncio.run(offline_analyzer.analyze_issue_async("Bug", "Details"))
+
+        assert analysis.confidence_score == 0.8
+        mock_sleep.assert_awaited_once()
+
+
+class TestCustomPrompt:
+    """Tests for custom prompt template rendering."""
+
+    def test_custom_prompt_matches_str_format(self, tmp_path, codebase_file):
+        """Test that the pre-rendered template produces the same prompt as str.format."""
+        template = 'Title: {title}\nDescription: {issue_description!r}\nCode:\n{codebase_content}\n{{"json": true}}'
+        prompt_path = tmp_path / "prompt.txt"
+        prompt_path.write_text(template, encoding="utf-8")
+
+        with patch("utils.analyzer.genai.Client"):
+            analyzer = GeminiIssueAnalyzer(
+                api_key="test_key", source_path=str(codebase_file), custom_prompt_path=str(prompt_path)
+            )
+
+        expected = template.format(
+            title="Crash {x}", issue_description="It fails", codebase_content=codebase_file.read_text(encoding="utf-8")
+        )
+        assert analyzer._create_analysis_prompt("Crash {x}", "It fails") == expected
+
+    def test_custom_prompt_unknown_placeholder(self, tmp_path, codebase_file):
+        """Test that an unknown placeholder is reported when the analyzer is created."""
+        prompt_path = tmp_path / "prompt.txt"
+        prompt_path.write_text("{title} {unknown}", encoding="utf-8")
+
+        with patch("utils.analyzer.genai.Client"), pytest.raises(ValueError):
+            GeminiIssueAnalyzer(api_key="test_key", source_path=str(codebase_file), custom_prompt_path=str(prompt_path))
+
+
 def test_analyzer_without_api_key():
     """Test that analyzer raises error without API key."""
     original_key = os.getenv("GEMINI_API_KEY")
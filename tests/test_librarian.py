@@ -0,0 +1,410 @@
+"""Test suite for the Librarian analyzer, using a mocked Gemini client."""
+
+import asyncio
+import threading
+import time
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from google.genai import errors
+
+from utils.librarian import LibrarianAnalyzer, _get_client
+
+CHUNK_FILES = {
+    "lib_auth": "lib/auth/login.py",
+    "lib_db": "lib/db/connection.py",
+    "docs": "docs/index.md",
+}
+
+
+@pytest.fixture(autouse=True)
+def fresh_clients():
+    """Fixture clearing the shared Gemini clients, so each test gets its own mocked client."""
+    _get_client.cache_clear()
+    yield
+    _get_client.cache_clear()
+
+
+@pytest.fixture
+def chunks_dir(tmp_path):
+    """Fixture creating a directory of repomix chunks."""
+    directory = tmp_path / "repomix-chunks"
+    directory.mkdir()
+    for chunk_name, file_path in CHUNK_FILES.items():
+        (directory / f"{chunk_name}.txt").write_text(f"File: {file_path}\ndef handler():\n    pass\n", encoding="utf-8")
+    return directory
+
+
+@pytest.fixture
+def librarian(chunks_dir):
+    """Fixture creating a LibrarianAnalyzer with a mocked Gemini client."""
+    with patch("utils.librarian.genai.Client"):
+        yield LibrarianAnalyzer(api_key="test_key", chunks_dir=str(chunks_dir))
+
+
+def fake_response(prompt: str, relevant_chunks=("lib_auth", "lib_db")) -> Mock:
+    """Answer a Librarian prompt the way Gemini would for a login issue."""
+    response = Mock()
+    if "AVAILABLE DIRECTORIES" in prompt:
+        response.text = "\n".join(relevant_chunks)
+    else:
+        chunk_name = prompt.split('from the "', 1)[1].split('"', 1)[0]
+        response.text = f"{CHUNK_FILES[chunk_name]}\nThere are no other relevant files."
+    return response
+
+
+class TestIdentifyRelevantFiles:
+    """Tests for the two-stage chunk selection and file extraction."""
+
+    def test_files_from_relevant_chunks(self, librarian):
+        """Test that files are collected from every relevant chunk, and only those."""
+        librarian.client.models.generate_content.side_effect = lambda model, contents, config=None: fake_response(contents)
+
+        result = librarian.identify_relevant_files("Login fails", "Login times out against the database")
+
+        assert result["relevant_files"] == ["lib/auth/login.py", "lib/db/connection.py"]
+        assert result["relevant_chunks"] == ["lib_auth", "lib_db"]
+        assert librarian.client.models.generate_content.call_count == 3
+
+    def test_chunk_selection_uses_coarse_model(self, librarian):
+        """Test that only chunk selection goes to the coarse model, with capped output."""
+        librarian.client.models.generate_content.side_effect = lambda model, contents, config=None: fake_response(contents)
+
+        librarian.identify_relevant_files("Login fails", "Details")
+
+        selection, *extractions = librarian.client.models.generate_content.call_args_list
+        assert selection.kwargs["model"] == "gemini-2.0-flash-lite-001"
+        assert selection.kwargs["config"].max_output_tokens == 256
+        assert all(call.kwargs["model"] == "gemini-2.0-flash-001" for call in extractions)
+
+    def test_chunk_selection_failure_uses_all_chunks(self, librarian):
+        """Test that every chunk is analyzed when chunk selection fails."""
+
+        def respond(model, contents, config=None):
+            if "AVAILABLE DIRECTORIES" in contents:
+                raise RuntimeError("service unavailable")
+            return fake_response(contents)
+
+        librarian.client.models.generate_content.side_effect = respond
+
+        with patch("utils.librarian.time.sleep"):
+            result = librarian.identify_relevant_files("Login fails", "Details")
+
+        assert result["relevant_files"] == sorted(CHUNK_FILES.values())
+
+    def test_chunks_analyzed_concurrently(self, librarian):
+        """Test that file extraction requests for different chunks are in flight at the same time."""
+        barrier = threading.Barrier(2, timeout=5)
+
+        def respond(model, contents, config=None):
+            if "AVAILABLE DIRECTORIES" not in contents:
+                barrier.wait()  # Breaks, and the chunk yields no files, unless both requests overlap
+            return fake_response(contents)
+
+        librarian.client.models.generate_content.side_effect = respond
+
+        result = librarian.identify_relevant_files("Login fails", "Details")
+
+        assert result["relevant_files"] == ["lib/auth/login.py", "lib/db/connection.py"]
+
+    def test_async_matches_sync(self, librarian):
+        """Test that the async variant returns the same result through the async client."""
+        librarian.client.models.generate_content.side_effect = lambda model, contents, config=None: fake_response(contents)
+        librarian.client.aio.models.generate_content = AsyncMock(
+            side_effect=lambda model, contents, config=None: fake_response(contents)
+        )
+
+        expected = librarian.identify_relevant_files("Login fails", "Details")
+        result = asyncio.run(librarian.identify_relevant_files_async("Login fails", "Details", max_concurrency=1))
+
+        assert result == expected
+        assert librarian.client.aio.models.generate_content.await_count == 3
+
+
+class TestClientReuse:
+    """Tests for sharing Gemini clients between analyzers."""
+
+    def test_client_shared_per_api_key(self, chunks_dir):
+        """Test that analyzers with the same key share one client and other keys get their own."""
+        with patch("utils.librarian.genai.Client", side_effect=lambda api_key: Mock(api_key=api_key)) as mock_client:
+            first = LibrarianAnalyzer(api_key="test_key", chunks_dir=str(chunks_dir))
+            second = LibrarianAnalyzer(api_key="test_key", chunks_dir=str(chunks_dir))
+            other = LibrarianAnalyzer(api_key="other_key", chunks_dir=str(chunks_dir))
+
+        assert first.client is second.client
+        assert other.client is not first.client
+        assert mock_client.call_count == 2
+
+
+class TestChunkShortlist:
+    """Tests for narrowing the chunks offered for chunk selection with TF-IDF."""
+
+    def test_only_top_chunks_offered(self, librarian):
+        """Test that the chunk selection prompt lists only the best-matching chunks."""
+        librarian.max_chunk_candidates = 2
+        librarian.client.models.generate_content.side_effect = lambda model, contents, config=None: fake_response(contents)
+
+        librarian.identify_relevant_files("Login fails", "The auth login handler and db connection time out")
+
+        prompt = librarian.client.models.generate_content.call_args_list[0].kwargs["contents"]
+        assert "lib_auth, lib_db" in prompt and "docs" not in prompt
+
+    def test_single_candidate_skips_chunk_selection(self, librarian):
+        """Test that a single shortlisted chunk is analyzed without a chunk selection request."""
+        librarian.max_chunk_candidates = 1
+        librarian.client.models.generate_content.side_effect = lambda model, contents, config=None: fake_response(contents)
+
+        result = librarian.identify_relevant_files("Login fails", "The auth login handler is broken")
+
+        assert result["relevant_chunks"] == ["lib_auth"]
+        assert librarian.client.models.generate_content.call_count == 1
+
+    def test_no_match_offers_all_chunks(self, librarian):
+        """Test that every chunk is offered when nothing in the index matches the issue."""
+        librarian.max_chunk_candidates = 1
+
+        assert librarian._candidate_chunks("Crash", "Segfault") == list(librarian.chunks)
+
+    def test_invalid_candidate_limit(self, chunks_dir):
+        """Test that a non-positive candidate limit is rejected."""
+        with patch("utils.librarian.genai.Client"), pytest.raises(ValueError):
+            LibrarianAnalyzer(api_key="test_key", chunks_dir=str(chunks_dir), max_chunk_candidates=0)
+
+
+class TestRetries:
+    """Tests for retrying failed Gemini requests."""
+
+    def test_rate_limit_retried_with_backoff(self, librarian):
+        """Test that a rate-limited request is retried after a short first wait instead of losing its files."""
+        failed = []
+
+        def respond(model, contents, config=None):
+            if 'from the "lib_db"' in contents and not failed:
+                failed.append(contents)
+                raise errors.ClientError(429, {"error": {"code": 429, "message": "Quota", "status": "RESOURCE_EXHAUSTED"}})
+            return fake_response(contents)
+
+        librarian.client.models.generate_content.side_effect = respond
+
+        with patch("utils.librarian.time.sleep") as mock_sleep:
+            result = librarian.identify_relevant_files("Login fails", "Details")
+
+        assert result["relevant_files"] == ["lib/auth/login.py", "lib/db/connection.py"]
+        mock_sleep.assert_called_once()
+        assert 1.0 <= mock_sleep.call_args[0][0] <= 1.1
+
+    def test_request_error_not_retried(self, librarian):
+        """Test that a request error fails immediately instead of being retried."""
+        librarian.client.models.generate_content.side_effect = errors.ClientError(
+            400, {"error": {"code": 400, "message": "Request too large", "status": "INVALID_ARGUMENT"}}
+        )
+
+        with patch("utils.librarian.time.sleep") as mock_sleep, pytest.raises(errors.ClientError):
+            librarian._generate("prompt")
+
+        assert librarian.client.models.generate_content.call_count == 1
+        mock_sleep.assert_not_called()
+
+    def test_async_server_error_retried(self, librarian):
+        """Test that the async client retries a server error."""
+        librarian.client.aio.models.generate_content = AsyncMock(
+            side_effect=[errors.ServerError(503, {"error": {"code": 503, "status": "UNAVAILABLE"}}), Mock(text="lib_auth")]
+        )
+
+        with patch("utils.librarian.asyncio.sleep", new=AsyncMock()) as mock_sleep:
+            assert asyncio.run(librarian._generate_async("prompt")) == "lib_auth"
+
+        mock_sleep.assert_awaited_once()
+
+
+class TestChunkSlicing:
+    """Tests for sending only the files of a chunk that match the issue."""
+
+    def test_only_matching_files_sent(self, librarian, chunks_dir):
+        """Test that the extraction prompt keeps the header and the most similar file sections only."""
+        banner = "=" * 16
+        (chunks_dir / "lib_auth.txt").write_text(
+            f"Repomix header\n{banner}\nFile: lib/auth/login.py\n{banner}\ndef login_timeout():\n    pass\n"
+            f"{banner}\nFile: lib/auth/tokens.py\n{banner}\ndef refresh_token():\n    pass\n",
+            encoding="utf-8",
+        )
+        librarian.max_files_per_chunk = 1
+
+        prompt = librarian._create_file_extraction_prompt("lib_auth", "Login fails", "login_timeout is too short")
+
+        assert "Repomix header" in prompt and "lib/auth/login.py" in prompt
+        assert "lib/auth/tokens.py" not in prompt
+
+    def test_whole_chunk_sent_by_default(self, librarian):
+        """Test that chunks are sent unchanged unless a file limit is set."""
+        prompt = librarian._create_file_extraction_prompt("lib_auth", "Login fails", "Details")
+
+        assert librarian.chunks["lib_auth"] in prompt
+
+
+class TestResponseParsing:
+    """Tests for turning Gemini responses into chunk names and file paths."""
+
+    @pytest.mark.parametrize(
+        "line,accepted",
+        [
+            ("lib/auth/login.py", True),
+            ("  plugins/modules/ios_vlans.py  ", True),
+            ("lib/v1.2/Makefile", False),  # No extension after the last "/"
+            ("setup.py", False),  # Not a relative path with a directory
+            ("# lib/auth/login.py", False),
+            ("There is no relevant file in lib/auth.py", False),
+            ("NO files match lib/x.py", False),
+            ("notes/lib/x.py", True),
+            ("a/" * 97 + "xy.py", True),  # 199 characters
+            ("a/" * 98 + "x.py", False),  # 200 characters
+        ],
+    )
+    def test_file_path_validation(self, librarian, line, accepted):
+        """Test which response lines are kept as file paths."""
+        files = librarian._parse_extracted_files("lib_auth", f"{line}\n")
+
+        assert files == ({line.strip()} if accepted else set())
+
+    def test_paths_checked_against_chunk_files(self, librarian, chunks_dir):
+        """Test that a chunk with repomix file headers only yields the files it packs."""
+        banner = "=" * 16
+        (chunks_dir / "lib_auth.txt").write_text(
+            f"{banner}\nFile: setup.py\n{banner}\n\n{banner}\nFile: lib/auth/login.py\n{banner}\n", encoding="utf-8"
+        )
+
+        files = librarian._parse_extracted_files("lib_auth", "setup.py\nlib/auth/login.py\nlib/auth/made_up.py\n")
+
+        assert files == {"setup.py", "lib/auth/login.py"}
+
+    def test_relevant_chunks_limited_to_known_names(self, librarian):
+        """Test that only known chunk names are kept, in response order."""
+        assert librarian._parse_relevant_chunks("lib_db\n  unknown\nlib_auth \n") == ["lib_db", "lib_auth"]
+
+
+class TestResponseCache:
+    """Tests for caching Gemini responses on disk."""
+
+    def test_repeated_issue_served_from_cache(self, chunks_dir, tmp_path):
+        """Test that a second librarian sharing the cache directory makes no Gemini calls."""
+        cache_dir = str(tmp_path / "cache")
+        with patch("utils.librarian.genai.Client"):
+            first = LibrarianAnalyzer(api_key="test_key", chunks_dir=str(chunks_dir), cache_dir=cache_dir)
+        with patch("utils.librarian.genai.Client"):
+            second = LibrarianAnalyzer(api_key="other_key", chunks_dir=str(chunks_dir), cache_dir=cache_dir)
+        first.client.models.generate_content.side_effect = lambda model, contents, config=None: fake_response(contents)
+
+        expected = first.identify_relevant_files("Login fails", "Details")
+        result = second.identify_relevant_files("Login fails", "Details")
+
+        assert result == expected
+        second.client.models.generate_content.assert_not_called()
+
+    def test_changed_chunk_not_served_from_cache(self, chunks_dir, tmp_path):
+        """Test that editing a chunk invalidates the cached extraction for it."""
+        cache_dir = str(tmp_path / "cache")
+        with patch("utils.librarian.genai.Client"):
+            first = LibrarianAnalyzer(api_key="test_key", chunks_dir=str(chunks_dir), cache_dir=cache_dir)
+        first.client.models.generate_content.side_effect = lambda model, contents, config=None: fake_response(contents)
+        first.identify_relevant_files("Login fails", "Details")
+
+        (chunks_dir / "lib_db.txt").write_text("File: lib/db/connection.py\ndef connect():\n    pass\n", encoding="utf-8")
+        with patch("utils.librarian.genai.Client"):
+            second = LibrarianAnalyzer(api_key="other_key", chunks_dir=str(chunks_dir), cache_dir=cache_dir)
+        second.client.models.generate_content.side_effect = lambda model, contents, config=None: fake_response(contents)
+
+        second.identify_relevant_files("Login fails", "Details")
+
+        prompts = [call.kwargs["contents"] for call in second.client.models.generate_content.call_args_list]
+        assert len(prompts) == 1 and 'from the "lib_db"' in prompts[0]
+
+
+class TestChunkBatching:
+    """Tests for packing several chunks into one file extraction request."""
+
+    def test_one_request_per_chunk_by_default(self, librarian):
+        """Test that every chunk gets its own request unless a batch budget is set."""
+        assert librarian._plan_chunk_batches(["lib_auth", "lib_db"]) == [["lib_auth"], ["lib_db"]]
+
+    def test_batches_respect_budget(self, librarian):
+        """Test that chunks are packed in order until the next one would exceed the budget."""
+        librarian.max_batch_chars = librarian.chunks.size("lib_auth") + librarian.chunks.size("lib_db")
+
+        assert librarian._plan_chunk_batches(["lib_auth", "lib_db", "docs"]) == [["lib_auth", "lib_db"], ["docs"]]
+
+        librarian.max_batch_chars = 1
+        assert librarian._plan_chunk_batches(["lib_auth", "lib_db"]) == [["lib_auth"], ["lib_db"]]
+
+    def test_batched_request_parsed_by_section(self, librarian):
+        """Test that one request covers a batch and its sections are parsed."""
+        librarian.max_batch_chars = 10_000
+        responses = iter(
+            [
+                Mock(text="lib_auth\nlib_db"),
+                Mock(text="CHUNK: lib_auth\nlib/auth/login.py\nCHUNK: lib_db\nlib/db/connection.py\nNo other files."),
+            ]
+        )
+        librarian.client.models.generate_content.side_effect = lambda model, contents, config=None: next(responses)
+
+        result = librarian.identify_relevant_files("Login fails", "Details")
+
+        assert result["relevant_files"] == ["lib/auth/login.py", "lib/db/connection.py"]
+        assert librarian.client.models.generate_content.call_count == 2
+        prompt = librarian.client.models.generate_content.call_args.kwargs["contents"]
+        assert "=== CHUNK: lib_auth ===" in prompt and "=== CHUNK: lib_db ===" in prompt
+
+    def test_invalid_batch_budget(self, chunks_dir):
+        """Test that a non-positive batch budget is rejected."""
+        with patch("utils.librarian.genai.Client"), pytest.raises(ValueError):
+            LibrarianAnalyzer(api_key="test_key", chunks_dir=str(chunks_dir), max_batch_chars=0)
+
+
+class TestLazyChunkLoading:
+    """Tests for reading chunk contents only when they are needed."""
+
+    def test_no_chunk_read_at_init(self, librarian):
+        """Test that chunks are discovered without reading their content."""
+        assert sorted(librarian.chunks) == sorted(CHUNK_FILES)
+        assert "docs" in librarian.chunks and "unknown" not in librarian.chunks
+        assert librarian.chunks._read_chunk.cache_info().currsize == 0
+
+    def test_only_shortlisted_chunks_read(self, librarian):
+        """Test that chunks outside the shortlist are never read."""
+        librarian.max_chunk_candidates = 2
+        librarian.client.models.generate_content.side_effect = lambda model, contents, config=None: fake_response(contents)
+
+        librarian.identify_relevant_files("Login fails", "The auth login handler and db connection time out")
+
+        assert librarian.chunks._read_chunk.cache_info().currsize == 2
+
+    def test_candidates_prefetched_during_chunk_selection(self, librarian):
+        """Test that candidate chunks are read while the chunk selection request is in flight."""
+        read_during_selection = []
+
+        def respond(model, contents, config=None):
+            if "AVAILABLE DIRECTORIES" in contents:
+                deadline = time.monotonic() + 5
+                while librarian.chunks._read_chunk.cache_info().currsize < len(CHUNK_FILES) and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                read_during_selection.append(librarian.chunks._read_chunk.cache_info().currsize)
+            return fake_response(contents)
+
+        librarian.client.models.generate_content.side_effect = respond
+
+        result = librarian.identify_relevant_files("Login fails", "Details")
+
+        assert read_during_selection == [len(CHUNK_FILES)]
+        assert result["relevant_files"] == ["lib/auth/login.py", "lib/db/connection.py"]
+
+    def test_unreadable_chunk_yields_no_files(self, librarian, chunks_dir):
+        """Test that a chunk that cannot be read only loses its own files."""
+        librarian.client.models.generate_content.side_effect = lambda model, contents, config=None: fake_response(contents)
+        (chunks_dir / "lib_db.txt").write_bytes(b"\xff\xfe invalid utf-8")
+
+        result = librarian.identify_relevant_files("Login fails", "Details")
+
+        assert result["relevant_files"] == ["lib/auth/login.py"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
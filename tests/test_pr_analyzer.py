@@ -1,12 +1,15 @@
 """Tests for PR analyzer functionality."""
 
+import asyncio
 import json
 import os
 from pathlib import Path
-from unittest.mock import MagicMock, Mock, patch
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
 
 import pytest
+import yaml
 
+from utils import pr_analyzer
 from utils.models import PRReview, PRReviewComment
 from utils.pr_analyzer import PRAnalyzer
 
@@ -87,7 +90,7 @@ def mock_analyzer():
 @pytest.fixture
 def mock_analyzer_with_api():
     """Create a mock PR analyzer with mocked API."""
-    with patch("utils.pr_analyzer.genai.Client") as mock_client:
+    with patch("google.genai.Client") as mock_client:
         mock_instance = MagicMock()
         mock_client.return_value = mock_instance
 
@@ -107,14 +110,14 @@ class TestPRAnalyzer:
 
     def test_init_with_api_key(self):
         """Test initialization with API key."""
-        with patch("utils.pr_analyzer.genai.Client") as mock_client:
+        with patch("google.genai.Client") as mock_client:
             analyzer = PRAnalyzer(api_key="test_key")
             assert analyzer.client is not None
             assert analyzer.model_name == "gemini-2.0-flash-001"
 
     def test_init_with_custom_model(self):
         """Test initialization with custom model name."""
-        with patch("utils.pr_analyzer.genai.Client"):
+        with patch("google.genai.Client"):
             analyzer = PRAnalyzer(api_key="test_key", model_name="gemini-pro")
             assert analyzer.model_name == "gemini-pro"
 
@@ -125,6 +128,25 @@ class TestPRAnalyzer:
         assert "default" in config["prompts"]
         assert "pr_review" in config["prompts"]["default"]
 
+    def test_config_parsed_once_per_file_version(self, tmp_path):
+        """Test that an unchanged config file is parsed once and each analyzer gets its own copy."""
+        config_path = tmp_path / "pr_prompt_config.yml"
+        config_path.write_text("repo_mappings: {}\nprompts:\n  default: {}\n", encoding="utf-8")
+
+        with patch.dict(os.environ, {}, clear=True), patch("utils.pr_analyzer.yaml.load", wraps=yaml.load) as load:
+            first = PRAnalyzer(config_path=str(config_path))
+            first.prompt_config["repo_mappings"]["python"] = [".*python.*"]
+            second = PRAnalyzer(config_path=str(config_path))
+
+            assert load.call_count == 1
+            assert second.prompt_config["repo_mappings"] == {}
+
+            config_path.write_text("repo_mappings:\n  ansible: ['.*ansible.*']\nprompts: {}\n", encoding="utf-8")
+            third = PRAnalyzer(config_path=str(config_path))
+
+            assert load.call_count == 2
+            assert third.prompt_config["repo_mappings"] == {"ansible": [".*ansible.*"]}
+
     def test_get_repo_type_default(self, mock_analyzer):
         """Test repo type detection with no match."""
         repo_type = mock_analyzer._get_repo_type("")
@@ -135,7 +157,7 @@ class TestPRAnalyzer:
 
     def test_get_repo_type_with_pattern(self):
         """Test repo type detection with pattern match."""
-        with patch("utils.pr_analyzer.genai.Client"):
+        with patch("google.genai.Client"):
             analyzer = PRAnalyzer(api_key="test_key")
             # Add custom mapping
             analyzer.prompt_config["repo_mappings"] = {"python": [".*python.*", ".*py.*"]}
@@ -143,6 +165,37 @@ class TestPRAnalyzer:
             repo_type = analyzer._get_repo_type("https://github.com/user/python-project")
             assert repo_type == "python"
 
+    def test_get_repo_type_skips_invalid_pattern(self, mock_analyzer):
+        """Test that an invalid pattern is skipped and the remaining patterns still match."""
+        mock_analyzer.prompt_config["repo_mappings"] = {"broken": ["[unclosed"], "ansible": [".*ansible.*"]}
+
+        assert mock_analyzer._get_repo_type("https://github.com/ansible/ansible") == "ansible"
+        assert mock_analyzer._get_repo_type("https://github.com/user/repo") == "default"
+
+    def test_get_repo_type_cached_per_url(self, mock_analyzer):
+        """Test that a repo URL is matched once and re-matched after repo_mappings changes."""
+        mock_analyzer.prompt_config["repo_mappings"] = {"ansible": [".*ansible.*"]}
+
+        with patch("utils.pr_analyzer._compile_repo_pattern", wraps=pr_analyzer._compile_repo_pattern) as match:
+            assert mock_analyzer._get_repo_type("https://github.com/ansible/ansible") == "ansible"
+            assert mock_analyzer._get_repo_type("https://github.com/ansible/ansible") == "ansible"
+            assert match.call_count == 1
+
+            mock_analyzer.prompt_config["repo_mappings"] = {"python": [".*ansible.*"]}
+            assert mock_analyzer._get_repo_type("https://github.com/ansible/ansible") == "python"
+            assert match.call_count == 2
+
+    def test_get_repo_type_sees_in_place_mapping_edits(self, mock_analyzer):
+        """Test that a repo type added to the existing repo_mappings dict is matched after an earlier lookup."""
+        mock_analyzer.prompt_config["repo_mappings"] = {"ansible": [".*ansible.*"]}
+        assert mock_analyzer._get_repo_type("https://github.com/x/python-lib") == "default"
+
+        mock_analyzer.prompt_config["repo_mappings"]["python"] = [".*python.*"]
+        assert mock_analyzer._get_repo_type("https://github.com/x/python-lib") == "python"
+
+        mock_analyzer.prompt_config["repo_mappings"]["python"].append(".*py-.*")
+        assert mock_analyzer._get_repo_type("https://github.com/x/py-utils") == "python"
+
     def test_get_prompt(self, mock_analyzer):
         """Test prompt retrieval."""
         prompt = mock_analyzer._get_prompt("pr_review", "default")
@@ -154,6 +207,31 @@ class TestPRAnalyzer:
         prompt = mock_analyzer._get_prompt("nonexistent", "default")
         assert prompt == {}
 
+    def test_get_repo_specific_prompts(self, tmp_path):
+        """Test that repo-specific prompts take precedence and other repo types fall back to default."""
+        config_path = tmp_path / "pr_prompt_config.yml"
+        config_path.write_text(
+            "prompts:\n"
+            "  default:\n    pr_review: {system_role: Default, workflow_analysis: Default workflow}\n"
+            "  ansible:\n    pr_review: {system_role: Ansible}\n",
+            encoding="utf-8",
+        )
+        with patch.dict(os.environ, {}, clear=True):
+            analyzer = PRAnalyzer(config_path=str(config_path))
+
+        assert analyzer._get_prompt("pr_review", "ansible")["system_role"] == "Ansible"
+        assert analyzer._get_prompt("pr_review", "python")["system_role"] == "Default"
+        assert analyzer._get_workflow_analysis_prompt("ansible") == "Default workflow"
+
+    def test_prompts_added_after_init(self, mock_analyzer):
+        """Test that a repo type added to the prompts after construction is used."""
+        assert mock_analyzer._get_workflow_analysis_prompt("python") == mock_analyzer._get_workflow_analysis_prompt()
+
+        mock_analyzer.prompt_config["prompts"]["python"] = {"pr_review": {"system_role": "PY", "workflow_analysis": "WF"}}
+
+        assert mock_analyzer._get_prompt("pr_review", "python")["system_role"] == "PY"
+        assert mock_analyzer._get_workflow_analysis_prompt("python") == "WF"
+
     def test_build_review_prompt(self, mock_analyzer, sample_pr_data):
         """Test review prompt building."""
         prompt = mock_analyzer._build_review_prompt(
@@ -177,6 +255,23 @@ class TestPRAnalyzer:
         assert "truncated" in prompt
         assert len(prompt) < len(large_patch)
 
+    def test_build_review_prompt_with_diff_budget(self):
+        """Test that the largest diffs within the budget are kept and the other files show line counts only."""
+        file_changes = [
+            {"filename": "small.py", "status": "modified", "additions": 1, "deletions": 0, "patch": "+small_change"},
+            {"filename": "large.py", "status": "modified", "additions": 9, "deletions": 0, "patch": "+large_change" * 10},
+            {"filename": "binary.png", "status": "added", "additions": 0, "deletions": 0},
+        ]
+        with patch.dict(os.environ, {}, clear=True):
+            analyzer = PRAnalyzer(max_total_patch_chars=135)
+
+        prompt = analyzer._build_review_prompt("Test PR", "Test body", file_changes)
+
+        assert "+large_change" in prompt
+        assert "+small_change" not in prompt
+        assert "--- File: small.py (modified) ---" in prompt
+        assert "[... 1 file(s) with only line counts shown ...]" in prompt
+
     def test_extract_section(self, mock_analyzer, sample_gemini_response):
         """Test section extraction from review text."""
         assessment = mock_analyzer._extract_section(sample_gemini_response, ["Overall Assessment"])
@@ -189,6 +284,15 @@ class TestPRAnalyzer:
         assert len(strengths) > 0
         assert any("code structure" in s.lower() for s in strengths)
 
+    def test_extract_section_header_priority(self, mock_analyzer):
+        """Test that headers are tried in order, including numbered-list headers, and absent ones are skipped."""
+        text = "1. **Overall Assessment**:\nThe change is small and well tested.\n2. **Summary**:\nShort summary here.\n"
+
+        assert mock_analyzer._extract_section(text, ["Verdict", "Overall Assessment", "Summary"]) == (
+            "The change is small and well tested."
+        )
+        assert mock_analyzer._extract_section(text, ["Verdict"]) is None
+
     def test_parse_review(self, mock_analyzer, sample_gemini_response, sample_pr_data):
         """Test review parsing."""
         review = mock_analyzer._parse_review(
@@ -201,6 +305,28 @@ class TestPRAnalyzer:
         assert len(review.issues_found) > 0
         assert len(review.suggestions) > 0
 
+    def test_parse_review_file_comments(self, mock_analyzer, sample_gemini_response, sample_pr_data):
+        """Test that file comments are attributed to the full changed filename."""
+        file_changes = [{"filename": "feature.py"}] + sample_pr_data["file_changes"]
+
+        review = mock_analyzer._parse_review(sample_gemini_response, file_changes, "Title", "Body")
+
+        assert [(c.file_path, c.line_number) for c in review.file_comments] == [
+            ("src/feature.py", 1),
+            ("tests/test_feature.py", None),
+        ]
+
+    def test_parse_plain_prose_review(self, mock_analyzer, sample_pr_data):
+        """Test that a review without markup skips section extraction and uses its first paragraph."""
+        review_text = "I have reviewed the change. The new feature is small, readable and covered by focused tests."
+
+        with patch.object(mock_analyzer, "_extract_section") as extract_section:
+            review = mock_analyzer._parse_review(review_text, sample_pr_data["file_changes"], "Title", "Body")
+
+        extract_section.assert_not_called()
+        assert review.overall_assessment == "The new feature is small, readable and covered by focused tests."
+        assert review.file_comments == [] and review.strengths == []
+
     def test_format_review_summary(self, mock_analyzer):
         """Test review formatting."""
         review = PRReview(
@@ -273,6 +399,33 @@ class TestPRAnalyzer:
         assert "Error" in review.summary
         assert review.confidence_score == 0.0
 
+    def test_review_served_from_cache(self, tmp_path, sample_pr_data, sample_gemini_response):
+        """Test that an identical PR is reviewed once and a changed diff is reviewed again."""
+        with patch("google.genai.Client") as mock_client:
+            client = mock_client.return_value
+            client.models.generate_content.return_value = Mock(text=sample_gemini_response)
+
+            first = PRAnalyzer(api_key="test_key", cache_dir=str(tmp_path)).review_pr(
+                sample_pr_data["title"], sample_pr_data["body"], sample_pr_data["file_changes"]
+            )
+            reviewer = PRAnalyzer(api_key="test_key", cache_dir=str(tmp_path))
+            cached = reviewer.review_pr(sample_pr_data["title"], sample_pr_data["body"], sample_pr_data["file_changes"])
+            assert client.models.generate_content.call_count == 1
+            assert cached == first
+
+            changed = [dict(sample_pr_data["file_changes"][0], patch="+changed = True\n")]
+            reviewer.review_pr(sample_pr_data["title"], sample_pr_data["body"], changed)
+            assert client.models.generate_content.call_count == 2
+
+    def test_failed_review_not_cached(self, tmp_path, sample_pr_data):
+        """Test that an error review is not stored in the cache."""
+        with patch("google.genai.Client") as mock_client:
+            mock_client.return_value.models.generate_content.side_effect = Exception("API Error")
+            reviewer = PRAnalyzer(api_key="test_key", cache_dir=str(tmp_path))
+            reviewer.review_pr(sample_pr_data["title"], sample_pr_data["body"], sample_pr_data["file_changes"])
+
+        assert not list(tmp_path.glob("*.json"))
+
     def test_workflow_analysis(self, mock_analyzer_with_api):
         """Test workflow run analysis."""
         mock_response = Mock()
@@ -310,6 +463,37 @@ class TestPRAnalyzer:
         assert "test" in analysis
         assert "lint" in analysis
 
+    def test_batch_review_prs_async(self, mock_analyzer_with_api, sample_pr_data, sample_gemini_response):
+        """Test that PRs are reviewed concurrently, in order, and a failed review does not affect the others."""
+
+        async def respond(model, contents):
+            if "Broken PR" in contents:
+                raise Exception("API Error")
+            return Mock(text=sample_gemini_response)
+
+        mock_analyzer_with_api.client.aio.models.generate_content = AsyncMock(side_effect=respond)
+        prs = [
+            {"title": "Add new feature", "body": "Body", "file_changes": sample_pr_data["file_changes"]},
+            {"title": "Broken PR", "body": "Body", "file_changes": []},
+        ]
+
+        reviews = asyncio.run(mock_analyzer_with_api.batch_review_prs_async(prs, max_concurrency=2))
+
+        assert reviews[0].summary == sample_gemini_response
+        assert reviews[1].confidence_score == 0.0 and "API Error" in reviews[1].summary
+
+    def test_workflow_analysis_async(self, mock_analyzer_with_api):
+        """Test workflow run analysis through the async client."""
+        mock_analyzer_with_api.client.aio.models.generate_content = AsyncMock(return_value=Mock(text="Async analysis"))
+
+        analysis = asyncio.run(
+            mock_analyzer_with_api.analyze_workflow_run_async(
+                workflow_name="CI", conclusion="success", jobs=[], failed_jobs=[]
+            )
+        )
+
+        assert analysis == "Async analysis"
+
 
 class TestPRAnalyzerIntegration:
     """Integration tests for PR analyzer (requires actual API key)."""
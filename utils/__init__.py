@@ -6,7 +6,6 @@ A comprehensive AI-powered issue analysis system using Google's Gemini AI.
 
 __version__ = "1.0.0"
 
-from utils.analyzer import GeminiIssueAnalyzer
 from utils.models import (
     CodeLocation,
     CodeSolution,
@@ -31,3 +30,12 @@ __all__ = [
     "RootCauseAnalysis",
     "Severity",
 ]
+
+
+def __getattr__(name):
+    # Import the analyzer, and with it google-genai and scikit-learn, only when it is used
+    if name == "GeminiIssueAnalyzer":
+        from utils.analyzer import GeminiIssueAnalyzer
+
+        return GeminiIssueAnalyzer
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,19 +1,224 @@
 """Gemini-powered issue analyzer for code repositories."""
 
+import asyncio
 import json
+import logging
 import os
 import re
-from typing import Any, Dict, Optional
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from string import Formatter
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 
 from dotenv import load_dotenv
 from google import genai
-from google.genai import types
+from google.genai import errors, types
 
+from utils.cache import ResponseCache
 from utils.models import CodeLocation, CodeSolution, IssueAnalysis, IssueType, RootCauseAnalysis, Severity
+from utils.retrieval import CodebaseRetriever
+from utils.retry import backoff_delay, is_retryable_error
+
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Placeholders in a custom prompt template that change per issue; everything else is rendered once
+_PER_ISSUE_FIELDS = ("title", "issue_description")
+
+_FORMATTER = Formatter()
+
+# Token budget for the codebase so prompts stay within the model's input limit (1M tokens for Gemini 2.0 Flash)
+DEFAULT_MAX_CODEBASE_TOKENS = 900_000
+
+# Rough characters-per-token ratio used to estimate prompt size without an extra API round trip
+CHARS_PER_TOKEN = 4
+
+# Lifetime of the Gemini context cache holding the codebase when use_context_cache is enabled
+DEFAULT_CONTEXT_CACHE_TTL = "3600s"
+
+# Stands in for the codebase in prompts when it is served from the Gemini context cache
+_CACHED_CODEBASE_NOTE = "The full codebase is provided in the cached context preceding this request."
+
+# Default analysis prompt, split around the issue details and codebase so only the issue is formatted per request
+_DEFAULT_PROMPT_HEAD = """
+You are an expert software engineer analyzing a code issue. 
+Your task is to perform comprehensive issue analysis based on the provided codebase.
+
+INSTRUCTIONS:
+1. Analyze the provided codebase content thoroughly
+2. Provide concrete code solutions in diff format when you have sufficient context
+3. If the relevant files or context are available, propose specific code changes
+4. If critical information is missing, acknowledge this and provide solutions at the appropriate level of detail
+5. Aim to provide 2-3 solutions when feasible
+
+ISSUE DETAILS:
+"""
+
+_DEFAULT_PROMPT_TAIL = """
+
+ANALYSIS REQUIREMENTS:
+1. **Issue Classification**: Determine if this is a 'bug', 'enhancement', or 'feature_request'
+2. **Severity Assessment**: Rate as 'low', 'medium', 'high', or 'critical'
+3. **Root Cause Analysis**: Identify the primary cause based on available information
+4. **Code Location Identification**: Identify relevant files, functions, and classes when found
+5. **Solution Proposal**: Provide 2-3 solutions with code changes when applicable
+
+RESPONSE FORMAT (JSON):
+{
+    "issue_type": "bug|enhancement|feature_request",
+    "severity": "low|medium|high|critical",
+    "root_cause_analysis": {
+        "primary_cause": "Main reason based on code analysis",
+        "contributing_factors": ["factor1 with reference", "factor2 with reference"],
+        "affected_components": ["component1 (file:line)", "component2 (file:line)"],
+        "related_code_locations": [
+            {
+                "file_path": "path/from/codebase.py",
+                "line_number": 123,
+                "function_name": "function_name",
+                "class_name": "ClassName"
+            }
+        ]
+    },
+    "proposed_solutions": [
+        {
+            "description": "Detailed solution description",
+            "code_changes": "Code changes in diff format when applicable, or description if insufficient context",
+            "location": {
+                "file_path": "path/to/file.py",
+                "line_number": 123,
+                "function_name": "function_name",
+                "class_name": "ClassName"
+            },
+            "rationale": "Why this solution works"
+        }
+    ],
+    "confidence_score": 0.85,
+    "analysis_summary": "Brief summary of analysis"
+}
+
+CODE SOLUTION GUIDELINES (when applicable):
+- Use diff format for code changes when you have sufficient context:
+  ```diff
+  --- a/path/to/file.py
+  +++ b/path/to/file.py
+  @@ -10,5 +10,8 @@
+       existing_code()
+  -    old_line_to_remove()
+  +    new_line_to_add()
+  +    another_new_line()
+  ```
+- Include actual code from the codebase in your diffs
+- Show context lines for clarity (unchanged code around the changes)
+- Reference specific file paths, line numbers, and function/class names
+- If exact implementation details are unclear, provide conceptual guidance instead of guessing
+
+ANALYSIS BEST PRACTICES:
+- Be accurate and honest about what you can determine from the codebase
+- Provide code-level solutions when the relevant files and context are available
+- Offer architectural or conceptual guidance when specific implementation details are missing
+- Reference actual code patterns and structures from the codebase
+- Prioritize correctness over completeness
+
+Please analyze the issue and provide your response in the exact JSON format specified above.
+"""
+
+
+@lru_cache(maxsize=4)
+def _read_text_file(path: str, mtime_ns: int) -> str:
+    """Read a UTF-8 text file, cached per (path, mtime) so analyzers in one process share a single copy."""
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _loads_json(text: str) -> Any:
+    """Parse JSON with orjson when installed, falling back to the standard library.
+
+    orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers handle both the same way.
+    """
+    return orjson.loads(text) if ORJSON_AVAILABLE else json.loads(text)
+
+
+def _load_text_file(path: str) -> str:
+    """Load a text file through the shared cache, re-reading it only when it changes on disk."""
+    return _read_text_file(os.path.abspath(path), os.stat(path).st_mtime_ns)
+
+
+def _is_context_cache_error(error: Exception) -> bool:
+    """Return True if a request failed because its context cache is missing, expired or inaccessible."""
+    if not isinstance(error, errors.ClientError):
+        return False
+    if error.code == 404 or error.status == "NOT_FOUND":
+        return True
+    return error.code in (400, 403) and "cachedcontent" in str(error.message or "").lower()
+
+
+# Template file paths that mean the model echoed the example instead of locating real code
+_PLACEHOLDER_PATH_RE = re.compile(r"path/to/|^example\.py\Z", re.IGNORECASE)
+
+# Keywords used to classify unstructured responses, in priority order per label
+_ISSUE_TYPE_KEYWORDS = (
+    ("enhancement", ("enhancement", "improve", "optimize")),
+    ("feature_request", ("feature", "new", "add")),
+)
+_SEVERITY_KEYWORDS = (
+    ("critical", ("critical", "severe", "urgent")),
+    ("high", ("high", "important")),
+    ("low", ("low", "minor")),
+)
+
+# Finds every keyword occurrence, overlapping ones included, so matches behave like substring checks
+_TEXT_KEYWORD_RE = re.compile(
+    "(?=({}))".format("|".join(word for _, words in _ISSUE_TYPE_KEYWORDS + _SEVERITY_KEYWORDS for word in words))
+)
+
+# Characters that can change the nesting state while scanning for a JSON object
+_JSON_STRUCTURE_RE = re.compile(r'[{}"\\]')
+
+
+def _extract_json_object(text: str) -> Optional[str]:
+    """Return the first balanced {...} object in text, or None if there is none.
+
+    Scans once from the first opening brace, tracking string literals and escapes so that braces
+    inside JSON strings (e.g. code in a diff) do not end the object early.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+
+    depth = 0
+    in_string = False
+    escaped_pos = -1
+    for match in _JSON_STRUCTURE_RE.finditer(text, start):
+        pos = match.start()
+        if pos == escaped_pos:
+            continue
+        char = match.group()
+        if char == "\\":
+            if in_string:
+                escaped_pos = pos + 1
+        elif char == '"':
+            in_string = not in_string
+        elif in_string:
+            continue
+        elif char == "{":
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return text[start : pos + 1]
+    return None
+
 
 class GeminiIssueAnalyzer:
     """Analyzer that uses Google's Gemini AI to analyze code issues."""
@@ -24,6 +229,10 @@ class GeminiIssueAnalyzer:
         source_path: Optional[str] = None,
         custom_prompt_path: Optional[str] = None,
         model_name: Optional[str] = None,
+        max_codebase_tokens: Optional[int] = None,
+        cache_dir: Optional[str] = None,
+        use_context_cache: bool = False,
+        max_relevant_files: Optional[int] = None,
     ):
         """Initialize the Gemini analyzer.
 
@@ -32,10 +241,22 @@ class GeminiIssueAnalyzer:
             source_path: Path to source of truth file. If not provided, defaults to repomix-output.txt.
             custom_prompt_path: Path to custom prompt template file. If not provided, uses default prompt.
             model_name: Gemini model name. If not provided, defaults to gemini-2.0-flash-001.
+            max_codebase_tokens: Estimated token budget for the codebase. Larger codebases are truncated.
+                If not provided, defaults to DEFAULT_MAX_CODEBASE_TOKENS.
+            cache_dir: Directory for caching analyses on disk. Re-analyzing an issue with the same
+                title, description, codebase, prompt and model is then served from the cache.
+            use_context_cache: Upload the codebase once to a Gemini context cache and reference it from each
+                request instead of sending it inline. Falls back to inline prompts if caching is unavailable.
+            max_relevant_files: Send only this many files of the codebase per issue, ranked by TF-IDF similarity
+                to the issue, instead of the whole codebase. Requires repomix output with file separators.
         """
         self.api_key = api_key or os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
         if not self.api_key:
             raise ValueError("Gemini API key not found. Set GEMINI_API_KEY or GOOGLE_API_KEY environment variable.")
+        if max_relevant_files is not None and max_relevant_files < 1:
+            raise ValueError("max_relevant_files must be at least 1")
+        if max_relevant_files and use_context_cache:
+            raise ValueError("max_relevant_files and use_context_cache cannot be combined: the codebase differs per issue")
 
         # Initialize the new Gen AI client
         self.client = genai.Client(api_key=self.api_key)
@@ -47,19 +268,99 @@ class GeminiIssueAnalyzer:
         # Store custom prompt path
         self.custom_prompt_path = custom_prompt_path
 
-        # Load the codebase content
-        self.codebase_content = self._load_codebase()
+        # Load the codebase content, trimmed so every prompt fits the model's context window
+        self.max_codebase_tokens = max_codebase_tokens or DEFAULT_MAX_CODEBASE_TOKENS
+        codebase_content = self._load_codebase()
+        self.codebase_content = self._truncate_codebase(codebase_content)
+
+        # Optionally index the untrimmed codebase by file so each prompt carries only the files relevant to the issue
+        self.max_relevant_files = max_relevant_files
+        self._retriever = CodebaseRetriever(codebase_content) if max_relevant_files else None
+
+        # Optionally serve the codebase from a Gemini context cache so requests only carry the issue
+        self._context_cache_name = self._create_context_cache() if use_context_cache else None
+        self._generate_config = (
+            types.GenerateContentConfig(cached_content=self._context_cache_name) if self._context_cache_name else None
+        )
+
+        # Pre-render the custom prompt once so each request only fills in the issue fields
+        self._custom_prompt_parts = self._compile_custom_prompt() if custom_prompt_path else None
+        self._default_prompt_suffix = None if custom_prompt_path else self._compile_default_prompt(self._prompt_codebase)
+
+        # Optional response cache; entries are namespaced by everything besides the issue that shapes the answer
+        self.response_cache = ResponseCache(cache_dir) if cache_dir else None
+        self._cache_namespace = (
+            ResponseCache.make_key(
+                self.model_name,
+                self.codebase_content,
+                str(max_relevant_files or ""),
+                _load_text_file(custom_prompt_path) if custom_prompt_path else "",
+            )
+            if self.response_cache
+            else None
+        )
 
     def _load_codebase(self) -> str:
         """Load the codebase content from the specified source path."""
         try:
-            with open(self.source_path, "r", encoding="utf-8") as f:
-                return f.read()
+            return _load_text_file(self.source_path)
         except FileNotFoundError:
             raise FileNotFoundError(
                 f"Source file '{self.source_path}' not found. Please ensure it exists and the path is correct."
             )
 
+    def _truncate_codebase(self, content: str) -> str:
+        """Trim the codebase to the token budget, keeping its head and tail.
+
+        An oversized prompt is rejected by the API on every attempt, so it is cheaper to cut it down once here.
+        """
+        max_chars = self.max_codebase_tokens * CHARS_PER_TOKEN
+        if len(content) <= max_chars:
+            return content
+
+        omitted_tokens = (len(content) - max_chars) // CHARS_PER_TOKEN
+        logger.warning(
+            "Codebase is ~%d tokens, over the %d token budget; truncating ~%d tokens",
+            len(content) // CHARS_PER_TOKEN,
+            self.max_codebase_tokens,
+            omitted_tokens,
+        )
+        half = max_chars // 2
+        return f"{content[:half]}\n...[truncated ~{omitted_tokens} tokens]...\n{content[-half:]}"
+
+    def _create_context_cache(self) -> Optional[str]:
+        """Upload the codebase to a Gemini context cache.
+
+        Returns:
+            Name of the cached content, or None if the API rejected it (e.g. the codebase is below the minimum size)
+        """
+        try:
+            cached_content = self.client.caches.create(
+                model=self.model_name,
+                config=types.CreateCachedContentConfig(
+                    contents=[f"CODEBASE CONTENT:\n{self.codebase_content}"],
+                    ttl=DEFAULT_CONTEXT_CACHE_TTL,
+                ),
+            )
+            return cached_content.name
+        except Exception as e:
+            logger.warning("Context caching unavailable, sending the codebase inline: %s", e)
+            return None
+
+    def _disable_context_cache(self) -> None:
+        """Switch to inline codebase prompts, e.g. after the context cache expired."""
+        self._context_cache_name = None
+        if self.custom_prompt_path:
+            self._custom_prompt_parts = self._compile_custom_prompt()
+        else:
+            self._default_prompt_suffix = self._compile_default_prompt(self._prompt_codebase)
+        self._generate_config = None
+
+    @property
+    def _prompt_codebase(self) -> str:
+        """Codebase text to embed in prompts."""
+        return _CACHED_CODEBASE_NOTE if self._context_cache_name else self.codebase_content
+
     def analyze_issue(self, title: str, issue_description: str, max_retries: int = 2) -> IssueAnalysis:
         """Analyze an issue using Gemini AI with retry mechanism.
 
@@ -71,32 +372,220 @@ class GeminiIssueAnalyzer:
         Returns:
             Complete issue analysis
         """
+        cache_key = self._response_cache_key(title, issue_description) if self.response_cache else None
+        if cache_key:
+            cached = self._get_cached_analysis(cache_key, title, issue_description)
+            if cached:
+                return cached
+
+        config, prompt = None, None
         for attempt in range(max_retries + 1):
             try:
-                prompt = self._create_analysis_prompt(title, issue_description)
+                # Build the prompt once; rebuild only if the context cache was dropped after a failure
+                if prompt is None or config is not self._generate_config:
+                    config, prompt = self._prepare_request(title, issue_description)
+
+                response = self.client.models.generate_content(model=self.model_name, contents=prompt, config=config)
+                analysis = self._accept_response(title, issue_description, response.text, attempt, max_retries, cache_key)
+                if analysis is not None:
+                    return analysis
+
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, max_retries)
+                if delay is None:
+                    # Fallback analysis if all attempts fail
+                    return self._create_fallback_analysis(title, issue_description, str(e))
+                if delay:
+                    time.sleep(delay)
 
-                response = self.client.models.generate_content(model=self.model_name, contents=prompt)
-                analysis_data = self._parse_gemini_response(response.text)
+    async def analyze_issue_async(self, title: str, issue_description: str, max_retries: int = 2) -> IssueAnalysis:
+        """Analyze an issue using the async Gemini client, with the same retry behavior as analyze_issue.
 
-                analysis = IssueAnalysis(title=title, description=issue_description, **analysis_data)
+        Args:
+            title: Issue title
+            issue_description: Detailed issue description
+            max_retries: Maximum number of retry attempts (default: 2)
 
-                # Check if this is a low-quality/fallback response
-                if self._is_low_quality_response(analysis):
-                    if attempt < max_retries:
-                        print(f"Low quality response detected, retrying... (attempt {attempt + 2}/{max_retries + 1})")
-                        continue
-                    else:
-                        print("Max retries reached, returning best available analysis")
+        Returns:
+            Complete issue analysis
+        """
+        cache_key = self._response_cache_key(title, issue_description) if self.response_cache else None
+        if cache_key:
+            cached = self._get_cached_analysis(cache_key, title, issue_description)
+            if cached:
+                return cached
 
-                return analysis
+        config, prompt = None, None
+        for attempt in range(max_retries + 1):
+            try:
+                # Build the prompt once; rebuild only if the context cache was dropped after a failure
+                if prompt is None or config is not self._generate_config:
+                    config, prompt = self._prepare_request(title, issue_description)
+
+                response = await self.client.aio.models.generate_content(model=self.model_name, contents=prompt, config=config)
+                analysis = self._accept_response(title, issue_description, response.text, attempt, max_retries, cache_key)
+                if analysis is not None:
+                    return analysis
 
             except Exception as e:
-                if attempt < max_retries:
-                    print(f"Analysis failed, retrying... (attempt {attempt + 2}/{max_retries + 1})")
-                    continue
-                else:
-                    # Fallback analysis if all attempts fail
+                delay = self._retry_delay(e, attempt, max_retries)
+                if delay is None:
                     return self._create_fallback_analysis(title, issue_description, str(e))
+                if delay:
+                    await asyncio.sleep(delay)
+
+    def _prepare_request(self, title: str, issue_description: str) -> Tuple[Optional[types.GenerateContentConfig], str]:
+        """Build the request config and prompt for an issue once, to be reused across retries."""
+        # Read the config first: _disable_context_cache clears it only after the inline prompt is ready
+        config = self._generate_config
+        return config, self._create_analysis_prompt(title, issue_description)
+
+    def _accept_response(
+        self,
+        title: str,
+        issue_description: str,
+        response_text: str,
+        attempt: int,
+        max_retries: int,
+        cache_key: Optional[str],
+    ) -> Optional[IssueAnalysis]:
+        """Build an analysis from a Gemini response.
+
+        Returns:
+            The analysis, or None if it is low quality and should be retried
+        """
+        analysis_data = self._parse_gemini_response(response_text)
+        analysis = IssueAnalysis(title=title, description=issue_description, **analysis_data)
+
+        # Check if this is a low-quality/fallback response
+        if self._is_low_quality_response(analysis):
+            if attempt < max_retries:
+                logger.warning("Low quality response detected, retrying... (attempt %d/%d)", attempt + 2, max_retries + 1)
+                return None
+            logger.warning("Max retries reached, returning best available analysis")
+        elif cache_key:
+            self.response_cache.set(cache_key, analysis.model_dump_json())
+
+        return analysis
+
+    def _retry_delay(self, error: Exception, attempt: int, max_retries: int) -> Optional[float]:
+        """Decide whether a failed request should be retried.
+
+        Returns:
+            Seconds to wait before the next attempt, or None to give up
+        """
+        if attempt >= max_retries:
+            return None
+        if self._context_cache_name and _is_context_cache_error(error):
+            logger.warning("Request with context cache failed, retrying with inline codebase: %s", error)
+            self._disable_context_cache()
+            return 0.0
+        if is_retryable_error(error):
+            logger.warning("Analysis failed, retrying... (attempt %d/%d): %s", attempt + 2, max_retries + 1, error)
+            return backoff_delay(attempt)
+        return None
+
+    def _response_cache_key(self, title: str, issue_description: str) -> str:
+        """Build the response cache key for an issue, ignoring whitespace differences."""
+        return ResponseCache.make_key(self._cache_namespace, " ".join(title.split()), " ".join(issue_description.split()))
+
+    def _get_cached_analysis(self, cache_key: str, title: str, issue_description: str) -> Optional[IssueAnalysis]:
+        """Load a cached analysis, or None if there is no usable entry."""
+        cached = self.response_cache.get(cache_key)
+        if cached is None:
+            return None
+        try:
+            analysis = IssueAnalysis.model_validate_json(cached)
+        except ValueError as e:
+            logger.warning("Ignoring unreadable cache entry %s: %s", cache_key, e)
+            return None
+        logger.debug("Serving analysis for %r from cache", title)
+        return analysis.model_copy(update={"title": title, "description": issue_description})
+
+    def batch_analyze_issues(
+        self, issues: List[Dict[str, str]], max_retries: int = 2, max_workers: int = 8
+    ) -> List[IssueAnalysis]:
+        """Analyze multiple issues concurrently.
+
+        Gemini calls are network-bound, so running them on a thread pool lets requests overlap.
+
+        Args:
+            issues: List of dictionaries with 'title' and 'description' keys
+            max_retries: Maximum number of retry attempts per issue (default: 2)
+            max_workers: Maximum number of concurrent Gemini requests (default: 8)
+
+        Returns:
+            List of issue analyses in the same order as the input issues
+        """
+        analyses = [None] * len(issues)
+        for index, analysis in self.iter_batch_analyses(issues, max_retries=max_retries, max_workers=max_workers):
+            analyses[index] = analysis
+        return analyses
+
+    def iter_batch_analyses(
+        self, issues: List[Dict[str, str]], max_retries: int = 2, max_workers: int = 8
+    ) -> Iterator[Tuple[int, IssueAnalysis]]:
+        """Analyze multiple issues concurrently, yielding each analysis as soon as it is ready.
+
+        Args:
+            issues: List of dictionaries with 'title' and 'description' keys
+            max_retries: Maximum number of retry attempts per issue (default: 2)
+            max_workers: Maximum number of concurrent Gemini requests (default: 8)
+
+        Yields:
+            (index, analysis) pairs in completion order, where index is the position in issues
+        """
+        if not issues:
+            return
+
+        # Analyze identical issues once and hand every duplicate its own copy of the result
+        indices_by_issue = {}
+        for index, issue in enumerate(issues):
+            indices_by_issue.setdefault((issue["title"], issue["description"]), []).append(index)
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(indices_by_issue))) as executor:
+            futures = {
+                executor.submit(self.analyze_issue, title, description, max_retries): indices
+                for (title, description), indices in indices_by_issue.items()
+            }
+            for future in as_completed(futures):
+                analysis = future.result()
+                first, *duplicates = futures[future]
+                yield first, analysis
+                for index in duplicates:
+                    yield index, analysis.model_copy(deep=True)
+
+    async def batch_analyze_issues_async(
+        self, issues: List[Dict[str, str]], max_retries: int = 2, max_concurrency: int = 8
+    ) -> List[IssueAnalysis]:
+        """Analyze multiple issues concurrently on the event loop.
+
+        Unlike batch_analyze_issues this needs no worker threads, so several batches can be awaited together.
+
+        Args:
+            issues: List of dictionaries with 'title' and 'description' keys
+            max_retries: Maximum number of retry attempts per issue (default: 2)
+            max_concurrency: Maximum number of in-flight Gemini requests (default: 8)
+
+        Returns:
+            List of issue analyses in the same order as the input issues
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def analyze(title: str, description: str) -> IssueAnalysis:
+            async with semaphore:
+                return await self.analyze_issue_async(title, description, max_retries)
+
+        # Analyze identical issues once and hand every duplicate its own copy of the result
+        unique_issues = list(dict.fromkeys((issue["title"], issue["description"]) for issue in issues))
+        results = dict(zip(unique_issues, await asyncio.gather(*(analyze(*key) for key in unique_issues))))
+
+        analyses, seen = [], set()
+        for issue in issues:
+            key = (issue["title"], issue["description"])
+            analyses.append(results[key].model_copy(deep=True) if key in seen else results[key])
+            seen.add(key)
+        return analyses
 
     def _create_analysis_prompt(self, title: str, issue_description: str) -> str:
         """Create a detailed prompt for Gemini analysis."""
@@ -105,132 +594,114 @@ class GeminiIssueAnalyzer:
 
         return self._get_default_prompt(title, issue_description)
 
-    def _load_custom_prompt(self, title: str, issue_description: str) -> str:
-        """Load and process custom prompt template."""
-        try:
-            with open(self.custom_prompt_path, "r", encoding="utf-8") as f:
-                custom_prompt_template = f.read()
+    def _compile_custom_prompt(self) -> List[Union[str, Tuple[str, Optional[str], str]]]:
+        """Read the custom prompt template and render everything except the per-issue placeholders.
 
-            # Replace placeholders in the custom prompt
-            return custom_prompt_template.format(
-                title=title, issue_description=issue_description, codebase_content=self.codebase_content
-            )
+        Returns:
+            Template segments: rendered text, or (field_name, conversion, format_spec) for title/issue_description
+        """
+        try:
+            custom_prompt_template = _load_text_file(self.custom_prompt_path)
         except FileNotFoundError:
             raise FileNotFoundError(
                 f"Custom prompt file '{self.custom_prompt_path}' not found. Please ensure it exists and the path is correct."
             )
-        except KeyError as e:
+
+        # With retrieval the codebase depends on the issue, so it is filled in per request as well
+        per_issue_fields = _PER_ISSUE_FIELDS + ("codebase_content",) if self._retriever else _PER_ISSUE_FIELDS
+        static_values = {"codebase_content": self._prompt_codebase}
+        try:
+            parts = self._split_template(custom_prompt_template, per_issue_fields, static_values)
+        except (KeyError, IndexError) as e:
             raise ValueError(
                 f"Custom prompt template missing required placeholder: {e}. Available placeholders: {{title}}, {{issue_description}}, {{codebase_content}}"
             )
 
-    def _get_default_prompt(self, title: str, issue_description: str) -> str:
-        """Get the default analysis prompt."""
-        return f"""
-You are an expert software engineer analyzing a code issue. 
-Your task is to perform comprehensive issue analysis based on the provided codebase.
-
-INSTRUCTIONS:
-1. Analyze the provided codebase content thoroughly
-2. Provide concrete code solutions in diff format when you have sufficient context
-3. If the relevant files or context are available, propose specific code changes
-4. If critical information is missing, acknowledge this and provide solutions at the appropriate level of detail
-5. Aim to provide 2-3 solutions when feasible
-
-ISSUE DETAILS:
-Title: {title}
-Description: {issue_description}
-
-CODEBASE CONTENT:
-{self.codebase_content}
-
-ANALYSIS REQUIREMENTS:
-1. **Issue Classification**: Determine if this is a 'bug', 'enhancement', or 'feature_request'
-2. **Severity Assessment**: Rate as 'low', 'medium', 'high', or 'critical'
-3. **Root Cause Analysis**: Identify the primary cause based on available information
-4. **Code Location Identification**: Identify relevant files, functions, and classes when found
-5. **Solution Proposal**: Provide 2-3 solutions with code changes when applicable
+        # Merge adjacent rendered text so the codebase is joined into a single segment up front
+        compiled = []
+        for part in parts:
+            if isinstance(part, str) and compiled and isinstance(compiled[-1], str):
+                compiled[-1] += part
+            else:
+                compiled.append(part)
+        return compiled
+
+    @classmethod
+    def _split_template(
+        cls, template: str, per_issue_fields: Tuple[str, ...], static_values: Dict[str, Any]
+    ) -> List[Union[str, Tuple[str, Optional[str], str]]]:
+        """Render the static placeholders of a template, keeping per-issue ones as (field, conversion, spec) tuples.
+
+        Raises:
+            KeyError, IndexError: If the template references a placeholder that has no value
+        """
+        parts = []
+        for literal, field_name, format_spec, conversion in _FORMATTER.parse(template):
+            if literal:
+                parts.append(literal)
+            if field_name is None:
+                continue
+            if re.split(r"[.\[]", field_name, maxsplit=1)[0] in per_issue_fields:
+                parts.append((field_name, conversion, format_spec))
+            else:
+                parts.append(cls._render_field(field_name, conversion, format_spec, static_values))
+        return parts
+
+    @staticmethod
+    def _render_field(field_name: str, conversion: Optional[str], format_spec: str, values: Dict[str, Any]) -> str:
+        """Render a single replacement field exactly as str.format would."""
+        obj, _ = _FORMATTER.get_field(field_name, (), values)
+        return _FORMATTER.format_field(_FORMATTER.convert_field(obj, conversion), format_spec)
 
-RESPONSE FORMAT (JSON):
-{{
-    "issue_type": "bug|enhancement|feature_request",
-    "severity": "low|medium|high|critical",
-    "root_cause_analysis": {{
-        "primary_cause": "Main reason based on code analysis",
-        "contributing_factors": ["factor1 with reference", "factor2 with reference"],
-        "affected_components": ["component1 (file:line)", "component2 (file:line)"],
-        "related_code_locations": [
-            {{
-                "file_path": "path/from/codebase.py",
-                "line_number": 123,
-                "function_name": "function_name",
-                "class_name": "ClassName"
-            }}
-        ]
-    }},
-    "proposed_solutions": [
-        {{
-            "description": "Detailed solution description",
-            "code_changes": "Code changes in diff format when applicable, or description if insufficient context",
-            "location": {{
-                "file_path": "path/to/file.py",
-                "line_number": 123,
-                "function_name": "function_name",
-                "class_name": "ClassName"
-            }},
-            "rationale": "Why this solution works"
-        }}
-    ],
-    "confidence_score": 0.85,
-    "analysis_summary": "Brief summary of analysis"
-}}
+    def _load_custom_prompt(self, title: str, issue_description: str) -> str:
+        """Fill the issue placeholders of the pre-rendered custom prompt template."""
+        values = {"title": title, "issue_description": issue_description}
+        if self._retriever:
+            values["codebase_content"] = self._relevant_codebase(title, issue_description)
+        return "".join(
+            part if isinstance(part, str) else self._render_field(*part, values) for part in self._custom_prompt_parts
+        )
 
-CODE SOLUTION GUIDELINES (when applicable):
-- Use diff format for code changes when you have sufficient context:
-  ```diff
-  --- a/path/to/file.py
-  +++ b/path/to/file.py
-  @@ -10,5 +10,8 @@
-       existing_code()
-  -    old_line_to_remove()
-  +    new_line_to_add()
-  +    another_new_line()
-  ```
-- Include actual code from the codebase in your diffs
-- Show context lines for clarity (unchanged code around the changes)
-- Reference specific file paths, line numbers, and function/class names
-- If exact implementation details are unclear, provide conceptual guidance instead of guessing
+    @staticmethod
+    def _compile_default_prompt(codebase_content: str) -> str:
+        """Render the part of the default prompt that follows the issue details, including the codebase."""
+        return f"\n\nCODEBASE CONTENT:\n{codebase_content}{_DEFAULT_PROMPT_TAIL}"
 
-ANALYSIS BEST PRACTICES:
-- Be accurate and honest about what you can determine from the codebase
-- Provide code-level solutions when the relevant files and context are available
-- Offer architectural or conceptual guidance when specific implementation details are missing
-- Reference actual code patterns and structures from the codebase
-- Prioritize correctness over completeness
+    def _relevant_codebase(self, title: str, issue_description: str) -> str:
+        """Return the codebase files most relevant to the issue, trimmed to the token budget."""
+        return self._truncate_codebase(self._retriever.retrieve(f"{title}\n{issue_description}", self.max_relevant_files))
 
-Please analyze the issue and provide your response in the exact JSON format specified above.
-"""
+    def _get_default_prompt(self, title: str, issue_description: str) -> str:
+        """Get the default analysis prompt."""
+        suffix = self._default_prompt_suffix
+        if self._retriever:
+            suffix = self._compile_default_prompt(self._relevant_codebase(title, issue_description))
+        return f"{_DEFAULT_PROMPT_HEAD}Title: {title}\nDescription: {issue_description}{suffix}"
 
     def _is_low_quality_response(self, analysis: IssueAnalysis) -> bool:
-        """Check if the analysis response is low quality and should be retried."""
-        low_quality_indicators = [
+        """Check if the analysis response is low quality and should be retried.
+
+        Cheap scalar checks run first and the solutions are walked once, stopping at the first failing check.
+        """
+        if (
             # Check for insufficient number of solutions
-            len(analysis.proposed_solutions) < 1,
+            not analysis.proposed_solutions
             # Check for very low confidence (extremely low threshold)
-            analysis.confidence_score < 0.3,
-            # Check for generic placeholder file paths that indicate no real analysis
-            any("path/to/" in solution.location.file_path.lower() for solution in analysis.proposed_solutions),
-            any("example.py" == solution.location.file_path.lower() for solution in analysis.proposed_solutions),
+            or analysis.confidence_score < 0.3
             # Check for empty or extremely short analysis (likely a failure case)
-            len(analysis.analysis_summary.strip()) < 20,
+            or len(analysis.analysis_summary.strip()) < 20
             # Check for completely empty primary cause
-            len(analysis.root_cause_analysis.primary_cause.strip()) < 10,
-            # Check for solutions with no meaningful content
-            any(len(solution.description.strip()) < 10 for solution in analysis.proposed_solutions),
-        ]
+            or len(analysis.root_cause_analysis.primary_cause.strip()) < 10
+        ):
+            return True
 
-        # Return True if any low quality indicators are present
-        return any(low_quality_indicators)
+        return any(
+            # Check for solutions with no meaningful content
+            len(solution.description.strip()) < 10
+            # Check for generic placeholder file paths that indicate no real analysis
+            or _PLACEHOLDER_PATH_RE.search(solution.location.file_path) is not None
+            for solution in analysis.proposed_solutions
+        )
 
     def _parse_gemini_response(self, response_text: str) -> Dict[str, Any]:
         """Parse Gemini's response and extract analysis data."""
@@ -238,60 +709,29 @@ Please analyze the issue and provide your response in the exact JSON format spec
         json_block_match = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", response_text, re.DOTALL)
         if json_block_match:
             try:
-                return json.loads(json_block_match.group(1))
+                return _loads_json(json_block_match.group(1))
             except json.JSONDecodeError:
                 pass  # Try next strategy
 
-        # Strategy 2: Try to find a JSON object by counting braces
-        try:
-            start_idx = response_text.find("{")
-            if start_idx != -1:
-                brace_count = 0
-                end_idx = start_idx
-                for i in range(start_idx, len(response_text)):
-                    if response_text[i] == "{":
-                        brace_count += 1
-                    elif response_text[i] == "}":
-                        brace_count -= 1
-                        if brace_count == 0:
-                            end_idx = i + 1
-                            break
-
-                if end_idx > start_idx:
-                    json_str = response_text[start_idx:end_idx]
-                    return json.loads(json_str)
-        except json.JSONDecodeError:
-            pass  # Try next strategy
-
-        # Strategy 3: Try greedy regex as last resort
-        try:
-            json_match = re.search(r"\{.*\}", response_text, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group(0))
-        except json.JSONDecodeError:
-            pass
+        # Strategy 2: Take the first balanced JSON object, ignoring braces inside string literals
+        json_str = _extract_json_object(response_text)
+        if json_str is not None:
+            try:
+                return _loads_json(json_str)
+            except json.JSONDecodeError:
+                pass  # Fall back to text extraction
 
         # All strategies failed, fall back to text extraction
-        print("Warning: Could not parse JSON from Gemini response, using fallback text extraction")
-        print(f"Response preview: {response_text[:500]}...")
+        logger.warning("Could not parse JSON from Gemini response, using fallback text extraction")
+        logger.debug("Response preview: %.500s...", response_text)
         return self._extract_from_text(response_text)
 
     def _extract_from_text(self, text: str) -> Dict[str, Any]:
         """Extract analysis data from plain text response."""
-        # Simple text parsing as fallback
-        issue_type = "bug"  # default
-        if any(word in text.lower() for word in ["enhancement", "improve", "optimize"]):
-            issue_type = "enhancement"
-        elif any(word in text.lower() for word in ["feature", "new", "add"]):
-            issue_type = "feature_request"
-
-        severity = "medium"  # default
-        if any(word in text.lower() for word in ["critical", "severe", "urgent"]):
-            severity = "critical"
-        elif any(word in text.lower() for word in ["high", "important"]):
-            severity = "high"
-        elif any(word in text.lower() for word in ["low", "minor"]):
-            severity = "low"
+        # Simple text parsing as fallback: collect every keyword in one scan, then pick labels by priority
+        found = set(_TEXT_KEYWORD_RE.findall(text.lower()))
+        issue_type = next((label for label, words in _ISSUE_TYPE_KEYWORDS if found.intersection(words)), "bug")
+        severity = next((label for label, words in _SEVERITY_KEYWORDS if found.intersection(words)), "medium")
 
         # Try to extract meaningful content from the text
         primary_cause = "Unable to parse structured analysis from response"
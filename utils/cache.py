@@ -0,0 +1,71 @@
+"""On-disk cache for Gemini responses."""
+
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Cached responses expire after a day by default so codebase or model drift is eventually picked up
+DEFAULT_CACHE_TTL = 24 * 60 * 60
+
+
+class ResponseCache:
+    """Content-addressed cache storing one text entry per key in a directory."""
+
+    def __init__(self, cache_dir: Union[str, Path], ttl_seconds: Optional[float] = DEFAULT_CACHE_TTL):
+        """Initialize the cache.
+
+        Args:
+            cache_dir: Directory holding cache entries. Created if missing; '~' is expanded.
+            ttl_seconds: Maximum age of an entry in seconds, or None to keep entries forever.
+        """
+        self.cache_dir = Path(cache_dir).expanduser()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """Build a cache key by hashing the given parts.
+
+        Args:
+            parts: Strings that together identify the cached value
+
+        Returns:
+            Hex digest usable as a file name
+        """
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value for key, or None if it is missing or expired."""
+        path = self._entry_path(key)
+        try:
+            if self.ttl_seconds is not None and time.time() - path.stat().st_mtime > self.ttl_seconds:
+                return None
+            return path.read_text(encoding="utf-8")
+        except OSError:
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        """Store value under key, replacing any previous entry atomically."""
+        path = self._entry_path(key)
+        try:
+            with tempfile.NamedTemporaryFile(
+                "w", encoding="utf-8", dir=self.cache_dir, suffix=".tmp", delete=False
+            ) as tmp_file:
+                tmp_file.write(value)
+            os.replace(tmp_file.name, path)
+        except OSError as e:
+            logger.warning("Failed to write cache entry %s: %s", path, e)
+
+    def _entry_path(self, key: str) -> Path:
+        """Return the file path for a cache key."""
+        return self.cache_dir / f"{key}.json"
@@ -1,14 +1,178 @@
 """Cosine similarity-based duplicate issue analyzer."""
 
+import math
 import re
-from typing import List, Optional, Tuple
+from bisect import bisect_left
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Collection, Dict, List, Optional, Tuple
 
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from scipy.sparse import csc_matrix
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
 
 from utils.models import DuplicateDetectionResult, IssueReference
 
+# Number of distinct issue texts whose preprocessed text and TF-IDF tokens are kept between calls
+_TOKEN_CACHE_SIZE = 10_000
+
+# Number of existing-issue sets whose term statistics are kept between calls; detection compares against the
+# open issues and similarity search against all issues, so two sets are in use at once
+_INDEX_CACHE_SIZE = 2
+
+
+# Anything that is neither a word character nor whitespace, replaced by spaces during preprocessing
+_SPECIAL_CHARS_RE = re.compile(r"[^\w\s]+")
+
+# Tokenizer matching the per-pair TF-IDF used for title/description similarity reasons
+_PAIR_ANALYZER = TfidfVectorizer(stop_words="english", lowercase=True).build_analyzer()
+
+# Smoothed idf of a term found in only one of two documents: ln((1 + 2) / (1 + 1)) + 1
+_PAIR_UNIQUE_IDF = math.log(1.5) + 1
+
+
+def _pretokenized(tokens: List[str]) -> List[str]:
+    """Analyzer for documents that are already token lists."""
+    return tokens
+
+
+class _ExistingIssueIndex:
+    """Term statistics of a fixed set of existing issues, for scoring new issues without refitting TF-IDF.
+
+    Fitting the vectorizer on [new issue] + existing issues repeats the same counting over the existing issues
+    for every new issue, although only the new issue's own terms change the document and term frequencies.
+    The vocabulary pruning, idf weights and normalized rows that refitting would produce are derived from
+    counts taken once here, so scores match the refit vectorizer's up to floating-point rounding.
+
+    The emulation follows the vectorizer's min_df, max_df, max_features, dtype, use_idf, smooth_idf and
+    sublinear_tf parameters. norm does not change cosine similarities, and tokenization comes from the
+    vectorizer's own analyzer. A fixed vocabulary or binary counts are not emulated and are rejected.
+    """
+
+    def __init__(self, token_lists: List[List[str]], vectorizer_params: Dict[str, Any]):
+        """Count the terms of the existing issues.
+
+        Args:
+            token_lists: TF-IDF tokens of each existing issue
+            vectorizer_params: The TfidfVectorizer's get_params()
+
+        Raises:
+            ValueError: If the vectorizer uses a parameter the index does not emulate
+        """
+        if vectorizer_params["vocabulary"] is not None or vectorizer_params["binary"]:
+            raise ValueError("Existing issue index does not support a fixed vocabulary or binary counts")
+
+        self.n_docs = len(token_lists)
+        self.min_df = vectorizer_params["min_df"]
+        self.max_df = vectorizer_params["max_df"]
+        self.max_features = vectorizer_params["max_features"]
+        self.use_idf = vectorizer_params["use_idf"]
+        self.smooth_idf = vectorizer_params["smooth_idf"]
+        self.sublinear_tf = vectorizer_params["sublinear_tf"]
+
+        if any(token_lists):
+            counter = CountVectorizer(analyzer=_pretokenized)
+            counts = counter.fit_transform(token_lists).astype(np.float64).tocsc()
+            self.terms = counter.get_feature_names_out().tolist()  # Sorted, like a fitted vectorizer's features
+            self.vocabulary = counter.vocabulary_
+        else:
+            counts = csc_matrix((self.n_docs, 0))
+            self.terms = []
+            self.vocabulary = {}
+
+        self.dfs = np.diff(counts.indptr)
+        # Summed in the vectorizer's dtype from raw counts, so that max_features breaks ties the same way
+        self.tfs = np.asarray(counts.sum(axis=0)).ravel().astype(vectorizer_params["dtype"])
+
+        # Term weights before idf; with sublinear_tf the vectorizer replaces each count c by 1 + ln(c)
+        counts.data = self._tf_weights(counts.data)
+        self.counts = counts
+        self.squared_counts = counts.multiply(counts).tocsr()
+
+    def _tf_weights(self, counts: np.ndarray) -> np.ndarray:
+        """Apply the vectorizer's term frequency scaling to nonzero term counts."""
+        return np.log(counts) + 1 if self.sublinear_tf else counts
+
+    def _idf(self, dfs: np.ndarray, n_docs: int) -> np.ndarray:
+        """Compute idf weights from document frequencies as the vectorizer does."""
+        if not self.use_idf:
+            return np.ones(len(dfs))
+        if self.smooth_idf:
+            return np.log((1 + n_docs) / (1 + dfs)) + 1
+        return np.log(n_docs / dfs) + 1
+
+    def _keep_mask(self, dfs: np.ndarray, tfs: np.ndarray, n_docs: int) -> np.ndarray:
+        """Select the terms the vectorizer keeps after min_df, max_df and max_features pruning.
+
+        Raises:
+            ValueError: If the document frequency bounds conflict or no terms remain, as refitting would
+        """
+        min_count = self.min_df if isinstance(self.min_df, int) else self.min_df * n_docs
+        max_count = self.max_df if isinstance(self.max_df, int) else self.max_df * n_docs
+        if max_count < min_count:
+            raise ValueError("max_df corresponds to < documents than min_df")
+
+        keep = (dfs >= min_count) & (dfs <= max_count)
+        if self.max_features is not None and keep.sum() > self.max_features:
+            most_frequent = (-tfs[keep]).argsort()[: self.max_features]
+            limited = np.zeros_like(keep)
+            limited[np.flatnonzero(keep)[most_frequent]] = True
+            keep = limited
+        if not keep.any():
+            raise ValueError("After pruning, no terms remain. Try a lower min_df or a higher max_df.")
+        return keep
+
+    def similarities(self, tokens: List[str]) -> np.ndarray:
+        """Calculate the cosine similarity of a new issue to each existing issue.
+
+        Args:
+            tokens: TF-IDF tokens of the new issue
+
+        Returns:
+            Similarity score for each existing issue, in index order
+
+        Raises:
+            ValueError: If the vectorizer would be left without terms, as refitting it would
+        """
+        token_counts = Counter(tokens)
+        known_terms = [term for term in token_counts if term in self.vocabulary]
+        new_terms = sorted(term for term in token_counts if term not in self.vocabulary)
+        if not self.terms and not new_terms:
+            raise ValueError("empty vocabulary; perhaps the documents only contain stop words")
+
+        n_docs = self.n_docs + 1
+        known_cols = np.array([self.vocabulary[term] for term in known_terms], dtype=np.intp)
+        known_counts = np.array([token_counts[term] for term in known_terms], dtype=np.float64)
+        new_counts = np.array([token_counts[term] for term in new_terms], dtype=np.float64)
+
+        dfs = self.dfs.copy()
+        dfs[known_cols] += 1
+        tfs = self.tfs.copy()
+        tfs[known_cols] += known_counts
+
+        # Prune the vocabulary as the vectorizer does, with the new issue's unseen terms in their sorted place
+        positions = np.array([bisect_left(self.terms, term) for term in new_terms], dtype=np.intp)
+        keep = self._keep_mask(np.insert(dfs, positions, 1), np.insert(tfs, positions, new_counts), n_docs)
+
+        is_new = np.zeros_like(keep)
+        is_new[positions + np.arange(len(positions))] = True
+        keep_existing = keep[~is_new]
+        keep_new = keep[is_new]
+
+        # Idf with the new issue counted as one more document; its unseen terms occur in that document only
+        idf = self._idf(dfs, n_docs)
+        new_idf = self._idf(np.ones(1), n_docs)[0]
+
+        existing_norms = np.sqrt(self.squared_counts @ np.where(keep_existing, idf**2, 0.0))
+        query_weights = np.where(keep_existing[known_cols], self._tf_weights(known_counts) * idf[known_cols], 0.0)
+        new_weights = self._tf_weights(new_counts) * new_idf
+        query_norm = math.sqrt(float(query_weights @ query_weights) + float(np.sum(new_weights[keep_new] ** 2)))
+
+        # Unseen terms occur in no existing issue, so only the known ones contribute to the dot products
+        dots = self.counts[:, known_cols] @ (query_weights * idf[known_cols])
+        denominators = existing_norms * query_norm
+        return np.divide(dots, denominators, out=np.zeros(self.n_docs), where=denominators > 0)
+
 
 class CosineDuplicateAnalyzer:
     """Analyzer that uses cosine similarity with TF-IDF to detect duplicate issues."""
@@ -29,8 +193,18 @@ class CosineDuplicateAnalyzer:
             max_features=5000,  # Limit vocabulary size
             min_df=1,  # Minimum document frequency
             max_df=0.95,  # Maximum document frequency (ignore very common terms)
+            dtype=np.float32,  # Precision in which term frequencies are summed; decides max_features ties
         )
 
+        # Preprocess each issue once; existing issues are usually unchanged between calls
+        self._combined_text = lru_cache(maxsize=_TOKEN_CACHE_SIZE)(self._combine_text)
+
+        # Tokenize each issue text once and reuse it across calls
+        self._analyze_text = lru_cache(maxsize=_TOKEN_CACHE_SIZE)(self.vectorizer.build_analyzer())
+
+        # Count the terms of a set of existing issues once; every new issue compared against them reuses the counts
+        self._existing_index = lru_cache(maxsize=_INDEX_CACHE_SIZE)(self._build_existing_index)
+
     def _preprocess_text(self, text: str) -> str:
         """Preprocess text for better similarity matching.
 
@@ -47,10 +221,7 @@ class CosineDuplicateAnalyzer:
         text = text.lower()
 
         # Remove special characters and extra whitespace
-        text = re.sub(r"[^\w\s]", " ", text)
-        text = re.sub(r"\s+", " ", text)
-
-        return text.strip()
+        return " ".join(_SPECIAL_CHARS_RE.sub(" ", text).split())
 
     def _combine_issue_text(self, issue: IssueReference) -> str:
         """Combine issue title and description for analysis.
@@ -61,17 +232,23 @@ class CosineDuplicateAnalyzer:
         Returns:
             Combined text for similarity analysis
         """
-        # Give more weight to title by including it twice
-        title = self._preprocess_text(issue.title)
-        description = self._preprocess_text(issue.description)
-
-        # Combine title (weighted) and description
-        combined = f"{title} {title} {description}"
-        return combined
+        return self._combined_text(issue.title, issue.description)
 
     def _combine_new_issue_text(self, title: str, description: str) -> str:
         """Combine new issue title and description for analysis.
 
+        Args:
+            title: Issue title
+            description: Issue description
+
+        Returns:
+            Combined text for similarity analysis
+        """
+        return self._combined_text(title, description)
+
+    def _combine_text(self, title: str, description: str) -> str:
+        """Preprocess and combine a title and description; cached per instance as _combined_text.
+
         Args:
             title: Issue title
             description: Issue description
@@ -88,7 +265,14 @@ class CosineDuplicateAnalyzer:
         return combined
 
     def _calculate_similarity_reasons(
-        self, new_issue_title: str, new_issue_description: str, similar_issue: IssueReference, similarity_score: float
+        self,
+        new_issue_title: str,
+        new_issue_description: str,
+        similar_issue: IssueReference,
+        similarity_score: float,
+        title_similarity: Optional[float] = None,
+        desc_similarity: Optional[float] = None,
+        common_words: Optional[List[str]] = None,
     ) -> List[str]:
         """Generate reasons for similarity between issues.
 
@@ -97,38 +281,42 @@ class CosineDuplicateAnalyzer:
             new_issue_description: Description of the new issue
             similar_issue: Most similar existing issue
             similarity_score: Calculated similarity score
+            title_similarity: Precomputed title similarity, e.g. from _pairwise_text_similarities
+            desc_similarity: Precomputed description similarity, e.g. from _pairwise_text_similarities
+            common_words: Precomputed words shared by both issues, e.g. from _pairwise_common_words
 
         Returns:
             List of similarity reasons
         """
         reasons = []
 
+        # Preprocess each field once; the keyword check below reuses them
+        new_title = self._preprocess_text(new_issue_title)
+        new_description = self._preprocess_text(new_issue_description)
+        similar_title = self._preprocess_text(similar_issue.title)
+        similar_description = self._preprocess_text(similar_issue.description)
+
         # Check title similarity
-        title_similarity = self._calculate_text_similarity(
-            self._preprocess_text(new_issue_title), self._preprocess_text(similar_issue.title)
-        )
+        if title_similarity is None:
+            title_similarity = self._calculate_text_similarity(new_title, similar_title)
 
         if title_similarity > 0.5:
             reasons.append(f"Similar titles (similarity: {title_similarity:.2f})")
 
         # Check description similarity
         if new_issue_description and similar_issue.description:
-            desc_similarity = self._calculate_text_similarity(
-                self._preprocess_text(new_issue_description), self._preprocess_text(similar_issue.description)
-            )
+            if desc_similarity is None:
+                desc_similarity = self._calculate_text_similarity(new_description, similar_description)
 
             if desc_similarity > 0.3:
                 reasons.append(f"Similar descriptions (similarity: {desc_similarity:.2f})")
 
         # Check for common keywords
-        new_words = set(self._preprocess_text(f"{new_issue_title} {new_issue_description}").split())
-        existing_words = set(self._preprocess_text(f"{similar_issue.title} {similar_issue.description}").split())
-
-        common_words = new_words.intersection(existing_words)
-        if len(common_words) > 3:  # If more than 3 common words
-            important_words = [word for word in common_words if len(word) > 3]  # Filter short words
-            if important_words:
-                reasons.append(f"Common keywords: {', '.join(list(important_words)[:5])}")
+        keywords_reason = self._common_keywords_reason(
+            f"{new_title} {new_description}", f"{similar_title} {similar_description}", common_words
+        )
+        if keywords_reason:
+            reasons.append(keywords_reason)
 
         # Overall similarity assessment
         if similarity_score > 0.8:
@@ -153,15 +341,103 @@ class CosineDuplicateAnalyzer:
         if not text1 or not text2:
             return 0.0
 
-        try:
-            # Create a temporary vectorizer for this comparison
-            temp_vectorizer = TfidfVectorizer(stop_words="english", lowercase=True)
-            tfidf_matrix = temp_vectorizer.fit_transform([text1, text2])
-            similarity_matrix = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])
-            return float(similarity_matrix[0][0])
-        except:
+        # Same result as fitting a TfidfVectorizer on just these two texts, without building one per pair
+        counts1 = Counter(_PAIR_ANALYZER(text1))
+        counts2 = Counter(_PAIR_ANALYZER(text2))
+        shared = counts1.keys() & counts2.keys()
+        if not shared:
             return 0.0
 
+        # With two documents and smoothed idf, shared terms weigh 1 and terms unique to one text weigh _PAIR_UNIQUE_IDF
+        dot = sum(counts1[term] * counts2[term] for term in shared)
+        norm1 = math.sqrt(sum((count if term in shared else count * _PAIR_UNIQUE_IDF) ** 2 for term, count in counts1.items()))
+        norm2 = math.sqrt(sum((count if term in shared else count * _PAIR_UNIQUE_IDF) ** 2 for term, count in counts2.items()))
+        return dot / (norm1 * norm2)
+
+    def _pairwise_text_similarities(self, texts1: List[str], texts2: List[str]) -> np.ndarray:
+        """Calculate _calculate_text_similarity for many aligned text pairs at once.
+
+        Args:
+            texts1: First text of each pair
+            texts2: Second text of each pair
+
+        Returns:
+            Array of similarity scores, one per pair
+        """
+        num_pairs = len(texts1)
+        try:
+            counts = CountVectorizer(analyzer=_PAIR_ANALYZER).fit_transform(texts1 + texts2).astype(float)
+        except ValueError:
+            # Every text is empty or made only of stop words
+            return np.zeros(num_pairs)
+
+        first, second = counts[:num_pairs], counts[num_pairs:]
+        products = first.multiply(second)
+        shared = products > 0
+        dot = np.asarray(products.sum(axis=1)).ravel()
+
+        # Norms with shared terms weighted 1 and the rest _PAIR_UNIQUE_IDF, as in _calculate_text_similarity
+        def weighted_norms(block):
+            squares = block.multiply(block)
+            total = np.asarray(squares.sum(axis=1)).ravel()
+            shared_total = np.asarray(squares.multiply(shared).sum(axis=1)).ravel()
+            return np.sqrt(_PAIR_UNIQUE_IDF**2 * total - (_PAIR_UNIQUE_IDF**2 - 1) * shared_total)
+
+        norms = weighted_norms(first) * weighted_norms(second)
+        return np.divide(dot, norms, out=np.zeros(num_pairs), where=dot > 0)
+
+    @staticmethod
+    def _pairwise_common_words(texts1: List[str], texts2: List[str]) -> List[List[str]]:
+        """Find the words shared by many aligned pairs of preprocessed texts at once.
+
+        Args:
+            texts1: First text of each pair
+            texts2: Second text of each pair
+
+        Returns:
+            Shared words of each pair, or an empty list where too few are shared to produce a reason
+        """
+        num_pairs = len(texts1)
+        vectorizer = CountVectorizer(binary=True, analyzer=str.split)
+        try:
+            presence = vectorizer.fit_transform(texts1 + texts2)
+        except ValueError:
+            # Every text is empty
+            return [[] for _ in range(num_pairs)]
+
+        common = presence[:num_pairs].multiply(presence[num_pairs:]).tocsr()
+        vocabulary = vectorizer.get_feature_names_out()
+        counts = common.getnnz(axis=1)
+        return [
+            vocabulary[common.indices[common.indptr[i] : common.indptr[i + 1]]].tolist() if counts[i] > 3 else []
+            for i in range(num_pairs)
+        ]
+
+    @staticmethod
+    def _common_keywords_reason(
+        new_text: str, existing_text: str, common_words: Optional[Collection[str]] = None
+    ) -> Optional[str]:
+        """Describe the keywords shared by two issues.
+
+        Args:
+            new_text: Preprocessed title and description of the new issue
+            existing_text: Preprocessed title and description of the existing issue
+            common_words: Precomputed words shared by both issues, e.g. from _pairwise_common_words
+
+        Returns:
+            Similarity reason listing up to five keywords, or None if too few words are shared
+        """
+        if common_words is None:
+            common_words = set(new_text.split()).intersection(existing_text.split())
+        if len(common_words) <= 3:  # Needs more than 3 common words
+            return None
+
+        # Filter short words; sorted so the reported keywords do not depend on set iteration order
+        important_words = sorted(word for word in common_words if len(word) > 3)
+        if not important_words:
+            return None
+        return f"Common keywords: {', '.join(important_words[:5])}"
+
     def detect_duplicate(
         self, new_issue_title: str, new_issue_description: str, existing_issues: List[IssueReference]
     ) -> DuplicateDetectionResult:
@@ -177,7 +453,24 @@ class CosineDuplicateAnalyzer:
         """
         # Filter only open issues
         open_issues = [issue for issue in existing_issues if issue.status.lower() == "open"]
+        existing_texts = [self._combine_issue_text(issue) for issue in open_issues]
+
+        return self._detect_duplicate_in(new_issue_title, new_issue_description, open_issues, existing_texts)
+
+    def _detect_duplicate_in(
+        self, new_issue_title: str, new_issue_description: str, open_issues: List[IssueReference], existing_texts: List[str]
+    ) -> DuplicateDetectionResult:
+        """Detect if a new issue duplicates one of the given open issues.
+
+        Args:
+            new_issue_title: Title of the new issue
+            new_issue_description: Description of the new issue
+            open_issues: Open issues to compare against
+            existing_texts: Preprocessed combined text of each open issue
 
+        Returns:
+            Duplicate detection result
+        """
         if not open_issues:
             return DuplicateDetectionResult(
                 is_duplicate=False,
@@ -189,73 +482,120 @@ class CosineDuplicateAnalyzer:
             )
 
         try:
-            # Prepare texts for comparison
-            new_issue_text = self._combine_new_issue_text(new_issue_title, new_issue_description)
-            existing_texts = [self._combine_issue_text(issue) for issue in open_issues]
-
-            # Add new issue text to the list for vectorization
-            all_texts = [new_issue_text] + existing_texts
-
-            # Vectorize all texts
-            tfidf_matrix = self.vectorizer.fit_transform(all_texts)
+            max_similarity_idx, max_similarity_score = self._find_best_match(
+                new_issue_title, new_issue_description, existing_texts
+            )
+            return self._build_detection_result(
+                new_issue_title, new_issue_description, open_issues[max_similarity_idx], max_similarity_score
+            )
+        except Exception as e:
+            return self._analysis_error_result(e)
 
-            # Calculate similarities between new issue and all existing issues
-            new_issue_vector = tfidf_matrix[0:1]  # First row is the new issue
-            existing_vectors = tfidf_matrix[1:]  # Remaining rows are existing issues
+    def _find_best_match(
+        self, new_issue_title: str, new_issue_description: str, existing_texts: List[str]
+    ) -> Tuple[int, float]:
+        """Find the existing issue most similar to a new issue.
 
-            similarities = cosine_similarity(new_issue_vector, existing_vectors)[0]
+        Args:
+            new_issue_title: Title of the new issue
+            new_issue_description: Description of the new issue
+            existing_texts: Preprocessed combined text of each existing issue
 
-            # Find the most similar issue
-            max_similarity_idx = np.argmax(similarities)
-            max_similarity_score = float(similarities[max_similarity_idx])
-            most_similar_issue = open_issues[max_similarity_idx]
+        Returns:
+            Tuple of (index into existing_texts, similarity score)
+        """
+        # Prepare texts for comparison
+        new_issue_text = self._combine_new_issue_text(new_issue_title, new_issue_description)
+
+        similarities = self._existing_index(tuple(existing_texts)).similarities(self._analyze_text(new_issue_text))
+
+        # Find the most similar issue; np.argmax gives the first issue on ties and for an all-zero row
+        max_similarity_idx = int(np.argmax(similarities)) if similarities.size else 0
+        if not similarities.size or similarities[max_similarity_idx] <= 0:
+            return 0, 0.0
+        return max_similarity_idx, float(similarities[max_similarity_idx])
+
+    def _build_existing_index(self, existing_texts: Tuple[str, ...]) -> _ExistingIssueIndex:
+        """Count the TF-IDF terms of the existing issues, as cached by _existing_index."""
+        return _ExistingIssueIndex([self._analyze_text(text) for text in existing_texts], self.vectorizer.get_params())
+
+    def _build_detection_result(
+        self,
+        new_issue_title: str,
+        new_issue_description: str,
+        most_similar_issue: IssueReference,
+        max_similarity_score: float,
+        title_similarity: Optional[float] = None,
+        desc_similarity: Optional[float] = None,
+        common_words: Optional[List[str]] = None,
+    ) -> DuplicateDetectionResult:
+        """Build the duplicate detection result for a new issue and its most similar existing issue.
 
-            # Determine if it's a duplicate
-            is_duplicate = max_similarity_score >= self.similarity_threshold
+        Args:
+            new_issue_title: Title of the new issue
+            new_issue_description: Description of the new issue
+            most_similar_issue: Most similar open issue
+            max_similarity_score: Similarity between the two issues
+            title_similarity: Precomputed title similarity, if available
+            desc_similarity: Precomputed description similarity, if available
+            common_words: Precomputed words shared by both issues, if available
 
-            # Calculate confidence score
-            confidence_score = min(max_similarity_score * 1.2, 1.0)  # Boost confidence slightly
-            if max_similarity_score < 0.3:
-                confidence_score = max_similarity_score  # Low similarity = low confidence
+        Returns:
+            Duplicate detection result
+        """
+        # Determine if it's a duplicate
+        is_duplicate = max_similarity_score >= self.similarity_threshold
+
+        # Calculate confidence score
+        confidence_score = min(max_similarity_score * 1.2, 1.0)  # Boost confidence slightly
+        if max_similarity_score < 0.3:
+            confidence_score = max_similarity_score  # Low similarity = low confidence
+
+        # Generate similarity reasons
+        similarity_reasons = self._calculate_similarity_reasons(
+            new_issue_title,
+            new_issue_description,
+            most_similar_issue,
+            max_similarity_score,
+            title_similarity=title_similarity,
+            desc_similarity=desc_similarity,
+            common_words=common_words,
+        )
 
-            # Generate similarity reasons
-            similarity_reasons = self._calculate_similarity_reasons(
-                new_issue_title, new_issue_description, most_similar_issue, max_similarity_score
+        # Generate recommendation
+        if is_duplicate:
+            recommendation = (
+                f"This issue appears to be a duplicate of issue {most_similar_issue.issue_id}. "
+                f"Consider linking to the original issue and closing this one."
             )
-
-            # Generate recommendation
-            if is_duplicate:
-                recommendation = (
-                    f"This issue appears to be a duplicate of issue {most_similar_issue.issue_id}. "
-                    f"Consider linking to the original issue and closing this one."
-                )
-            elif max_similarity_score > 0.5:
-                recommendation = (
-                    f"This issue shows moderate similarity to issue {most_similar_issue.issue_id}. "
-                    f"Review both issues to determine if they are related or should be merged."
-                )
-            else:
-                recommendation = "This appears to be a new, unique issue."
-
-            return DuplicateDetectionResult(
-                is_duplicate=is_duplicate,
-                duplicate_of=most_similar_issue if is_duplicate else None,
-                similarity_score=max_similarity_score,
-                similarity_reasons=similarity_reasons,
-                confidence_score=confidence_score,
-                recommendation=recommendation,
+        elif max_similarity_score > 0.5:
+            recommendation = (
+                f"This issue shows moderate similarity to issue {most_similar_issue.issue_id}. "
+                f"Review both issues to determine if they are related or should be merged."
             )
+        else:
+            recommendation = "This appears to be a new, unique issue."
+
+        return DuplicateDetectionResult(
+            is_duplicate=is_duplicate,
+            duplicate_of=most_similar_issue if is_duplicate else None,
+            similarity_score=max_similarity_score,
+            similarity_reasons=similarity_reasons,
+            confidence_score=confidence_score,
+            recommendation=recommendation,
+        )
 
-        except Exception as e:
-            # Fallback result if analysis fails
-            return DuplicateDetectionResult(
-                is_duplicate=False,
-                duplicate_of=None,
-                similarity_score=0.0,
-                similarity_reasons=[],
-                confidence_score=0.0,
-                recommendation=f"Unable to perform similarity analysis due to error: {str(e)}. Manual review required.",
-            )
+    @staticmethod
+    def _analysis_error_result(error: Exception) -> DuplicateDetectionResult:
+        """Fallback result if analysis fails."""
+        return DuplicateDetectionResult(
+            is_duplicate=False,
+            duplicate_of=None,
+            similarity_score=0.0,
+            similarity_reasons=[],
+            confidence_score=0.0,
+            recommendation=f"Unable to perform similarity analysis due to error: {str(error)}. Manual review required.",
+        )
 
     def find_most_similar_issues(
         self, new_issue_title: str, new_issue_description: str, existing_issues: List[IssueReference], top_k: int = 5
@@ -279,28 +619,21 @@ class CosineDuplicateAnalyzer:
             new_issue_text = self._combine_new_issue_text(new_issue_title, new_issue_description)
             existing_texts = [self._combine_issue_text(issue) for issue in existing_issues]
 
-            # Add new issue text to the list for vectorization
-            all_texts = [new_issue_text] + existing_texts
-
-            # Vectorize all texts
-            tfidf_matrix = self.vectorizer.fit_transform(all_texts)
-
             # Calculate similarities between new issue and all existing issues
-            new_issue_vector = tfidf_matrix[0:1]  # First row is the new issue
-            existing_vectors = tfidf_matrix[1:]  # Remaining rows are existing issues
+            similarities = self._existing_index(tuple(existing_texts)).similarities(self._analyze_text(new_issue_text))
 
-            similarities = cosine_similarity(new_issue_vector, existing_vectors)[0]
+            # Only issues with some similarity are returned, so rank just the nonzero scores
+            indices = np.flatnonzero(similarities > 0.0)
+            similarities = similarities[indices]
 
-            # Get top-k most similar issues
-            top_indices = np.argsort(similarities)[::-1][:top_k]  # Sort descending, take top-k
-
-            results = []
-            for idx in top_indices:
-                similarity_score = float(similarities[idx])
-                if similarity_score > 0.0:  # Only include issues with some similarity
-                    results.append((existing_issues[idx], similarity_score))
+            # Get top-k most similar issues: select them in linear time, then sort only those k
+            if 0 < top_k < len(similarities):
+                top = np.argpartition(-similarities, top_k - 1)[:top_k]
+                top = top[np.argsort(-similarities[top])]
+            else:
+                top = np.argsort(similarities)[::-1][:top_k]  # Sort descending, take top-k
 
-            return results
+            return [(existing_issues[indices[i]], float(similarities[i])) for i in top]
 
         except Exception:
             return []
@@ -317,10 +650,53 @@ class CosineDuplicateAnalyzer:
         Returns:
             List of duplicate detection results
         """
-        results = []
-
-        for new_issue in new_issues:
-            result = self.detect_duplicate(new_issue["title"], new_issue["description"], existing_issues)
-            results.append(result)
+        # Filter and preprocess the existing issues once for the whole batch
+        open_issues = [issue for issue in existing_issues if issue.status.lower() == "open"]
+        existing_texts = [self._combine_issue_text(issue) for issue in open_issues]
 
-        return results
+        if not open_issues:
+            return [self._detect_duplicate_in(issue["title"], issue["description"], [], []) for issue in new_issues]
+
+        # Score identical new issues once; every repeat gets its own copy of the result
+        unique_issues = list(dict.fromkeys((issue["title"], issue["description"]) for issue in new_issues))
+        results = {}
+        matches = {}
+        for key in unique_issues:
+            try:
+                match_idx, match_score = self._find_best_match(*key, existing_texts)
+                matches[key] = (open_issues[match_idx], match_score)
+            except Exception as e:
+                results[key] = self._analysis_error_result(e)
+
+        # Compare the titles, descriptions and words of all (new issue, best match) pairs in one vectorized pass
+        matched = list(matches)
+        new_titles = [self._preprocess_text(title) for title, _ in matched]
+        new_descriptions = [self._preprocess_text(description) for _, description in matched]
+        match_titles = [self._preprocess_text(matches[key][0].title) for key in matched]
+        match_descriptions = [self._preprocess_text(matches[key][0].description) for key in matched]
+
+        title_similarities = self._pairwise_text_similarities(new_titles, match_titles)
+        desc_similarities = self._pairwise_text_similarities(new_descriptions, match_descriptions)
+        common_words = self._pairwise_common_words(
+            [f"{title} {description}" for title, description in zip(new_titles, new_descriptions)],
+            [f"{title} {description}" for title, description in zip(match_titles, match_descriptions)],
+        )
+        for i, key in enumerate(matched):
+            try:
+                results[key] = self._build_detection_result(
+                    *key,
+                    *matches[key],
+                    title_similarity=float(title_similarities[i]),
+                    desc_similarity=float(desc_similarities[i]),
+                    common_words=common_words[i],
+                )
+            except Exception as e:
+                results[key] = self._analysis_error_result(e)
+
+        batch_results = []
+        seen = set()
+        for issue in new_issues:
+            key = (issue["title"], issue["description"])
+            batch_results.append(results[key].model_copy(deep=True) if key in seen else results[key])
+            seen.add(key)
+        return batch_results
@@ -2,28 +2,38 @@
 
 import json
 import os
-import re
+import time
 from typing import Any, Dict, List, Optional
 
 from dotenv import load_dotenv
 from google import genai
 
+from utils.duplicate.cosine_duplicate import CosineDuplicateAnalyzer
 from utils.models import DuplicateDetectionResult, IssueReference
+from utils.retry import backoff_delay, is_retryable_error
 
 # Load environment variables
 load_dotenv()
 
+# Decodes the JSON object at a given offset and ignores whatever text follows it
+_JSON_DECODER = json.JSONDecoder()
+
 
 class GeminiDuplicateAnalyzer:
     """Analyzer that uses Google's Gemini AI to detect duplicate issues."""
 
-    def __init__(self, api_key: Optional[str] = None, model_name: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, model_name: Optional[str] = None, max_candidates: Optional[int] = None):
         """Initialize the Gemini duplicate analyzer.
 
         Args:
             api_key: Gemini API key. If not provided, will use GEMINI_API_KEY env var.
             model_name: Gemini model name. If not provided, defaults to gemini-2.0-flash-001.
+            max_candidates: If set, only send the open issues most similar to the new issue by TF-IDF cosine
+                similarity, at most this many, instead of every open issue.
         """
+        if max_candidates is not None and max_candidates < 1:
+            raise ValueError("max_candidates must be at least 1")
+
         self.api_key = api_key or os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
         if not self.api_key:
             raise ValueError("Gemini API key not found. Set GEMINI_API_KEY or GOOGLE_API_KEY environment variable.")
@@ -32,6 +42,9 @@ class GeminiDuplicateAnalyzer:
         self.client = genai.Client(api_key=self.api_key)
         self.model_name = model_name or "gemini-2.0-flash-001"
 
+        self.max_candidates = max_candidates
+        self._shortlister = CosineDuplicateAnalyzer() if max_candidates is not None else None
+
     def detect_duplicate(
         self, new_issue_title: str, new_issue_description: str, existing_issues: List[IssueReference], max_retries: int = 2
     ) -> DuplicateDetectionResult:
@@ -49,6 +62,28 @@ class GeminiDuplicateAnalyzer:
         # Filter only open issues
         open_issues = [issue for issue in existing_issues if issue.status.lower() == "open"]
 
+        return self._detect_duplicate_in(new_issue_title, new_issue_description, open_issues, max_retries=max_retries)
+
+    def _detect_duplicate_in(
+        self,
+        new_issue_title: str,
+        new_issue_description: str,
+        open_issues: List[IssueReference],
+        existing_issues_text: Optional[str] = None,
+        max_retries: int = 2,
+    ) -> DuplicateDetectionResult:
+        """Detect if a new issue duplicates one of the given open issues.
+
+        Args:
+            new_issue_title: Title of the new issue
+            new_issue_description: Description of the new issue
+            open_issues: Open issues to compare against
+            existing_issues_text: Open issues already rendered for the prompt; rendered here if not provided
+            max_retries: Maximum number of retry attempts (default: 2)
+
+        Returns:
+            Duplicate detection result
+        """
         if not open_issues:
             return DuplicateDetectionResult(
                 is_duplicate=False,
@@ -59,10 +94,15 @@ class GeminiDuplicateAnalyzer:
                 recommendation="No open issues to compare against. This appears to be a new issue.",
             )
 
+        if existing_issues_text is None:
+            candidates = self._candidate_issues(new_issue_title, new_issue_description, open_issues)
+            existing_issues_text = self._format_existing_issues(candidates)
+
+        # The prompt is the same for every attempt
+        prompt = self._create_duplicate_detection_prompt(new_issue_title, new_issue_description, existing_issues_text)
+
         for attempt in range(max_retries + 1):
             try:
-                prompt = self._create_duplicate_detection_prompt(new_issue_title, new_issue_description, open_issues)
-
                 response = self.client.models.generate_content(model=self.model_name, contents=prompt)
 
                 result_data = self._parse_gemini_response(response.text)
@@ -80,19 +120,35 @@ class GeminiDuplicateAnalyzer:
                 return duplicate_result
 
             except Exception as e:
-                if attempt < max_retries:
+                # Request errors other than rate limits fail the same way on every attempt
+                if attempt < max_retries and is_retryable_error(e):
                     print(f"Duplicate detection failed, retrying... (attempt {attempt + 2}/{max_retries + 1})")
+                    time.sleep(backoff_delay(attempt))
                     continue
                 else:
                     # Fallback result if all attempts fail
                     return self._create_fallback_result(str(e))
 
-    def _create_duplicate_detection_prompt(
-        self, new_title: str, new_description: str, existing_issues: List[IssueReference]
-    ) -> str:
-        """Create a detailed prompt for duplicate detection."""
+    def _candidate_issues(
+        self, new_issue_title: str, new_issue_description: str, open_issues: List[IssueReference]
+    ) -> List[IssueReference]:
+        """Narrow the open issues down to the ones worth sending to Gemini.
+
+        Returns every open issue unless max_candidates is set, in which case only the most similar issues by
+        TF-IDF cosine similarity are kept. If none of them share any terms with the new issue, all are kept.
+        """
+        if self._shortlister is None or len(open_issues) <= self.max_candidates:
+            return open_issues
+
+        shortlist = self._shortlister.find_most_similar_issues(
+            new_issue_title, new_issue_description, open_issues, top_k=self.max_candidates
+        )
+        return [issue for issue, _ in shortlist] or open_issues
 
-        existing_issues_text = "\n\n".join(
+    @staticmethod
+    def _format_existing_issues(existing_issues: List[IssueReference]) -> str:
+        """Render the existing issues for the duplicate detection prompt."""
+        return "\n\n".join(
             [
                 f"Issue ID: {issue.issue_id}\n"
                 f"Title: {issue.title}\n"
@@ -103,6 +159,9 @@ class GeminiDuplicateAnalyzer:
             ]
         )
 
+    def _create_duplicate_detection_prompt(self, new_title: str, new_description: str, existing_issues_text: str) -> str:
+        """Create a detailed prompt for duplicate detection."""
+
         return f"""
 You are an expert issue triager analyzing whether a new issue is a duplicate of existing open issues.
 
@@ -159,33 +218,33 @@ Please analyze the new issue and provide your response in the exact JSON format
 
     def _parse_gemini_response(self, response_text: str) -> Dict[str, Any]:
         """Parse Gemini's response and extract duplicate detection data."""
+        # Decode the first JSON object in the response; unlike a greedy {.*} match, trailing text
+        # that contains braces does not end up in the decoded span
+        start = response_text.find("{")
+        if start == -1:
+            # If no JSON found, create a structured response from text
+            return self._extract_from_text(response_text)
+
         try:
-            # Try to extract JSON from the response
-            json_match = re.search(r"\{.*\}", response_text, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(0)
-                parsed_data = json.loads(json_str)
-
-                # Ensure required fields are present
-                result = {
-                    "is_duplicate": parsed_data.get("is_duplicate", False),
-                    "similarity_score": float(parsed_data.get("similarity_score", 0.0)),
-                    "similarity_reasons": parsed_data.get("similarity_reasons", []),
-                    "confidence_score": float(parsed_data.get("confidence_score", 0.5)),
-                    "recommendation": parsed_data.get("recommendation", "Manual review recommended"),
-                }
-
-                # Add duplicate_issue_id if it's a duplicate
-                if result["is_duplicate"] and "duplicate_issue_id" in parsed_data:
-                    result["duplicate_issue_id"] = parsed_data["duplicate_issue_id"]
-
-                return result
-            else:
-                # If no JSON found, create a structured response from text
-                return self._extract_from_text(response_text)
+            parsed_data, _ = _JSON_DECODER.raw_decode(response_text, start)
         except json.JSONDecodeError:
             return self._extract_from_text(response_text)
 
+        # Ensure required fields are present
+        result = {
+            "is_duplicate": parsed_data.get("is_duplicate", False),
+            "similarity_score": float(parsed_data.get("similarity_score", 0.0)),
+            "similarity_reasons": parsed_data.get("similarity_reasons", []),
+            "confidence_score": float(parsed_data.get("confidence_score", 0.5)),
+            "recommendation": parsed_data.get("recommendation", "Manual review recommended"),
+        }
+
+        # Add duplicate_issue_id if it's a duplicate
+        if result["is_duplicate"] and "duplicate_issue_id" in parsed_data:
+            result["duplicate_issue_id"] = parsed_data["duplicate_issue_id"]
+
+        return result
+
     def _extract_from_text(self, text: str) -> Dict[str, Any]:
         """Extract duplicate detection data from plain text response."""
         # Simple text parsing as fallback
@@ -228,10 +287,16 @@ Please analyze the new issue and provide your response in the exact JSON format
         Returns:
             List of duplicate detection results
         """
+        open_issues = [issue for issue in existing_issues if issue.status.lower() == "open"]
+
+        # Every new issue is compared against the same open issues, so render them once for the whole batch.
+        # A shortlist differs per new issue and is rendered for each one instead.
+        existing_issues_text = self._format_existing_issues(open_issues) if self._shortlister is None else None
+
         results = []
 
         for new_issue in new_issues:
-            result = self.detect_duplicate(new_issue["title"], new_issue["description"], existing_issues)
+            result = self._detect_duplicate_in(new_issue["title"], new_issue["description"], open_issues, existing_issues_text)
             results.append(result)
 
         return results
@@ -4,20 +4,99 @@ Librarian - Identifies relevant files for issue analysis using directory chunks.
 This is Pass 1 of the Two-Pass Architecture.
 """
 
+import asyncio
 import logging
 import os
 import re
+import time
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional, Set
+from typing import Dict, Iterator, List, Optional, Set
 
+import numpy as np
 from dotenv import load_dotenv
 from google import genai
+from google.genai import types
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from utils.cache import ResponseCache
+from utils.retrieval import CodebaseRetriever, repomix_file_paths
+from utils.retry import backoff_delay, is_retryable_error
 
 # Load environment variables
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Number of chunk contents kept in memory; only the chunks relevant to an issue are ever read
+_CHUNK_CACHE_SIZE = 32
+
+# Characters read from the start of each chunk to index it for the chunk shortlist
+_CHUNK_INDEX_PREFIX_CHARS = 8192
+
+# The chunk selection answer is a short list of directory names, so decoding can be capped and deterministic
+_CHUNK_SELECTION_CONFIG = types.GenerateContentConfig(max_output_tokens=256, temperature=0)
+
+# Section header the model is asked to emit before the files of each chunk in a batched extraction response
+_CHUNK_HEADER_RE = re.compile(r"^\s*CHUNK:\s*(\S+)\s*$", re.MULTILINE)
+
+# A plausible file path on a stripped response line: under 200 characters, no comment or "there..."/"no ..."
+# sentence, at least one "/" and an extension after the last one
+_FILE_PATH_RE = re.compile(r"(?!#|there|no )(?=.{1,199}\Z).*/[^/]*\.[^/]*\Z", re.IGNORECASE)
+
+
+@lru_cache(maxsize=4)
+def _get_client(api_key: str) -> genai.Client:
+    """Return a Gemini client for the API key, shared by all analyzers so they reuse its connection pool."""
+    return genai.Client(api_key=api_key)
+
+
+class _LazyChunks(Mapping):
+    """Read-only mapping of chunk name to content that reads each chunk file on first access."""
+
+    def __init__(self, chunk_paths: Dict[str, Path]):
+        """Initialize the mapping.
+
+        Args:
+            chunk_paths: Path of the chunk file for each chunk name
+        """
+        self._chunk_paths = chunk_paths
+        self._read_chunk = lru_cache(maxsize=_CHUNK_CACHE_SIZE)(self._read_chunk_file)
+
+    def _read_chunk_file(self, chunk_name: str) -> str:
+        """Read a chunk file; cached as _read_chunk."""
+        content = self._chunk_paths[chunk_name].read_text(encoding="utf-8")
+        logger.info(f"Loaded chunk: {chunk_name} ({len(content)} bytes)")
+        return content
+
+    def prefetch(self, chunk_name: str) -> None:
+        """Read a chunk into the cache ahead of use; a read error is left to resurface when the chunk is used."""
+        try:
+            self._read_chunk(chunk_name)
+        except (OSError, UnicodeDecodeError):
+            pass
+
+    def size(self, chunk_name: str) -> int:
+        """Return the size of a chunk file in bytes without reading it."""
+        return self._chunk_paths[chunk_name].stat().st_size
+
+    def __getitem__(self, chunk_name: str) -> str:
+        if chunk_name not in self._chunk_paths:
+            raise KeyError(chunk_name)
+        return self._read_chunk(chunk_name)
+
+    def __contains__(self, chunk_name: object) -> bool:
+        # Answered from the file names; the default implementation would read the chunk
+        return chunk_name in self._chunk_paths
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._chunk_paths)
+
+    def __len__(self) -> int:
+        return len(self._chunk_paths)
+
 
 class LibrarianAnalyzer:
     """Identifies relevant files from directory-chunked codebase for issue analysis."""
@@ -27,112 +106,375 @@ class LibrarianAnalyzer:
         api_key: Optional[str] = None,
         chunks_dir: Optional[str] = None,
         model_name: Optional[str] = None,
+        coarse_model_name: Optional[str] = None,
+        max_chunk_candidates: Optional[int] = None,
+        max_files_per_chunk: Optional[int] = None,
+        max_batch_chars: Optional[int] = None,
+        cache_dir: Optional[str] = None,
+        max_retries: int = 2,
     ):
         """Initialize the Librarian analyzer.
 
         Args:
             api_key: Gemini API key. If not provided, will use GEMINI_API_KEY or GOOGLE_API_KEY env var.
             chunks_dir: Path to directory containing repomix chunks. Defaults to repomix-chunks.
-            model_name: Gemini model name. Defaults to gemini-2.0-flash-001.
+            model_name: Gemini model name for file extraction. Defaults to gemini-2.0-flash-001.
+            coarse_model_name: Gemini model name for chunk selection, which only picks directory names.
+                Defaults to gemini-2.0-flash-lite-001.
+            max_chunk_candidates: If set, only this many chunks, ranked by TF-IDF similarity of their names and
+                leading content to the issue, are offered for chunk selection. When only one chunk is left it is
+                used without asking Gemini.
+            max_files_per_chunk: If set, file extraction prompts include only this many files of each chunk, ranked
+                by TF-IDF similarity to the issue, instead of the whole chunk.
+            max_batch_chars: If set, relevant chunks are packed into shared file extraction requests of at most
+                this many characters of chunk content, instead of one request per chunk.
+            cache_dir: Directory for caching Gemini responses on disk. A request with the same prompt and model,
+                including the same chunk content, is then served from the cache.
+            max_retries: Maximum number of retries of a Gemini request that failed with a rate limit, server or
+                network error (default: 2)
         """
+        if max_chunk_candidates is not None and max_chunk_candidates < 1:
+            raise ValueError("max_chunk_candidates must be at least 1")
+        if max_files_per_chunk is not None and max_files_per_chunk < 1:
+            raise ValueError("max_files_per_chunk must be at least 1")
+        if max_batch_chars is not None and max_batch_chars < 1:
+            raise ValueError("max_batch_chars must be at least 1")
+        if max_retries < 0:
+            raise ValueError("max_retries must not be negative")
+
         self.api_key = api_key or os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
         self.model_name = model_name or "gemini-2.0-flash-001"
+        self.coarse_model_name = coarse_model_name or "gemini-2.0-flash-lite-001"
 
         if not self.api_key:
             raise ValueError("Gemini API key not found. Set GEMINI_API_KEY or GOOGLE_API_KEY environment variable.")
 
-        # Initialize the Gen AI client
-        self.client = genai.Client(api_key=self.api_key)
+        # Initialize the Gen AI client, reusing the one of an earlier analyzer with the same key
+        self.client = _get_client(self.api_key)
 
         # Store chunks directory
         self.chunks_dir = Path(chunks_dir or "repomix-chunks")
+        self.max_chunk_candidates = max_chunk_candidates
+        self.max_files_per_chunk = max_files_per_chunk
+        self.max_batch_chars = max_batch_chars
+        self.response_cache = ResponseCache(cache_dir) if cache_dir else None
+        self.max_retries = max_retries
 
         # Load all directory chunks
         self.chunks = self._load_chunks()
+        # TF-IDF index for the chunk shortlist, built on first use
+        self._chunk_index = None
+        # File paths packed in each chunk, parsed once per cached chunk
+        self._chunk_file_paths = lru_cache(maxsize=_CHUNK_CACHE_SIZE)(self._parse_chunk_file_paths)
+
+    def _load_chunks(self) -> Mapping:
+        """Find all repomix chunks in the chunks directory.
 
-    def _load_chunks(self) -> Dict[str, str]:
-        """Load all repomix chunks from the chunks directory.
+        Chunk contents are read on first use, so chunks that are never relevant to an issue cost no IO.
 
         Returns:
-            Dictionary mapping chunk name to content
+            Mapping of chunk name to content
         """
-        chunks = {}
-
         if not self.chunks_dir.exists():
             raise FileNotFoundError(f"Chunks directory '{self.chunks_dir}' not found. Please ensure it exists.")
 
-        for chunk_file in self.chunks_dir.glob("*.txt"):
-            chunk_name = chunk_file.stem
-            try:
-                with open(chunk_file, "r", encoding="utf-8") as f:
-                    chunks[chunk_name] = f.read()
-                logger.info(f"Loaded chunk: {chunk_name} ({len(chunks[chunk_name])} bytes)")
-            except Exception as e:
-                logger.warning(f"Failed to load chunk {chunk_name}: {e}")
+        chunk_paths = {chunk_file.stem: chunk_file for chunk_file in self.chunks_dir.glob("*.txt")}
 
-        if not chunks:
+        if not chunk_paths:
             raise ValueError(f"No chunks found in {self.chunks_dir}")
 
-        logger.info(f"Loaded {len(chunks)} chunks")
-        return chunks
+        logger.info(f"Found {len(chunk_paths)} chunks")
+        return _LazyChunks(chunk_paths)
 
-    def identify_relevant_files(self, title: str, issue_description: str) -> Dict[str, any]:
+    def identify_relevant_files(self, title: str, issue_description: str, max_workers: int = 8) -> Dict[str, any]:
         """Identify the most relevant files for the given issue by analyzing directory chunks.
 
         Args:
             title: Issue title
             issue_description: Detailed issue description
+            max_workers: Maximum number of chunks analyzed concurrently (default: 8)
+
+        Returns:
+            Dictionary with relevant_files list and analysis_summary
+        """
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # Analyze each chunk to find relevant directories, reading candidate chunks on the pool meanwhile
+                relevant_chunks = self._identify_relevant_chunks(title, issue_description, executor)
+
+                if not relevant_chunks:
+                    logger.warning("No relevant chunks identified")
+                    return {"relevant_files": [], "analysis_summary": "No relevant code found"}
+
+                # Extract specific files from relevant chunks; each batch is a separate network-bound Gemini call,
+                # so running them on a thread pool lets the requests overlap
+                batches = self._plan_chunk_batches(relevant_chunks)
+                chunk_files = list(
+                    executor.map(lambda batch: self._extract_files_from_chunks(batch, title, issue_description), batches)
+                )
+
+            return self._build_result(relevant_chunks, chunk_files)
+
+        except Exception as e:
+            logger.error(f"Error identifying relevant files: {e}")
+            return {"relevant_files": [], "analysis_summary": f"Analysis failed: {str(e)}"}
+
+    async def identify_relevant_files_async(
+        self, title: str, issue_description: str, max_concurrency: int = 8
+    ) -> Dict[str, any]:
+        """Identify the most relevant files for the given issue using the async Gemini client.
+
+        Unlike identify_relevant_files this needs no worker threads, so several issues can be awaited together.
+
+        Args:
+            title: Issue title
+            issue_description: Detailed issue description
+            max_concurrency: Maximum number of in-flight Gemini requests for chunk analysis (default: 8)
 
         Returns:
             Dictionary with relevant_files list and analysis_summary
         """
         try:
-            # Analyze each chunk to find relevant directories
-            relevant_chunks = self._identify_relevant_chunks(title, issue_description)
+            relevant_chunks = await self._identify_relevant_chunks_async(title, issue_description)
 
             if not relevant_chunks:
                 logger.warning("No relevant chunks identified")
                 return {"relevant_files": [], "analysis_summary": "No relevant code found"}
 
-            # Extract specific files from relevant chunks
-            all_files = set()
-            for chunk_name in relevant_chunks:
-                files = self._extract_files_from_chunk(chunk_name, title, issue_description)
-                all_files.update(files)
+            semaphore = asyncio.Semaphore(max_concurrency)
 
-            # Analyze dependencies and add supporting files
-            final_files = self._analyze_dependencies(all_files)
+            async def extract(batch: List[str]) -> Set[str]:
+                async with semaphore:
+                    return await self._extract_files_from_chunks_async(batch, title, issue_description)
 
-            logger.info(f"Identified {len(final_files)} relevant file(s) total")
+            chunk_files = await asyncio.gather(*(extract(batch) for batch in self._plan_chunk_batches(relevant_chunks)))
 
-            return {
-                "relevant_files": sorted(list(final_files)),
-                "relevant_chunks": relevant_chunks,
-                "analysis_summary": f"Analyzed {len(self.chunks)} directories, found {len(relevant_chunks)} relevant, identified {len(final_files)} files",
-            }
+            return self._build_result(relevant_chunks, chunk_files)
 
         except Exception as e:
             logger.error(f"Error identifying relevant files: {e}")
             return {"relevant_files": [], "analysis_summary": f"Analysis failed: {str(e)}"}
 
-    def _identify_relevant_chunks(self, title: str, issue_description: str) -> List[str]:
+    def _build_result(self, relevant_chunks: List[str], chunk_files: List[Set[str]]) -> Dict[str, any]:
+        """Combine the files found in each relevant chunk into the final result.
+
+        Args:
+            relevant_chunks: Names of the chunks that were analyzed
+            chunk_files: Files found in each batch of those chunks
+
+        Returns:
+            Dictionary with relevant_files, relevant_chunks and analysis_summary
+        """
+        all_files = set().union(*chunk_files)
+
+        # Analyze dependencies and add supporting files
+        final_files = self._analyze_dependencies(all_files)
+
+        logger.info(f"Identified {len(final_files)} relevant file(s) total")
+
+        return {
+            "relevant_files": sorted(final_files),
+            "relevant_chunks": relevant_chunks,
+            "analysis_summary": f"Analyzed {len(self.chunks)} directories, found {len(relevant_chunks)} relevant, identified {len(final_files)} files",
+        }
+
+    def _identify_relevant_chunks(
+        self, title: str, issue_description: str, prefetch_executor: Optional[ThreadPoolExecutor] = None
+    ) -> List[str]:
         """Identify which directory chunks are relevant to the issue.
 
         Args:
             title: Issue title
             issue_description: Issue description
+            prefetch_executor: If given, candidate chunks are read on it while Gemini picks the relevant ones
 
         Returns:
             List of chunk names that are relevant
         """
-        prompt = f"""You are analyzing a software issue to identify which directories contain relevant code.
+        candidates = self._candidate_chunks(title, issue_description)
+        if len(candidates) == 1:
+            return candidates
+
+        if prefetch_executor:
+            for chunk_name in self._chunks_to_prefetch(candidates):
+                prefetch_executor.submit(self.chunks.prefetch, chunk_name)
+
+        prompt = self._create_chunk_selection_prompt(title, issue_description, candidates)
+
+        try:
+            logger.info("Identifying relevant directories...")
+            response_text = self._generate(prompt, self.coarse_model_name, _CHUNK_SELECTION_CONFIG)
+            return self._parse_relevant_chunks(response_text)
+        except Exception as e:
+            logger.error(f"Error identifying relevant chunks: {e}")
+            # Fallback: return all candidate chunks if analysis fails
+            return candidates
+
+    async def _identify_relevant_chunks_async(self, title: str, issue_description: str) -> List[str]:
+        """Async counterpart of _identify_relevant_chunks."""
+        candidates = self._candidate_chunks(title, issue_description)
+        if len(candidates) == 1:
+            return candidates
+
+        prefetches = [
+            asyncio.create_task(asyncio.to_thread(self.chunks.prefetch, chunk_name))
+            for chunk_name in self._chunks_to_prefetch(candidates)
+        ]
+        prompt = self._create_chunk_selection_prompt(title, issue_description, candidates)
+
+        try:
+            logger.info("Identifying relevant directories...")
+            response_text = await self._generate_async(prompt, self.coarse_model_name, _CHUNK_SELECTION_CONFIG)
+            return self._parse_relevant_chunks(response_text)
+        except Exception as e:
+            logger.error(f"Error identifying relevant chunks: {e}")
+            # Fallback: return all candidate chunks if analysis fails
+            return candidates
+        finally:
+            await asyncio.gather(*prefetches)
+
+    @staticmethod
+    def _chunks_to_prefetch(candidates: List[str]) -> List[str]:
+        """Return the candidate chunks worth reading before chunk selection finishes.
+
+        Candidates are only prefetched when they all fit in the chunk cache; otherwise reading them would
+        evict each other and turn lazy loading back into reading the whole codebase.
+        """
+        return candidates if len(candidates) <= _CHUNK_CACHE_SIZE else []
+
+    def _candidate_chunks(self, title: str, issue_description: str) -> List[str]:
+        """Shortlist the chunks offered for chunk selection.
+
+        Args:
+            title: Issue title
+            issue_description: Issue description
+
+        Returns:
+            The max_chunk_candidates chunks most similar to the issue, in chunk order, or all chunks if no limit
+            is set or nothing matches the issue
+        """
+        chunk_names = list(self.chunks.keys())
+        if self.max_chunk_candidates is None or self.max_chunk_candidates >= len(chunk_names):
+            return chunk_names
+
+        if self._chunk_index is None:
+            self._chunk_index = self._build_chunk_index(chunk_names)
+        vectorizer, chunk_matrix = self._chunk_index
+
+        # TF-IDF rows are L2-normalized, so the dot product is the cosine similarity
+        scores = (chunk_matrix @ vectorizer.transform([f"{title} {issue_description}"]).T).toarray().ravel()
+        if not scores.any():
+            return chunk_names
+
+        top = np.argpartition(-scores, self.max_chunk_candidates - 1)[: self.max_chunk_candidates]
+        candidates = [chunk_names[i] for i in sorted(top) if scores[i] > 0]
+        logger.info(f"Shortlisted {len(candidates)} of {len(chunk_names)} chunks")
+        return candidates
+
+    def _build_chunk_index(self, chunk_names: List[str]):
+        """Fit a TF-IDF index over each chunk's name and the start of its content.
+
+        Only the first _CHUNK_INDEX_PREFIX_CHARS characters of a chunk are read, so indexing stays cheap
+        even for large chunks.
+
+        Args:
+            chunk_names: Names of the chunks to index, in order
+
+        Returns:
+            Tuple of (fitted vectorizer, chunk matrix with one row per chunk)
+        """
+        documents = []
+        for chunk_name in chunk_names:
+            try:
+                with open(self.chunks_dir / f"{chunk_name}.txt", encoding="utf-8", errors="replace") as f:
+                    prefix = f.read(_CHUNK_INDEX_PREFIX_CHARS)
+            except OSError as e:
+                logger.warning(f"Could not index chunk {chunk_name}: {e}")
+                prefix = ""
+            # Chunk names join path components with underscores
+            documents.append(f"{chunk_name.replace('_', ' ')} {prefix}")
+
+        vectorizer = TfidfVectorizer(
+            lowercase=True,
+            token_pattern=r"(?u)\b\w\w+\b",
+            sublinear_tf=True,  # Dampen chunks that repeat the same terms
+        )
+        return vectorizer, vectorizer.fit_transform(documents)
+
+    def _generate(
+        self, prompt: str, model_name: Optional[str] = None, config: Optional[types.GenerateContentConfig] = None
+    ) -> str:
+        """Send a prompt to Gemini and return the response text, using the response cache if enabled.
+
+        Args:
+            prompt: Prompt to send
+            model_name: Model to use. Defaults to the file extraction model.
+            config: Optional generation config
+
+        Returns:
+            Response text
+        """
+        model_name = model_name or self.model_name
+        cache_key = ResponseCache.make_key(model_name, prompt) if self.response_cache else None
+        if cache_key:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                logger.debug("Using cached Gemini response")
+                return cached
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                response_text = self.client.models.generate_content(model=model_name, contents=prompt, config=config).text
+                break
+            except Exception as e:
+                if attempt < self.max_retries and is_retryable_error(e):
+                    logger.warning(f"Gemini request failed, retrying... (attempt {attempt + 2}/{self.max_retries + 1}): {e}")
+                    time.sleep(backoff_delay(attempt))
+                    continue
+                raise
+
+        if cache_key and response_text:
+            self.response_cache.set(cache_key, response_text)
+        return response_text
+
+    async def _generate_async(
+        self, prompt: str, model_name: Optional[str] = None, config: Optional[types.GenerateContentConfig] = None
+    ) -> str:
+        """Async counterpart of _generate."""
+        model_name = model_name or self.model_name
+        cache_key = ResponseCache.make_key(model_name, prompt) if self.response_cache else None
+        if cache_key:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                logger.debug("Using cached Gemini response")
+                return cached
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self.client.aio.models.generate_content(model=model_name, contents=prompt, config=config)
+                response_text = response.text
+                break
+            except Exception as e:
+                if attempt < self.max_retries and is_retryable_error(e):
+                    logger.warning(f"Gemini request failed, retrying... (attempt {attempt + 2}/{self.max_retries + 1}): {e}")
+                    await asyncio.sleep(backoff_delay(attempt))
+                    continue
+                raise
+
+        if cache_key and response_text:
+            self.response_cache.set(cache_key, response_text)
+        return response_text
+
+    def _create_chunk_selection_prompt(self, title: str, issue_description: str, chunk_names: List[str]) -> str:
+        """Create the prompt asking which of the given directory chunks relate to the issue."""
+        return f"""You are analyzing a software issue to identify which directories contain relevant code.
 
 ISSUE:
 Title: {title}
 Description: {issue_description}
 
 AVAILABLE DIRECTORIES:
-{', '.join(self.chunks.keys())}
+{', '.join(chunk_names)}
 
 TASK: Return ONLY the directory names (from the list above) that are most likely to contain code related to this issue.
 
@@ -148,22 +490,84 @@ plugins_modules
 lib_ansible
 tests"""
 
+    def _parse_relevant_chunks(self, response_text: str) -> List[str]:
+        """Keep the lines of a chunk selection response that name a known chunk."""
+        relevant_chunks = []
+        for line in response_text.splitlines():
+            chunk_name = line.strip()
+            if chunk_name in self.chunks:
+                relevant_chunks.append(chunk_name)
+                logger.info(f"  ✓ Relevant chunk: {chunk_name}")
+
+        return relevant_chunks
+
+    def _plan_chunk_batches(self, chunk_names: List[str]) -> List[List[str]]:
+        """Group chunks into file extraction requests.
+
+        Without max_batch_chars every chunk gets its own request. Otherwise consecutive chunks are packed
+        into one request until their combined file size would exceed the budget; a chunk larger than the
+        budget is sent on its own.
+
+        Args:
+            chunk_names: Names of the chunks to analyze
+
+        Returns:
+            List of batches of chunk names
+        """
+        if self.max_batch_chars is None:
+            return [[chunk_name] for chunk_name in chunk_names]
+
+        batches = []
+        batch, batch_chars = [], 0
+        for chunk_name in chunk_names:
+            chunk_chars = self.chunks.size(chunk_name)
+            if batch and batch_chars + chunk_chars > self.max_batch_chars:
+                batches.append(batch)
+                batch, batch_chars = [], 0
+            batch.append(chunk_name)
+            batch_chars += chunk_chars
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _extract_files_from_chunks(self, chunk_names: List[str], title: str, issue_description: str) -> Set[str]:
+        """Extract specific relevant files from a batch of chunks in one request.
+
+        Args:
+            chunk_names: Names of the chunks to analyze
+            title: Issue title
+            issue_description: Issue description
+
+        Returns:
+            Set of file paths
+        """
+        if len(chunk_names) == 1:
+            return self._extract_files_from_chunk(chunk_names[0], title, issue_description)
+
         try:
-            logger.info("Identifying relevant directories...")
-            response = self.client.models.generate_content(model=self.model_name, contents=prompt)
+            logger.info(f"Extracting files from chunks: {', '.join(chunk_names)}")
+            # Reads the chunk content, so a chunk that cannot be read only loses its own files
+            prompt = self._create_batched_extraction_prompt(chunk_names, title, issue_description)
+            response_text = self._generate(prompt)
+            return self._parse_batched_files(chunk_names, response_text)
+        except Exception as e:
+            logger.error(f"Error extracting files from chunks {', '.join(chunk_names)}: {e}")
+            return set()
 
-            relevant_chunks = []
-            for line in response.text.strip().split("\n"):
-                chunk_name = line.strip()
-                if chunk_name in self.chunks:
-                    relevant_chunks.append(chunk_name)
-                    logger.info(f"  ✓ Relevant chunk: {chunk_name}")
+    async def _extract_files_from_chunks_async(self, chunk_names: List[str], title: str, issue_description: str) -> Set[str]:
+        """Async counterpart of _extract_files_from_chunks."""
+        if len(chunk_names) == 1:
+            return await self._extract_files_from_chunk_async(chunk_names[0], title, issue_description)
 
-            return relevant_chunks
+        try:
+            logger.info(f"Extracting files from chunks: {', '.join(chunk_names)}")
+            # Reads the chunk content, so a chunk that cannot be read only loses its own files
+            prompt = self._create_batched_extraction_prompt(chunk_names, title, issue_description)
+            response_text = await self._generate_async(prompt)
+            return self._parse_batched_files(chunk_names, response_text)
         except Exception as e:
-            logger.error(f"Error identifying relevant chunks: {e}")
-            # Fallback: return all chunks if analysis fails
-            return list(self.chunks.keys())
+            logger.error(f"Error extracting files from chunks {', '.join(chunk_names)}: {e}")
+            return set()
 
     def _extract_files_from_chunk(self, chunk_name: str, title: str, issue_description: str) -> Set[str]:
         """Extract specific relevant files from a chunk.
@@ -176,9 +580,49 @@ tests"""
         Returns:
             Set of file paths
         """
+        try:
+            logger.info(f"Extracting files from chunk: {chunk_name}")
+            # Reads the chunk content, so a chunk that cannot be read only loses its own files
+            prompt = self._create_file_extraction_prompt(chunk_name, title, issue_description)
+            response_text = self._generate(prompt)
+            return self._parse_extracted_files(chunk_name, response_text)
+        except Exception as e:
+            logger.error(f"Error extracting files from chunk {chunk_name}: {e}")
+            return set()
+
+    async def _extract_files_from_chunk_async(self, chunk_name: str, title: str, issue_description: str) -> Set[str]:
+        """Async counterpart of _extract_files_from_chunk."""
+        try:
+            logger.info(f"Extracting files from chunk: {chunk_name}")
+            # Reads the chunk content, so a chunk that cannot be read only loses its own files
+            prompt = self._create_file_extraction_prompt(chunk_name, title, issue_description)
+            response_text = await self._generate_async(prompt)
+            return self._parse_extracted_files(chunk_name, response_text)
+        except Exception as e:
+            logger.error(f"Error extracting files from chunk {chunk_name}: {e}")
+            return set()
+
+    def _chunk_prompt_content(self, chunk_name: str, title: str, issue_description: str) -> str:
+        """Return the part of a chunk to include in a file extraction prompt.
+
+        Args:
+            chunk_name: Name of the chunk
+            title: Issue title
+            issue_description: Issue description
+
+        Returns:
+            The whole chunk, or only its max_files_per_chunk files most similar to the issue if that is set
+        """
         chunk_content = self.chunks[chunk_name]
+        if self.max_files_per_chunk is None:
+            return chunk_content
+        return CodebaseRetriever(chunk_content).retrieve(f"{title}\n{issue_description}", self.max_files_per_chunk)
 
-        prompt = f"""You are analyzing compressed code from the "{chunk_name}" directory to identify specific files relevant to this issue.
+    def _create_file_extraction_prompt(self, chunk_name: str, title: str, issue_description: str) -> str:
+        """Create the prompt asking which files of a chunk relate to the issue."""
+        chunk_content = self._chunk_prompt_content(chunk_name, title, issue_description)
+
+        return f"""You are analyzing compressed code from the "{chunk_name}" directory to identify specific files relevant to this issue.
 
 ISSUE:
 Title: {title}
@@ -201,30 +645,68 @@ plugins/modules/ios_vlans.py
 plugins/module_utils/network/ios/config/vlans/vlans.py
 tests/unit/modules/network/ios/test_ios_vlans.py"""
 
-        try:
-            logger.info(f"Extracting files from chunk: {chunk_name}")
-            response = self.client.models.generate_content(model=self.model_name, contents=prompt)
-
-            files = set()
-            for line in response.text.strip().split("\n"):
-                file_path = line.strip()
-                # Basic validation - must have / and a file extension, not start with # or be too long
-                if (
-                    file_path
-                    and "/" in file_path
-                    and "." in file_path.split("/")[-1]  # Has extension in filename
-                    and not file_path.startswith("#")
-                    and not file_path.lower().startswith("there")  # Filter out error messages
-                    and not file_path.lower().startswith("no ")
-                    and len(file_path) < 200  # Reasonable path length
-                ):
-                    files.add(file_path)
-
-            logger.info(f"  Found {len(files)} files in {chunk_name}")
-            return files
-        except Exception as e:
-            logger.error(f"Error extracting files from chunk {chunk_name}: {e}")
-            return set()
+    def _create_batched_extraction_prompt(self, chunk_names: List[str], title: str, issue_description: str) -> str:
+        """Create the prompt asking which files of several chunks relate to the issue."""
+        chunk_sections = "\n".join(
+            f"=== CHUNK: {chunk_name} ===\n{self._chunk_prompt_content(chunk_name, title, issue_description)}\n"
+            for chunk_name in chunk_names
+        )
+
+        return f"""You are analyzing compressed code from several directories to identify the files relevant to this issue.
+
+ISSUE:
+Title: {title}
+Description: {issue_description}
+
+DIRECTORY CONTENT (one section per directory):
+{chunk_sections}
+TASK: Return ONLY the file paths (with full relative paths) that are relevant to this issue, grouped by directory.
+
+INSTRUCTIONS:
+1. Extract specific file paths from the content above
+2. Include files that directly relate to the issue
+3. Before the files of each directory, write a line "CHUNK: <directory name>" using the section names above
+4. Return ONLY file paths, one per line, under their directory line; skip directories with no relevant files
+5. Use the full relative path (e.g., "plugins/modules/file.py")
+6. NO explanations, NO numbering
+
+Example output format:
+CHUNK: plugins_modules
+plugins/modules/ios_vlans.py
+CHUNK: tests
+tests/unit/modules/network/ios/test_ios_vlans.py"""
+
+    def _parse_batched_files(self, chunk_names: List[str], response_text: str) -> Set[str]:
+        """Collect the file paths of a batched extraction response, section by section."""
+        # re.split alternates text and captured chunk names; text before the first header belongs to no chunk
+        parts = _CHUNK_HEADER_RE.split(response_text)
+        sections = [(", ".join(chunk_names), parts[0])] + list(zip(parts[1::2], parts[2::2]))
+
+        files = set()
+        for chunk_name, section in sections:
+            if section.strip():
+                files.update(self._parse_extracted_files(chunk_name, section))
+        return files
+
+    def _parse_chunk_file_paths(self, chunk_name: str) -> frozenset:
+        """Parse the file paths packed in a chunk from its repomix file headers; cached as _chunk_file_paths."""
+        return frozenset(repomix_file_paths(self.chunks[chunk_name]))
+
+    def _parse_extracted_files(self, chunk_name: str, response_text: str) -> Set[str]:
+        """Keep the lines of a file extraction response that name files of the chunk.
+
+        Paths are checked against the chunk's repomix file headers, which also drops paths the model made up.
+        Chunks without file headers fall back to keeping lines that look like file paths.
+        """
+        lines = map(str.strip, response_text.splitlines())
+        chunk_files = self._chunk_file_paths(chunk_name) if chunk_name in self.chunks else None
+        if chunk_files:
+            files = set(filter(chunk_files.__contains__, lines))
+        else:
+            files = set(filter(_FILE_PATH_RE.match, lines))
+
+        logger.info(f"  Found {len(files)} files in {chunk_name}")
+        return files
 
     def _analyze_dependencies(self, files: Set[str]) -> Set[str]:
         """Analyze files to identify dependencies and add supporting files.
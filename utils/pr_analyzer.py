@@ -2,48 +2,163 @@
 """
 PR Reviewer using Gemini API
 """
+import asyncio
+import copy
 import logging
 import os
 import re
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 
 import yaml
 from dotenv import load_dotenv
-from google import genai
 
+from utils.cache import ResponseCache
 from utils.models import PRFileChange, PRReview, PRReviewComment
 
+try:
+    # libyaml's C parser, when PyYAML was built with it
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
 # Load environment variables
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Longest diff of a single file included in a review prompt, in characters
+MAX_PATCH_CHARS = 5000
+
+# Parsed prompt configs by resolved path, with the (mtime_ns, size) they were parsed at, least recently used first
+_CONFIG_CACHE: "OrderedDict[str, Tuple[int, int, Dict]]" = OrderedDict()
+_CONFIG_CACHE_MAX = 32
+
+# Markup a review needs for file comments or sections to be found: headers, bold text, file labels or numbered lines
+_REVIEW_STRUCTURE_RE = re.compile(r"#|\*\*|File:|^\s*\d+\.", re.MULTILINE)
+
+# Line number mentioned in a file comment, e.g. "line 12", "(line 12)" or "Lines: 12-14"
+_LINE_NUMBER_RE = re.compile(r"\blines?\b\D{0,10}?(\d+)", re.IGNORECASE)
+
+# Leading "[placeholder]" text of an extracted section
+_PLACEHOLDER_RE = re.compile(r"^\[.*?\]\s*")
+
+# List item with a bullet and/or number prefix, capturing the item text
+_LIST_ITEM_RE = re.compile(r"^(?:[-*•]\s+(?:\d+\.\s+)?|\d+\.\s+)(.*)")
+
+
+def _read_yaml_config(config_path: Path) -> Dict:
+    """Parse a YAML config file, reusing the parse of an unchanged file
+
+    Args:
+        config_path: Path to the YAML file
+
+    Returns:
+        A copy of the parsed configuration that the caller may modify
+    """
+    key = str(config_path.resolve())
+    stat = config_path.stat()
+    cached = _CONFIG_CACHE.get(key)
+    if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        _CONFIG_CACHE.move_to_end(key)
+        return copy.deepcopy(cached[2])
+
+    # Read bytes so the parser detects the encoding itself, without a separate decode step
+    with open(config_path, "rb") as f:
+        config = yaml.load(f, Loader=_YamlLoader)
+
+    _CONFIG_CACHE[key] = (stat.st_mtime_ns, stat.st_size, config)
+    _CONFIG_CACHE.move_to_end(key)
+    if len(_CONFIG_CACHE) > _CONFIG_CACHE_MAX:
+        _CONFIG_CACHE.popitem(last=False)
+    return copy.deepcopy(config)
+
+
+@lru_cache(maxsize=256)
+def _compile_repo_pattern(pattern: str) -> Optional[re.Pattern]:
+    """Compile a repo URL pattern from the prompt config, or return None if it is invalid
+
+    Args:
+        pattern: Regular expression matched case-insensitively against repository URLs
+
+    Returns:
+        Compiled pattern, or None for an invalid pattern (logged once)
+    """
+    try:
+        return re.compile(pattern, re.IGNORECASE)
+    except re.error as e:
+        logger.warning(f"Invalid regex pattern '{pattern}': {e}")
+        return None
+
+
+@lru_cache(maxsize=128)
+def _compile_section_patterns(header: str) -> Tuple[re.Pattern, re.Pattern]:
+    """Compile the patterns locating a review section by its header
+
+    Args:
+        header: Section header text
+
+    Returns:
+        Patterns for a markdown header (e.g., "## 1. Overall Assessment") and for a numbered list entry
+    """
+    flags = re.DOTALL | re.IGNORECASE | re.MULTILINE
+    return (
+        re.compile(rf"#+\s*\d*\.?\s*\*?\*?{re.escape(header)}\*?\*?:?\s*\n(.*?)(?=\n#+|\Z)", flags),  # With optional number
+        re.compile(rf"^\s*\d+\.\s*\*?\*?{re.escape(header)}\*?\*?:?\s*\n(.*?)(?=\n\d+\.|\Z)", flags),  # Numbered list
+    )
+
 
 class PRAnalyzer:
     """Analyze pull requests using Gemini API"""
 
-    def __init__(self, api_key: Optional[str] = None, config_path: Optional[str] = None, model_name: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        config_path: Optional[str] = None,
+        model_name: Optional[str] = None,
+        max_total_patch_chars: Optional[int] = None,
+        cache_dir: Optional[str] = None,
+    ):
         """Initialize the PR analyzer with Gemini API key
 
         Args:
             api_key: Gemini API key. If not provided, will use GEMINI_API_KEY or GOOGLE_API_KEY env var.
             config_path: Path to prompt configuration file. If not provided, uses default config.
             model_name: Gemini model name. If not provided, defaults to gemini-2.0-flash-001.
+            max_total_patch_chars: Budget for the diffs of all files in a review prompt. The largest diffs that
+                fit are included and the remaining files are listed with line counts only. If not provided,
+                every diff is included.
+            cache_dir: Directory for caching reviews on disk. Reviewing a PR whose prompt (title, description,
+                diffs and repo-specific instructions) and model are unchanged is then served from the cache.
         """
+        if max_total_patch_chars is not None and max_total_patch_chars < 0:
+            raise ValueError("max_total_patch_chars must be non-negative")
+
         self.api_key = api_key or os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
         self.model_name = model_name or "gemini-2.0-flash-001"
+        self.max_total_patch_chars = max_total_patch_chars
 
         if not self.api_key:
             logger.warning("Gemini API key not provided")
             self.client = None
         else:
+            # Imported here so that formatting reviews does not load google-genai
+            from google import genai
+
             self.client = genai.Client(api_key=self.api_key)
 
         # Load prompt configuration
         self.prompt_config = self._load_prompt_config(config_path)
         logger.info(f"Loaded prompt configuration with repo types: {list(self.prompt_config.get('prompts', {}).keys())}")
 
+        # Repo type per URL and snapshot of repo_mappings, so edits to the mappings are picked up
+        self._match_repo_type_cached = lru_cache(maxsize=256)(self._match_repo_type)
+
+        # Optional review cache, keyed by the model and the full review prompt
+        self.response_cache = ResponseCache(cache_dir) if cache_dir else None
+
     def _load_prompt_config(self, config_path: Optional[str] = None) -> Dict:
         """Load prompt configuration from YAML file
 
@@ -64,8 +179,7 @@ class PRAnalyzer:
             return self._get_default_config()
 
         try:
-            with open(config_path, "r", encoding="utf-8") as f:
-                config = yaml.safe_load(f)
+            config = _read_yaml_config(config_path)
             logger.info(f"Successfully loaded prompt config from {config_path}")
             return config
         except Exception as e:
@@ -126,17 +240,28 @@ Be concise, actionable, and helpful. Format your response with clear markdown se
         if not repo_url:
             return "default"
 
+        # Key the memo on the current mappings, so edits made after construction are honored
         repo_mappings = self.prompt_config.get("repo_mappings", {})
+        mappings_snapshot = tuple((repo_type, tuple(patterns)) for repo_type, patterns in repo_mappings.items())
+        return self._match_repo_type_cached(repo_url, mappings_snapshot)
 
+    def _match_repo_type(self, repo_url: str, repo_mappings: Tuple[Tuple[str, Tuple[str, ...]], ...]) -> str:
+        """Match a repo URL against repo_mappings patterns
+
+        Args:
+            repo_url: Repository URL
+            repo_mappings: (repo type, URL patterns) pairs in configuration order
+
+        Returns:
+            Repository type identifier
+        """
         # Check each repo type's URL patterns
-        for repo_type, patterns in repo_mappings.items():
+        for repo_type, patterns in repo_mappings:
             for pattern in patterns:
-                try:
-                    if re.search(pattern, repo_url, re.IGNORECASE):
-                        logger.info(f"Matched repo URL '{repo_url}' to type '{repo_type}' using pattern '{pattern}'")
-                        return repo_type
-                except re.error as e:
-                    logger.warning(f"Invalid regex pattern '{pattern}': {e}")
+                compiled = _compile_repo_pattern(pattern)
+                if compiled and compiled.search(repo_url):
+                    logger.info(f"Matched repo URL '{repo_url}' to type '{repo_type}' using pattern '{pattern}'")
+                    return repo_type
 
         logger.info(f"No match found for repo URL '{repo_url}', using default prompt")
         return "default"
@@ -151,19 +276,13 @@ Be concise, actionable, and helpful. Format your response with clear markdown se
         Returns:
             Prompt configuration dictionary
         """
+        # Read the config live, so prompts edited after construction are used; try the repo type, then default
         prompts = self.prompt_config.get("prompts", {})
-
-        # Try to get repo-specific prompt
-        if repo_type in prompts:
-            repo_prompts = prompts[repo_type]
-            if prompt_type in repo_prompts:
+        for prompts_key in (repo_type, "default"):
+            repo_prompts = prompts.get(prompts_key)
+            if isinstance(repo_prompts, dict) and prompt_type in repo_prompts:
                 return repo_prompts[prompt_type]
 
-        # Fallback to default
-        default_prompts = prompts.get("default", {})
-        if prompt_type in default_prompts:
-            return default_prompts[prompt_type]
-
         # Ultimate fallback
         logger.warning(f"Prompt type '{prompt_type}' not found, using empty dict")
         return {}
@@ -179,16 +298,12 @@ Be concise, actionable, and helpful. Format your response with clear markdown se
         """
         prompts = self.prompt_config.get("prompts", {})
 
-        # Try to get repo-specific workflow analysis
-        if repo_type in prompts:
-            repo_prompts = prompts[repo_type]
-            if "pr_review" in repo_prompts and "workflow_analysis" in repo_prompts["pr_review"]:
-                return repo_prompts["pr_review"]["workflow_analysis"]
-
-        # Fallback to default
-        default_prompts = prompts.get("default", {})
-        if "pr_review" in default_prompts and "workflow_analysis" in default_prompts["pr_review"]:
-            return default_prompts["pr_review"]["workflow_analysis"]
+        # Try to get repo-specific workflow analysis, then fall back to default
+        for prompts_key in (repo_type, "default"):
+            repo_prompts = prompts.get(prompts_key)
+            pr_review = repo_prompts.get("pr_review") if isinstance(repo_prompts, dict) else None
+            if isinstance(pr_review, dict) and "workflow_analysis" in pr_review:
+                return pr_review["workflow_analysis"]
 
         return ""
 
@@ -207,15 +322,7 @@ Be concise, actionable, and helpful. Format your response with clear markdown se
         """
         if not self.client:
             logger.error("Gemini client not initialized")
-            return PRReview(
-                summary="Error: Gemini API key not configured",
-                file_comments=[],
-                overall_assessment="Unable to perform review without API key",
-                strengths=[],
-                issues_found=[],
-                suggestions=[],
-                confidence_score=0.0,
-            )
+            return self._missing_client_review()
 
         try:
             # Determine repo type and get appropriate prompt
@@ -224,6 +331,12 @@ Be concise, actionable, and helpful. Format your response with clear markdown se
             # Prepare context for review
             review_prompt = self._build_review_prompt(title, body, file_changes, repo_type)
 
+            cache_key = ResponseCache.make_key(self.model_name, review_prompt) if self.response_cache else None
+            if cache_key:
+                cached = self._get_cached_review(cache_key)
+                if cached:
+                    return cached
+
             # Generate review
             logger.info("Generating review with Gemini API...")
             response = self.client.models.generate_content(model=self.model_name, contents=review_prompt)
@@ -234,19 +347,124 @@ Be concise, actionable, and helpful. Format your response with clear markdown se
             # Structure the review
             review = self._parse_review(review_text, file_changes, title, body)
 
+            if cache_key:
+                self.response_cache.set(cache_key, review.model_dump_json())
             return review
 
         except Exception as e:
             logger.error(f"Error generating review: {e}")
-            return PRReview(
-                summary=f"Error generating review: {str(e)}",
-                file_comments=[],
-                overall_assessment=f"Review failed: {str(e)}",
-                strengths=[],
-                issues_found=[],
-                suggestions=[],
-                confidence_score=0.0,
-            )
+            return self._failed_review(e)
+
+    async def review_pr_async(
+        self, title: str, body: str, file_changes: List[Dict], repo_url: Optional[str] = None
+    ) -> PRReview:
+        """Review a pull request using the async Gemini client
+
+        Args:
+            title: PR title
+            body: PR description
+            file_changes: List of file change dictionaries with keys: filename, status, additions, deletions, patch
+            repo_url: Optional repository URL for determining review style
+
+        Returns:
+            PRReview object containing review summary and file comments
+        """
+        if not self.client:
+            logger.error("Gemini client not initialized")
+            return self._missing_client_review()
+
+        try:
+            repo_type = self._get_repo_type(repo_url or "")
+            review_prompt = self._build_review_prompt(title, body, file_changes, repo_type)
+
+            cache_key = ResponseCache.make_key(self.model_name, review_prompt) if self.response_cache else None
+            if cache_key:
+                cached = self._get_cached_review(cache_key)
+                if cached:
+                    return cached
+
+            logger.info("Generating review with Gemini API...")
+            response = await self.client.aio.models.generate_content(model=self.model_name, contents=review_prompt)
+
+            review = self._parse_review(response.text, file_changes, title, body)
+            if cache_key:
+                self.response_cache.set(cache_key, review.model_dump_json())
+            return review
+
+        except Exception as e:
+            logger.error(f"Error generating review: {e}")
+            return self._failed_review(e)
+
+    async def batch_review_prs_async(self, prs: List[Dict], max_concurrency: int = 8) -> List[PRReview]:
+        """Review multiple pull requests concurrently on the event loop
+
+        A PR whose review fails gets an error review; the other PRs are unaffected.
+
+        Args:
+            prs: List of dictionaries with 'title', 'body' and 'file_changes' keys and an optional 'repo_url' key
+            max_concurrency: Maximum number of in-flight Gemini requests (default: 8)
+
+        Returns:
+            List of reviews in the same order as the input PRs
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def review(pr: Dict) -> PRReview:
+            async with semaphore:
+                return await self.review_pr_async(pr["title"], pr["body"], pr["file_changes"], pr.get("repo_url"))
+
+        return list(await asyncio.gather(*(review(pr) for pr in prs)))
+
+    def _get_cached_review(self, cache_key: str) -> Optional[PRReview]:
+        """Load a cached review, or None if there is no usable entry
+
+        Args:
+            cache_key: Response cache key of the review prompt
+
+        Returns:
+            The cached PRReview, or None
+        """
+        cached = self.response_cache.get(cache_key)
+        if cached is None:
+            return None
+        try:
+            review = PRReview.model_validate_json(cached)
+        except ValueError as e:
+            logger.warning(f"Ignoring unreadable cache entry {cache_key}: {e}")
+            return None
+        logger.info("Serving review from cache")
+        return review
+
+    def _missing_client_review(self) -> PRReview:
+        """Return the review reported when no Gemini client is configured"""
+        return PRReview(
+            summary="Error: Gemini API key not configured",
+            file_comments=[],
+            overall_assessment="Unable to perform review without API key",
+            strengths=[],
+            issues_found=[],
+            suggestions=[],
+            confidence_score=0.0,
+        )
+
+    def _failed_review(self, error: Exception) -> PRReview:
+        """Return the review reported when generating a review failed
+
+        Args:
+            error: Exception raised while generating the review
+
+        Returns:
+            PRReview describing the failure
+        """
+        return PRReview(
+            summary=f"Error generating review: {str(error)}",
+            file_comments=[],
+            overall_assessment=f"Review failed: {str(error)}",
+            strengths=[],
+            issues_found=[],
+            suggestions=[],
+            confidence_score=0.0,
+        )
 
     def _build_review_prompt(self, title: str, body: str, file_changes: List[Dict], repo_type: str = "default") -> str:
         """Build the prompt for Gemini API using repo-specific configuration
@@ -268,8 +486,8 @@ Be concise, actionable, and helpful. Format your response with clear markdown se
         )
         review_structure = prompt_config.get("review_structure", "")
 
-        # Build the prompt
-        prompt = f"""{system_role}
+        # Build the prompt from parts joined once at the end
+        parts = [f"""{system_role}
 
 Pull Request Title: {title}
 
@@ -277,28 +495,56 @@ Pull Request Description:
 {body}
 
 Changed Files:
-"""
+"""]
+
+        patches = [file_change.get("patch") or "" for file_change in file_changes]
+        shown = self._select_patches(patches)
 
-        for file_change in file_changes:
+        for index, file_change in enumerate(file_changes):
             filename = file_change.get("filename", "unknown")
             status = file_change.get("status", "unknown")
             additions = file_change.get("additions", 0)
             deletions = file_change.get("deletions", 0)
-            patch = file_change.get("patch", "")
+            patch = patches[index]
 
-            prompt += f"\n--- File: {filename} ({status}) ---\n"
-            prompt += f"Additions: +{additions}, Deletions: -{deletions}\n"
+            parts.append(f"\n--- File: {filename} ({status}) ---\nAdditions: +{additions}, Deletions: -{deletions}\n")
 
-            if patch:
+            if patch and index in shown:
                 # Limit patch size to avoid token limits
-                patch_preview = patch[:5000] if len(patch) > 5000 else patch
-                prompt += f"\nDiff:\n{patch_preview}\n"
-                if len(patch) > 5000:
-                    prompt += "\n[... diff truncated ...]\n"
+                truncated = len(patch) > MAX_PATCH_CHARS
+                parts.append(f"\nDiff:\n{patch[:MAX_PATCH_CHARS] if truncated else patch}\n")
+                if truncated:
+                    parts.append("\n[... diff truncated ...]\n")
 
-        prompt += f"\n{review_structure}"
+        omitted = sum(1 for index, patch in enumerate(patches) if patch and index not in shown)
+        if omitted:
+            parts.append(f"\n[... {omitted} file(s) with only line counts shown ...]\n")
 
-        return prompt
+        parts.append(f"\n{review_structure}")
+
+        return "".join(parts)
+
+    def _select_patches(self, patches: List[str]) -> Set[int]:
+        """Choose which diffs fit in the review prompt
+
+        Args:
+            patches: Diff of each changed file, empty when there is none
+
+        Returns:
+            Indexes of the files whose diff is included
+        """
+        if self.max_total_patch_chars is None:
+            return set(range(len(patches)))
+
+        # Fill the budget with the largest diffs first, as they carry most of the change
+        shown = set()
+        remaining = self.max_total_patch_chars
+        for index in sorted(range(len(patches)), key=lambda i: len(patches[i]), reverse=True):
+            size = min(len(patches[index]), MAX_PATCH_CHARS)
+            if size and size <= remaining:
+                shown.add(index)
+                remaining -= size
+        return shown
 
     def _parse_review(self, review_text: str, file_changes: List[Dict], title: str, body: str) -> PRReview:
         """Parse the review response into structured format
@@ -312,68 +558,24 @@ Changed Files:
         Returns:
             Structured PRReview object
         """
-        # Extract file-specific comments
-        file_comments = []
-
-        # Try to extract file-specific comments from the review
-        lines = review_text.split("\n")
-        current_file = None
-        current_line = None
-        current_comment = []
-
-        for i, line in enumerate(lines):
-            # Look for file references
-            if "File:" in line or "**" in line:
-                # Try to extract filename
-                for file_change in file_changes:
-                    filename = file_change.get("filename", "")
-                    if filename in line:
-                        # Save previous comment if exists
-                        if current_file and current_comment:
-                            file_comments.append(
-                                PRReviewComment(
-                                    file_path=current_file,
-                                    line_number=current_line,
-                                    comment="\n".join(current_comment).strip(),
-                                )
-                            )
-                        current_file = filename
-                        current_line = None
-                        current_comment = []
-                        break
-
-            # Look for line numbers
-            if current_file and ("line" in line.lower() and any(char.isdigit() for char in line)):
-                try:
-                    # Extract line number
-                    words = line.split()
-                    for word in words:
-                        if word.isdigit():
-                            current_line = int(word)
-                            break
-                except:
-                    pass
-
-            # Collect comment lines
-            if current_file and line.strip() and not line.startswith("#"):
-                current_comment.append(line)
-
-        # Save last comment if exists
-        if current_file and current_comment:
-            file_comments.append(
-                PRReviewComment(file_path=current_file, line_number=current_line, comment="\n".join(current_comment).strip())
-            )
+        if _REVIEW_STRUCTURE_RE.search(review_text):
+            # Extract file-specific comments
+            file_comments = self._extract_file_comments(review_text, file_changes)
 
-        # Extract sections from review text
-        overall_assessment = self._extract_section(review_text, ["Overall Assessment", "Summary", "Assessment"])
+            # Extract sections from review text
+            overall_assessment = self._extract_section(review_text, ["Overall Assessment", "Summary", "Assessment"])
 
-        # Clean meta-commentary from overall assessment
-        if overall_assessment:
-            overall_assessment = self._clean_meta_commentary(overall_assessment)
+            # Clean meta-commentary from overall assessment
+            if overall_assessment:
+                overall_assessment = self._clean_meta_commentary(overall_assessment)
 
-        strengths = self._extract_list_section(review_text, ["Strengths", "What was done well"])
-        issues_found = self._extract_list_section(review_text, ["Issues Found", "Issues", "Problems"])
-        suggestions = self._extract_list_section(review_text, ["Suggestions", "Recommendations"])
+            strengths = self._extract_list_section(review_text, ["Strengths", "What was done well"])
+            issues_found = self._extract_list_section(review_text, ["Issues Found", "Issues", "Problems"])
+            suggestions = self._extract_list_section(review_text, ["Suggestions", "Recommendations"])
+        else:
+            # Plain prose has no file references or sections; only the fallback below applies
+            file_comments, strengths, issues_found, suggestions = [], [], [], []
+            overall_assessment = None
 
         # If we couldn't extract an overall assessment but have review text, use smart extraction
         if not overall_assessment and review_text:
@@ -441,6 +643,64 @@ Changed Files:
             confidence_score=0.85,  # Default confidence
         )
 
+    def _extract_file_comments(self, review_text: str, file_changes: List[Dict]) -> List[PRReviewComment]:
+        """Extract file-specific comments from the review text
+
+        Args:
+            review_text: Raw review text from Gemini
+            file_changes: List of file changes
+
+        Returns:
+            Comments attributed to the changed files they mention
+        """
+        file_comments = []
+
+        lines = review_text.split("\n")
+        current_file = None
+        current_line = None
+        current_comment = []
+
+        # One pattern matching any changed filename; longer names first so "src/app.py" wins over "app.py"
+        filenames = sorted({fc.get("filename", "") for fc in file_changes} - {""}, key=len, reverse=True)
+        filename_re = re.compile("|".join(map(re.escape, filenames))) if filenames else None
+
+        for i, line in enumerate(lines):
+            # Look for file references
+            if filename_re and ("File:" in line or "**" in line):
+                # Try to extract filename
+                filename_match = filename_re.search(line)
+                if filename_match:
+                    # Save previous comment if exists
+                    if current_file and current_comment:
+                        file_comments.append(
+                            PRReviewComment(
+                                file_path=current_file,
+                                line_number=current_line,
+                                comment="\n".join(current_comment).strip(),
+                            )
+                        )
+                    current_file = filename_match.group(0)
+                    current_line = None
+                    current_comment = []
+
+            # Look for line numbers
+            if current_file:
+                line_number_match = _LINE_NUMBER_RE.search(line)
+                if line_number_match:
+                    current_line = int(line_number_match.group(1))
+
+            # Collect comment lines
+            if current_file and line.strip() and not line.startswith("#"):
+                current_comment.append(line)
+
+        # Save last comment if exists
+        if current_file and current_comment:
+            file_comments.append(
+                PRReviewComment(file_path=current_file, line_number=current_line, comment="\n".join(current_comment).strip())
+            )
+
+        return file_comments
+
     def _clean_meta_commentary(self, text: str) -> str:
         """Remove common meta-commentary phrases from text
 
@@ -481,20 +741,19 @@ Changed Files:
         Returns:
             Extracted section text or None
         """
+        lowered = text.lower()
         for header in section_headers:
-            # Look for markdown headers with optional numbering (e.g., "## 1. Overall Assessment")
-            # Patterns to try:
-            patterns = [
-                rf"#+\s*\d*\.?\s*\*?\*?{re.escape(header)}\*?\*?:?\s*\n(.*?)(?=\n#+|\Z)",  # With optional number
-                rf"^\s*\d+\.\s*\*?\*?{re.escape(header)}\*?\*?:?\s*\n(.*?)(?=\n\d+\.|\Z)",  # Numbered list
-            ]
+            # Both patterns contain the header itself, so skip scanning for headers the text lacks
+            if header.lower() not in lowered:
+                continue
 
-            for pattern in patterns:
-                match = re.search(pattern, text, re.DOTALL | re.IGNORECASE | re.MULTILINE)
+            # Look for markdown headers with optional numbering (e.g., "## 1. Overall Assessment")
+            for pattern in _compile_section_patterns(header):
+                match = pattern.search(text)
                 if match:
                     extracted = match.group(1).strip()
                     # Clean up [placeholder] style text but keep bullets for list parsing
-                    extracted = re.sub(r"^\[.*?\]\s*", "", extracted)
+                    extracted = _PLACEHOLDER_RE.sub("", extracted)
                     if extracted and len(extracted) > 10:  # Ensure meaningful content
                         return extracted
         return None
@@ -516,13 +775,10 @@ Changed Files:
         # Extract list items (both - and numbered)
         items = []
         for line in section_text.split("\n"):
-            line = line.strip()
-            # Match bullet points or numbered lists
-            if re.match(r"^[-*•]\s+", line) or re.match(r"^\d+\.\s+", line):
-                # Remove the bullet or number
-                item = re.sub(r"^[-*•]\s+", "", line)
-                item = re.sub(r"^\d+\.\s+", "", item)
-                items.append(item.strip())
+            # Match bullet points or numbered lists, keeping the text after the prefix
+            match = _LIST_ITEM_RE.match(line.strip())
+            if match:
+                items.append(match.group(1))
 
         return items
 
@@ -536,58 +792,54 @@ Changed Files:
             Formatted markdown string
         """
         # Add header
-        formatted = "## 🤖 AI Code Review (Powered by Gemini)\n\n"
+        parts = ["## 🤖 AI Code Review (Powered by Gemini)\n\n"]
 
         # Add overall assessment
         if review.overall_assessment:
-            formatted += f"### 📋 Overall Assessment\n\n{review.overall_assessment}\n\n"
-            formatted += "---\n\n"
+            parts.append(f"### 📋 Overall Assessment\n\n{review.overall_assessment}\n\n---\n\n")
 
         # Add strengths
         if review.strengths:
-            formatted += "### ✅ Strengths\n\n"
-            for strength in review.strengths:
-                formatted += f"- {strength}\n"
-            formatted += "\n"
+            parts.append("### ✅ Strengths\n\n")
+            parts.extend(f"- {strength}\n" for strength in review.strengths)
+            parts.append("\n")
 
         # Add issues
         if review.issues_found:
-            formatted += "### ⚠️ Issues Found\n\n"
-            for issue in review.issues_found:
-                formatted += f"- {issue}\n"
-            formatted += "\n"
+            parts.append("### ⚠️ Issues Found\n\n")
+            parts.extend(f"- {issue}\n" for issue in review.issues_found)
+            parts.append("\n")
 
         # Add suggestions
         if review.suggestions:
-            formatted += "### 💡 Suggestions\n\n"
-            for suggestion in review.suggestions:
-                formatted += f"- {suggestion}\n"
-            formatted += "\n"
+            parts.append("### 💡 Suggestions\n\n")
+            parts.extend(f"- {suggestion}\n" for suggestion in review.suggestions)
+            parts.append("\n")
 
         # Add file-specific comments if any
         if review.file_comments:
-            formatted += "### 📝 File-specific Comments\n\n"
+            parts.append("### 📝 File-specific Comments\n\n")
             for comment in review.file_comments:
-                formatted += f"**`{comment.file_path}`**"
+                parts.append(f"**`{comment.file_path}`**")
                 if comment.line_number:
-                    formatted += f" (line {comment.line_number})"
-                formatted += f":\n{comment.comment}\n\n"
+                    parts.append(f" (line {comment.line_number})")
+                parts.append(f":\n{comment.comment}\n\n")
 
         # If no structured content was extracted, show the full summary
         if not any([review.strengths, review.issues_found, review.suggestions, review.file_comments]):
-            formatted += "### 📝 Full Review\n\n"
-            formatted += "<details>\n<summary><b>View Complete Analysis</b></summary>\n\n"
-            formatted += review.summary
-            formatted += "\n\n</details>\n\n"
+            parts.append("### 📝 Full Review\n\n")
+            parts.append("<details>\n<summary><b>View Complete Analysis</b></summary>\n\n")
+            parts.append(review.summary)
+            parts.append("\n\n</details>\n\n")
 
         # Add confidence score
         confidence_percent = int(review.confidence_score * 100)
-        formatted += f"\n📊 **Confidence Score:** {confidence_percent}%\n\n"
+        parts.append(f"\n📊 **Confidence Score:** {confidence_percent}%\n\n")
 
-        formatted += "---\n"
-        formatted += "<sub>🤖 <i>This review was generated automatically by the Gemini AI Code Review Bot.</i></sub>"
+        parts.append("---\n")
+        parts.append("<sub>🤖 <i>This review was generated automatically by the Gemini AI Code Review Bot.</i></sub>")
 
-        return formatted
+        return "".join(parts)
 
     def analyze_workflow_run(
         self,
@@ -634,6 +886,44 @@ Changed Files:
             logger.error(f"Error generating workflow analysis: {e}")
             return self._format_basic_workflow_analysis(conclusion, failed_jobs)
 
+    async def analyze_workflow_run_async(
+        self,
+        workflow_name: str,
+        conclusion: str,
+        jobs: List[Dict],
+        failed_jobs: List[str],
+        workflow_url: str = "",
+        repo_url: Optional[str] = None,
+    ) -> str:
+        """Analyze a GitHub Actions workflow run using the async Gemini client
+
+        Args:
+            workflow_name: Name of the workflow
+            conclusion: Workflow conclusion (success, failure, cancelled, etc.)
+            jobs: List of job information dictionaries
+            failed_jobs: List of failed job names
+            workflow_url: URL to the workflow run
+            repo_url: Optional repository URL for determining analysis style
+
+        Returns:
+            Analysis text string
+        """
+        if not self.client:
+            logger.error("Gemini client not initialized")
+            return self._format_basic_workflow_analysis(conclusion, failed_jobs)
+
+        try:
+            repo_type = self._get_repo_type(repo_url or "")
+            prompt = self._build_workflow_analysis_prompt(workflow_name, conclusion, jobs, failed_jobs, repo_type)
+
+            logger.info("Generating workflow analysis with Gemini API...")
+            response = await self.client.aio.models.generate_content(model=self.model_name, contents=prompt)
+            return response.text
+
+        except Exception as e:
+            logger.error(f"Error generating workflow analysis: {e}")
+            return self._format_basic_workflow_analysis(conclusion, failed_jobs)
+
     def _build_workflow_analysis_prompt(
         self, workflow_name: str, conclusion: str, jobs: List[Dict], failed_jobs: List[str], repo_type: str = "default"
     ) -> str:
@@ -652,13 +942,13 @@ Changed Files:
         # Get workflow analysis template for this repo type
         workflow_analysis_template = self._get_workflow_analysis_prompt(repo_type)
 
-        prompt = f"""You are analyzing a GitHub Actions workflow run. Provide insights about the workflow execution.
+        parts = [f"""You are analyzing a GitHub Actions workflow run. Provide insights about the workflow execution.
 
 Workflow Name: {workflow_name}
 Conclusion: {conclusion}
 
 Jobs Executed:
-"""
+"""]
 
         for job in jobs:
             job_name = job.get("name", "Unknown")
@@ -666,26 +956,25 @@ Jobs Executed:
             job_status = job.get("status", "unknown")
             steps = job.get("steps", [])
 
-            prompt += f"\n- **{job_name}**\n"
-            prompt += f"  Status: {job_status}, Conclusion: {job_conclusion}\n"
+            header = f"\n- **{job_name}**\n  Status: {job_status}, Conclusion: {job_conclusion}\n"
+            parts.append(header + "  Steps:\n" if steps else header)
 
             if steps:
-                prompt += "  Steps:\n"
                 for step in steps:
                     step_name = step.get("name", "Unknown")
                     step_conclusion = step.get("conclusion", "unknown")
                     step_status = step.get("status", "unknown")
                     status_icon = "✅" if step_conclusion == "success" else "❌" if step_conclusion == "failure" else "⏳"
-                    prompt += f"    {status_icon} {step_name}: {step_status} ({step_conclusion})\n"
+                    parts.append(f"    {status_icon} {step_name}: {step_status} ({step_conclusion})\n")
 
         if failed_jobs:
-            prompt += f"\n**Failed Jobs:** {', '.join(failed_jobs)}\n"
+            parts.append(f"\n**Failed Jobs:** {', '.join(failed_jobs)}\n")
 
         if workflow_analysis_template:
-            prompt += f"\n{workflow_analysis_template}"
+            parts.append(f"\n{workflow_analysis_template}")
         else:
             # Fallback to default structure
-            prompt += """
+            parts.append("""
 Please provide:
 1. **Summary**: Brief overview of the workflow execution
 2. **Success Analysis**: If successful, highlight what worked well
@@ -697,9 +986,9 @@ Please provide:
 5. **Best Practices**: Suggestions for workflow improvements
 
 Be concise, actionable, and helpful. Format your response with clear markdown sections.
-"""
+""")
 
-        return prompt
+        return "".join(parts)
 
     def _format_basic_workflow_analysis(self, conclusion: str, failed_jobs: List[str]) -> str:
         """Fallback basic analysis when Gemini is not available
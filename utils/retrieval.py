@@ -0,0 +1,83 @@
+"""TF-IDF retrieval of the codebase sections most relevant to an issue."""
+
+import re
+from typing import List, Tuple
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+# Start of a file entry in repomix output: the plain-text "File:" banner or the XML <file path="..."> tag
+_REPOMIX_FILE_HEADER_RE = re.compile(r'^(?:={16,}\nFile: (.+)\n={16,}$|<file path="([^"]+)">$)', re.MULTILINE)
+
+
+def repomix_file_paths(content: str) -> List[str]:
+    """List the paths of the files packed in repomix output, in order.
+
+    Args:
+        content: Repomix output in plain-text or XML style
+
+    Returns:
+        File paths from the file headers
+    """
+    return [match.group(1) or match.group(2) for match in _REPOMIX_FILE_HEADER_RE.finditer(content)]
+
+
+def split_repomix_sections(content: str) -> Tuple[str, List[str]]:
+    """Split repomix output into its preamble and one section per packed file.
+
+    Args:
+        content: Repomix output in plain-text or XML style
+
+    Returns:
+        Tuple of (preamble before the first file, list of file sections)
+    """
+    starts = [match.start() for match in _REPOMIX_FILE_HEADER_RE.finditer(content)]
+    if not starts:
+        return content, []
+
+    bounds = starts + [len(content)]
+    return content[: starts[0]], [content[bounds[i] : bounds[i + 1]] for i in range(len(starts))]
+
+
+class CodebaseRetriever:
+    """Selects the files of a packed codebase that best match an issue, using TF-IDF over file sections."""
+
+    def __init__(self, codebase_content: str):
+        """Index the codebase by file section.
+
+        Args:
+            codebase_content: Repomix output to index
+        """
+        self.codebase_content = codebase_content
+        self.preamble, self.sections = split_repomix_sections(codebase_content)
+        self.vectorizer = TfidfVectorizer(
+            lowercase=True,
+            token_pattern=r"(?u)\b\w\w+\b",  # Keep identifiers such as snake_case names whole
+            sublinear_tf=True,  # Dampen long files that repeat the same terms
+        )
+        # A codebase that is not split into files cannot be narrowed down
+        self.section_matrix = self.vectorizer.fit_transform(self.sections) if len(self.sections) > 1 else None
+
+    def retrieve(self, query: str, top_k: int) -> str:
+        """Return the preamble plus the top_k file sections most similar to the query.
+
+        Sections keep their original order. The whole codebase is returned if it has no file sections
+        or nothing in it matches the query.
+
+        Args:
+            query: Issue text to match against
+            top_k: Maximum number of file sections to include
+
+        Returns:
+            Codebase text narrowed to the relevant files
+        """
+        if self.section_matrix is None or top_k >= len(self.sections):
+            return self.codebase_content
+
+        # TF-IDF rows are L2-normalized, so the dot product is the cosine similarity
+        scores = (self.section_matrix @ self.vectorizer.transform([query]).T).toarray().ravel()
+        if not scores.any():
+            return self.codebase_content
+
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        return self.preamble + "".join(self.sections[i] for i in sorted(top) if scores[i] > 0)
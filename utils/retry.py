@@ -0,0 +1,34 @@
+"""Retry helpers shared by the Gemini-backed analyzers."""
+
+import random
+
+from google.genai import errors
+
+# Delay before the first retry and upper bound for any single wait, in seconds
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+
+
+def backoff_delay(attempt: int, base: float = RETRY_BASE_DELAY, max_delay: float = RETRY_MAX_DELAY) -> float:
+    """Compute the wait before a retry using capped exponential backoff with jitter.
+
+    Args:
+        attempt: Zero-based index of the attempt that just failed
+        base: Delay after the first failure
+        max_delay: Maximum delay before jitter is added
+
+    Returns:
+        Number of seconds to sleep
+    """
+    delay = min(max_delay, base * (2**attempt))
+    # Up to 10% jitter keeps concurrent workers from retrying in lockstep
+    return delay + random.uniform(0, delay * 0.1)
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Check whether a failed Gemini call is worth retrying.
+
+    Request errors (4xx) such as an over-long prompt fail identically on every attempt; only rate limits (429)
+    among them are transient. Server errors and network failures are retried.
+    """
+    return not isinstance(error, errors.ClientError) or error.code == 429